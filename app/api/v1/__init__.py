@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import receipts, tasks
+from app.api.v1.endpoints import receipts, tasks, batches
 
 router = APIRouter()
 router.include_router(receipts.router, tags=["receipts"])
 router.include_router(tasks.router, tags=["tasks"])
+router.include_router(batches.router, tags=["batches"])
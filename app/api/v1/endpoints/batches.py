@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.repositories.batch import BatchRepository
+from app.api.dependencies import get_batch_repository
+
+router = APIRouter()
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str, batch_repo: BatchRepository = Depends(get_batch_repository)):
+    """
+    Aggregated progress of a bulk submission, with each receipt's status and
+    key fields. One call instead of polling /tasks/{task_id} per file.
+    """
+    progress = await batch_repo.get_progress(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return progress
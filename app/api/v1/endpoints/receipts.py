@@ -1,125 +1,434 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, status
-import shutil
-import os
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Query, status
+import asyncio
+import hashlib
 import uuid
+from datetime import date
 from typing import List
 from fastapi.responses import StreamingResponse
-import io
 import mimetypes
 
-from app.models.receipt_db import Receipt
-from app.repositories.receipt import ReceiptRepository
-from app.services.storage import StorageService
-from app.api.dependencies import get_receipt_repository, get_storage_service
-from app.services.tasks import process_receipt_task
+from app.models.receipt_db import Receipt, Batch
+from app.repositories.receipt import ReceiptRepository, HISTORY_TEXT_FIELDS
+from app.repositories.batch import BatchRepository
+from app.services.storage import StorageService, UploadTooLarge
+from app.core.config import settings
+from app.api.dependencies import get_receipt_repository, get_batch_repository, get_storage_service
+from app.core.celery_app import celery_app
+from app.services.tasks import dispatch_receipt, dispatch_receipts, build_task_result, notify_finished, RESULT_FIELDS
+from app.services.extraction import OCR_MODES
+from app.services.lanes import PDFPageCounter, choose_lane
+from app.services.admission import admission_controller
+from app.services.webhooks import UnsafeWebhookURL, check_webhook_url
 
 router = APIRouter()
 
-UPLOAD_DIR = os.getenv("UPLOAD_FOLDER", "/app/uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+ALLOWED_TYPES = ["image/jpeg", "image/png", "image/jpg", "application/pdf"]
+# Leading bytes of each accepted format, checked against the declared type
+FILE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"%PDF-": "application/pdf",
+}
+SNIFF_BYTES = 8
+CHUNK_SIZE = 1024 * 1024
+
+def sniff_content_type(head: bytes) -> str | None:
+    for signature, content_type in FILE_SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    return None
+
+def scan_spooled(stream, max_bytes: int, observer=None) -> dict:
+    """
+    Hashes and sizes an upload Starlette has already spooled, then rewinds it.
+    Raises UploadTooLarge past max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := stream.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        if observer:
+            observer(chunk)
+    stream.seek(0)
+    return {"size": size, "sha256": digest.hexdigest()}
+
+async def inspect_upload(file: UploadFile) -> dict:
+    """
+    Checks the upload's leading bytes against the declared type and its size
+    against MAX_UPLOAD_BYTES, and hashes it, all from the spooled body, so
+    duplicates are found before anything is sent to storage. PDF page counts
+    are estimated on the way.
+    Returns {"size", "sha256", "content_type", "page_count", "lane"}.
+    """
+    head = await file.read(SNIFF_BYTES)
+    declared = "image/jpeg" if file.content_type == "image/jpg" else file.content_type
+    sniffed = sniff_content_type(head)
+    if sniffed != declared:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File content does not match its type ({file.content_type})"
+        )
+    await file.seek(0)
+    pages = PDFPageCounter() if sniffed == "application/pdf" else None
+    try:
+        scanned = await asyncio.to_thread(
+            scan_spooled, file.file, settings.MAX_UPLOAD_BYTES, pages.feed if pages else None
+        )
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Max {settings.MAX_UPLOAD_BYTES} bytes."
+        )
+    page_count = pages.page_count if pages else None
+    lane = choose_lane(sniffed, scanned["size"], page_count)
+    return {**scanned, "content_type": sniffed, "page_count": page_count, "lane": lane}
+
+async def store_upload(file: UploadFile, s3_key: str, content_type: str, storage_service: StorageService) -> None:
+    """Streams an inspected (rewound) upload to storage."""
+    await storage_service.upload_stream_async(
+        file.file, s3_key, content_type, max_bytes=settings.MAX_UPLOAD_BYTES
+    )
+
+def build_duplicate(
+    existing: Receipt, filename: str, batch_id: str | None = None, callback_url: str | None = None
+) -> Receipt:
+    """
+    A completed record that reuses the results of an already processed
+    receipt with the same content.
+    """
+    return Receipt(
+        task_id=str(uuid.uuid4()),
+        filename=filename,
+        s3_key=existing.s3_key,
+        content_hash=existing.content_hash,
+        batch_id=batch_id,
+        callback_url=callback_url,
+        status="completed",
+        # A deferred placeholder summary is copied with its flag, so the backfill fills it in
+        summary_deferred=bool(existing.summary_deferred),
+        summary_failed=bool(existing.summary_failed),
+        **{field: getattr(existing, field) for field in RESULT_FIELDS},
+    )
+
+def finish_duplicate(db_receipt: Receipt) -> None:
+    """
+    Completes a stored duplicate like a processed receipt: stores its result
+    and sends the completion event and webhook. Blocking (backend, broker).
+    """
+    result = build_task_result(db_receipt)
+    # /tasks/{task_id} reads the completed row; the backend copy is only kept in "full" mode
+    if settings.TASK_RESULT_MODE == "full":
+        celery_app.backend.store_result(db_receipt.task_id, result, "SUCCESS")
+    notify_finished(db_receipt.task_id, "completed", result, db_receipt.callback_url)
+
+async def create_from_duplicate(
+    existing: Receipt, filename: str, callback_url: str | None, receipt_repo: ReceiptRepository
+) -> Receipt:
+    db_receipt = await receipt_repo.create(build_duplicate(existing, filename, callback_url=callback_url))
+    await asyncio.to_thread(finish_duplicate, db_receipt)
+    return db_receipt
+
+async def admit(lane: str, receipt_repo: ReceiptRepository) -> None:
+    """
+    Raises 429 with Retry-After when the lane is over its admission budget.
+    """
+    decision = await admission_controller.check(lane, lambda: receipt_repo.count_in_flight_by_lane())
+    if not decision["admitted"]:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{decision['reason']}. Retry later.",
+            headers={"Retry-After": str(decision["retry_after"])},
+        )
+
+def deferred_entry(filename: str, error: HTTPException) -> dict:
+    return {
+        "filename": filename,
+        "status": "deferred",
+        "error": error.detail,
+        "retry_after": int(error.headers["Retry-After"]),
+    }
+
+async def validate_callback_url(callback_url: str | None) -> None:
+    if not callback_url:
+        return
+    try:
+        # Resolves the host (blocking DNS), so off the event loop
+        await asyncio.to_thread(check_webhook_url, callback_url)
+    except UnsafeWebhookURL as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid callback URL. {e}"
+        )
+
+def effective_ocr_mode(ocr_mode: str, generate_summary: bool) -> str:
+    # Summaries need the full text, so the worker runs full OCR for them
+    return "full" if generate_summary else ocr_mode
+
+def validate_ocr_mode(ocr_mode: str) -> None:
+    if ocr_mode not in OCR_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid OCR mode. Allowed: {', '.join(OCR_MODES)}. Received: {ocr_mode}"
+        )
 
 @router.post("/process-receipt", status_code=status.HTTP_201_CREATED)
 async def process_receipt(
     file: UploadFile = File(...), 
     generate_summary: bool = Form(False), 
+    ocr_mode: str = Form("full"),
+    callback_url: str | None = Form(None),
     receipt_repo: ReceiptRepository = Depends(get_receipt_repository),
     storage_service: StorageService = Depends(get_storage_service)
 ):
     """
     Async Endpoint: Uploads file, pushes task to queue, returns Task ID immediately.
+    ocr_mode "progressive" OCRs the header/footer first and the full page only if needed.
+    Results can be streamed from /tasks/events or POSTed to `callback_url` when done.
     """
-    ALLOWED_TYPES = ["image/jpeg", "image/png", "image/jpg", "application/pdf"]
+    validate_ocr_mode(ocr_mode)
+    await validate_callback_url(callback_url)
     
     if file.content_type not in ALLOWED_TYPES:
          raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid file type. Allowed: JPG, PNG, PDF. Received: {file.content_type}"
         )
-    
-    temp_id = str(uuid.uuid4())
-    unique_filename = f"{temp_id}_{file.filename}"
-    local_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    try:
-        with open(local_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
 
-        # Upload to MinIO
-        s3_key = f"uploads/{unique_filename}"
-        storage_service.upload_file(local_path, s3_key)
-    finally:
-        if os.path.exists(local_path):
-            os.remove(local_path)
+    inspected = await inspect_upload(file)
+    content_hash = inspected["sha256"]
 
-    # Trigger Task
-    task = process_receipt_task.delay(s3_key, generate_summary)
+    # Same content already processed: reuse its results, skip the upload and OCR
+    existing = await receipt_repo.get_completed_by_hash(
+        content_hash, require_summary=generate_summary, ocr_mode=effective_ocr_mode(ocr_mode, generate_summary)
+    )
+    if existing:
+        db_receipt = await create_from_duplicate(existing, file.filename, callback_url, receipt_repo)
+        return {"task_id": db_receipt.task_id, "status": "Completed", "duplicate_of": existing.id}
 
-    # Create DB Record
+    await admit(inspected["lane"], receipt_repo)
+
+    s3_key = f"uploads/{uuid.uuid4()}_{file.filename}"
+    try:
+        await store_upload(file, s3_key, inspected["content_type"], storage_service)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Could not store receipt: {e}")
+
+    # Create DB Record first, so the worker always finds it
     db_receipt = Receipt(
-        task_id=task.id,
+        task_id=str(uuid.uuid4()),
         filename=file.filename,
         s3_key=s3_key,
+        content_hash=content_hash,
+        callback_url=callback_url,
+        lane=inspected["lane"],
         status="pending"
     )
-    await receipt_repo.create(db_receipt)
+    db_receipt = await receipt_repo.create(db_receipt)
+
+    # Trigger Task (publishing to the broker blocks, so off the event loop)
+    try:
+        task_id = await asyncio.to_thread(
+            dispatch_receipt, s3_key, generate_summary, ocr_mode, db_receipt.task_id, db_receipt.lane
+        )
+    except Exception as e:
+        await receipt_repo.delete(db_receipt.id)
+        raise HTTPException(status_code=503, detail=f"Could not queue receipt: {e}")
 
-    return {"task_id": task.id, "status": "Processing"}
+    return {"task_id": task_id, "status": "Processing", "lane": db_receipt.lane}
 
 @router.post("/process-receipt/bulk", status_code=status.HTTP_201_CREATED)
 async def process_bulk_receipts(
     files: List[UploadFile] = File(...), 
     generate_summary: bool = Form(False),
+    ocr_mode: str = Form("full"),
+    callback_url: str | None = Form(None),
     receipt_repo: ReceiptRepository = Depends(get_receipt_repository),
+    batch_repo: BatchRepository = Depends(get_batch_repository),
     storage_service: StorageService = Depends(get_storage_service)
 ):
     """
     Accepts multiple files, creates a task for each, returns a list of Task IDs.
+    The batch is persisted; poll GET /batches/{batch_id} for its progress.
+    Files are hashed first and only new content is uploaded to storage,
+    concurrently (BULK_UPLOAD_CONCURRENCY at a time); the batch and its
+    records are then inserted in one transaction and all tasks are queued as
+    one Celery group.
     """
     if len(files) > 20:
         raise HTTPException(status_code=400, detail="Max 20 files allowed per batch.")
+    validate_ocr_mode(ocr_mode)
+    await validate_callback_url(callback_url)
 
-    tasks = []
+    semaphore = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
 
-    for file in files:
-        if file.content_type not in ["image/jpeg", "image/png", "image/jpg", "application/pdf"]:
-            tasks.append({"filename": file.filename, "status": "error", "error": "Invalid file type"})
-            continue
+    async def inspect(file: UploadFile) -> dict:
+        if file.content_type not in ALLOWED_TYPES:
+            return {"error": "Invalid file type"}
+        async with semaphore:
+            try:
+                return await inspect_upload(file)
+            except HTTPException as e:
+                return {"error": e.detail}
 
-        temp_id = str(uuid.uuid4())
-        unique_filename = f"{temp_id}_{file.filename}"
-        local_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        try:
-            with open(local_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+    inspections = await asyncio.gather(*(inspect(file) for file in files))
+
+    batch_id = str(uuid.uuid4())
+    existing_by_hash = await receipt_repo.get_completed_by_hashes(
+        [inspected["sha256"] for inspected in inspections if "sha256" in inspected],
+        require_summary=generate_summary,
+        ocr_mode=effective_ocr_mode(ocr_mode, generate_summary),
+    )
+
+    # Only new content that its lane admits is uploaded
+    entries: list[dict] = []
+    for file, inspected in zip(files, inspections):
+        if "error" in inspected:
+            entries.append({"filename": file.filename, "status": "error", "error": inspected["error"]})
+        elif inspected["sha256"] in existing_by_hash:
+            entries.append({"duplicate": existing_by_hash[inspected["sha256"]]})
+        else:
+            try:
+                await admit(inspected["lane"], receipt_repo)
+            except HTTPException as e:
+                entries.append(deferred_entry(file.filename, e))
+                continue
+            entries.append({"upload": f"uploads/{uuid.uuid4()}_{file.filename}"})
+
+    async def upload(file: UploadFile, inspected: dict, entry: dict) -> None:
+        async with semaphore:
+            try:
+                await store_upload(file, entry["upload"], inspected["content_type"], storage_service)
+            except Exception as e:
+                entry["error"] = f"Upload failed: {e}"
 
-            s3_key = f"uploads/{unique_filename}"
-            storage_service.upload_file(local_path, s3_key)
+    await asyncio.gather(*(
+        upload(file, inspected, entry)
+        for file, inspected, entry in zip(files, inspections, entries)
+        if "upload" in entry
+    ))
+
+    tasks = []
+    receipts = []
+    duplicates = []
+    pipelines = []
 
-            task = process_receipt_task.delay(s3_key, generate_summary)
-            
+    for file, inspected, entry in zip(files, inspections, entries):
+        if "duplicate" in entry:
+            existing = entry["duplicate"]
+            db_receipt = build_duplicate(existing, file.filename, batch_id, callback_url)
+            duplicates.append(db_receipt)
+            tasks.append({
+                "filename": file.filename,
+                "task_id": db_receipt.task_id,
+                "status": "completed",
+                "duplicate_of": existing.id
+            })
+        elif "upload" in entry and "error" not in entry:
             db_receipt = Receipt(
-                task_id=task.id,
+                task_id=str(uuid.uuid4()),
                 filename=file.filename,
-                s3_key=s3_key,
+                s3_key=entry["upload"],
+                content_hash=inspected["sha256"],
+                batch_id=batch_id,
+                callback_url=callback_url,
+                lane=inspected["lane"],
                 status="pending"
             )
-            await receipt_repo.create(db_receipt)
-            
+            pipelines.append({
+                "s3_key": db_receipt.s3_key,
+                "generate_summary": generate_summary,
+                "ocr_mode": ocr_mode,
+                "task_id": db_receipt.task_id,
+                "lane": db_receipt.lane,
+            })
             tasks.append({
                 "filename": file.filename,
-                "task_id": task.id,
-                "status": "queued"
+                "task_id": db_receipt.task_id,
+                "status": "queued",
+                "lane": db_receipt.lane
             })
-        finally:
-            if os.path.exists(local_path):
-                os.remove(local_path)
+        elif "upload" in entry:
+            tasks.append({"filename": file.filename, "status": "error", "error": entry["error"]})
+            continue
+        else:
+            tasks.append(entry)
+            continue
+        receipts.append(db_receipt)
+
+    # Nothing accepted only because of backpressure: reject the whole request
+    if not receipts and any(task["status"] == "deferred" for task in tasks):
+        retry_after = max(task["retry_after"] for task in tasks if task["status"] == "deferred")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="All lanes for these files are at capacity. Retry later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    # Rows first, in one transaction, so workers always find their record
+    batch = Batch(id=batch_id, file_count=len(files), generate_summary=generate_summary, ocr_mode=ocr_mode)
+    await batch_repo.create_with_receipts(batch, receipts)
+    for db_receipt in duplicates:
+        await asyncio.to_thread(finish_duplicate, db_receipt)
+
+    try:
+        await asyncio.to_thread(dispatch_receipts, pipelines)
+    except Exception as e:
+        await batch_repo.mark_pending_failed(batch_id)
+        raise HTTPException(status_code=503, detail=f"Could not queue batch: {e}")
 
-    return {"batch_id": str(uuid.uuid4()), "tasks": tasks}
+    return {"batch_id": batch_id, "tasks": tasks}
+
+def parse_date_param(name: str, value: str | None) -> str | None:
+    """Validates a YYYY-MM-DD query parameter (400 otherwise) and returns it normalized."""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date (YYYY-MM-DD), got {value!r}")
 
 @router.get("/receipts/history")
-async def get_history(receipt_repo: ReceiptRepository = Depends(get_receipt_repository)):
-    return await receipt_repo.get_history()
+async def get_history(
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include: str | None = Query(None, description="Comma-separated extra fields: summary, raw_text"),
+    status: str | None = None,
+    merchant: str | None = None,
+    date_from: str | None = Query(None, description="Receipt date, YYYY-MM-DD"),
+    date_to: str | None = Query(None, description="Receipt date, YYYY-MM-DD"),
+    total_min: float | None = None,
+    total_max: float | None = None,
+    tags: List[str] = Query([]),
+    receipt_repo: ReceiptRepository = Depends(get_receipt_repository),
+):
+    """
+    Receipt history, newest first. Pass the returned next_cursor to get the
+    following page. Large text fields are left out unless listed in include.
+    """
+    extra = tuple(field.strip() for field in include.split(",") if field.strip()) if include else ()
+    unknown = set(extra) - set(HISTORY_TEXT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include fields: {', '.join(sorted(unknown))}")
+    date_from = parse_date_param("date_from", date_from)
+    date_to = parse_date_param("date_to", date_to)
+
+    try:
+        return await receipt_repo.get_history(
+            limit=limit, cursor=cursor, include=extra, status=status, merchant=merchant,
+            date_from=date_from, date_to=date_to, total_min=total_min, total_max=total_max, tags=tags,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/receipts/{receipt_id:int}")
+async def get_receipt(receipt_id: int, receipt_repo: ReceiptRepository = Depends(get_receipt_repository)):
+    receipt = await receipt_repo.get(receipt_id)
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
 
 @router.get("/receipts/{receipt_id}/file")
 async def get_receipt_file(
@@ -132,7 +441,7 @@ async def get_receipt_file(
         raise HTTPException(status_code=404, detail="Receipt not found")
 
     try:
-        response = storage_service.get_object(receipt.s3_key)
+        response = await storage_service.get_object_async(receipt.s3_key)
         
         content_type = response.get('ContentType')
         if not content_type or content_type == 'application/octet-stream':
@@ -144,8 +453,9 @@ async def get_receipt_file(
             "Access-Control-Expose-Headers": "Content-Disposition"
         }
         
+        # A sync iterator: Starlette pulls each chunk in a worker thread
         return StreamingResponse(
-            io.BytesIO(response['Body'].read()), 
+            response['Body'].iter_chunks(CHUNK_SIZE), 
             media_type=content_type,
             headers=headers
         )
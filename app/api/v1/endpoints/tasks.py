@@ -1,14 +1,101 @@
-from fastapi import APIRouter
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from celery.result import AsyncResult
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.repositories.receipt import ReceiptRepository
+from app.api.dependencies import get_receipt_repository
+from app.services.events import get_event_bus, TERMINAL_EVENTS
+from app.services.tasks import build_task_result
 
 router = APIRouter()
 
+def format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@router.get("/tasks/events")
+async def stream_task_events(
+    task_ids: str = Query(..., description="Comma-separated task ids"),
+    receipt_repo: ReceiptRepository = Depends(get_receipt_repository),
+):
+    """
+    Server-Sent Events stream of stage transitions ("stage") and completion
+    ("completed" / "failed") for one or many tasks, instead of polling
+    /tasks/{task_id}. Ids with no receipt get an "unknown" event. The stream
+    ends once every task has finished, or with a "timeout" event listing the
+    unfinished ids after SSE_MAX_STREAM_SECONDS (clients reconnect for those).
+    """
+    ids = list(dict.fromkeys(task_id for task_id in task_ids.split(",") if task_id))
+    if not ids or len(ids) > settings.SSE_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"Provide 1-{settings.SSE_MAX_TASKS} task ids.")
+
+    # Subscribe before reading the current state, so nothing finishing in
+    # between is missed; tasks already finished are reported from the DB.
+    subscription = await get_event_bus().subscribe(ids)
+    try:
+        receipts = await receipt_repo.get_by_task_ids(ids)
+    except Exception:
+        await subscription.close()
+        raise
+
+    finished = []
+    for receipt in receipts:
+        if receipt.status == "completed":
+            finished.append({"task_id": receipt.task_id, "event": "completed", "result": build_task_result(receipt)})
+        elif receipt.status == "error":
+            finished.append({"task_id": receipt.task_id, "event": "failed",
+                             "result": {"status": "error", "error": receipt.error}})
+    # Nothing will ever be published for ids without a receipt
+    known = {receipt.task_id for receipt in receipts}
+    finished.extend({"task_id": task_id, "event": "unknown"} for task_id in ids if task_id not in known)
+
+    async def event_stream():
+        pending = set(ids)
+        deadline = time.monotonic() + settings.SSE_MAX_STREAM_SECONDS
+        try:
+            for event in finished:
+                pending.discard(event["task_id"])
+                yield format_sse(event)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield format_sse({"event": "timeout", "task_ids": [i for i in ids if i in pending]})
+                    break
+                event = await subscription.get(timeout=min(settings.SSE_KEEPALIVE_SECONDS, remaining))
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["task_id"] not in pending:
+                    continue
+                if event["event"] in TERMINAL_EVENTS:
+                    pending.discard(event["task_id"])
+                yield format_sse(event)
+        finally:
+            await subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/tasks/{task_id}")
-async def get_task_status(task_id: str):
+async def get_task_status(task_id: str, receipt_repo: ReceiptRepository = Depends(get_receipt_repository)):
     """
     Poll this endpoint to get the result.
+    Receipt tasks are answered from their DB row (indexed task_id); other
+    tasks (e.g. reprocess jobs) fall back to the Celery result backend.
     """
+    receipt = await receipt_repo.get_by_task_id(task_id)
+    if receipt is not None:
+        if receipt.status == "completed":
+            return {"state": "SUCCESS", "result": build_task_result(receipt)}
+        if receipt.status == "error":
+            return {"state": "FAILURE", "error": receipt.error or "Processing failed"}
+        return {"state": "PENDING", "status": "Task is queued or processing..."}
+
     task_result = AsyncResult(task_id, app=celery_app)
     
     if task_result.state == 'PENDING':
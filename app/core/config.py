@@ -6,8 +6,135 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     TESSERACT_PATH: str | None = None
 
+    # OCR backend: "auto" (tesserocr if installed), "tesserocr" or "pytesseract"
+    OCR_BACKEND: str = "auto"
+    OCR_POOL_SIZE: int = 1
+    OCR_LANG: str = "eng"
+    TESSDATA_PATH: str | None = None
+
+    # Adaptive resolution: rescale images so glyphs are ~OCR_TARGET_GLYPH_HEIGHT px
+    OCR_ADAPTIVE_RESOLUTION: bool = True
+    OCR_TARGET_GLYPH_HEIGHT: int = 32
+    OCR_MAX_PIXELS: int = 6_000_000
+    # Crop photos to the detected receipt paper before thresholding
+    OCR_CROP_RECEIPT: bool = True
+
+    # Progressive OCR: header/footer bands first, full OCR only if fields are missing
+    OCR_HEADER_BAND: float = 0.25
+    OCR_FOOTER_BAND: float = 0.35
+    OCR_REQUIRED_FIELDS: list[str] = ["merchant", "total", "date"]
+
+    # Multi-page PDFs: pages rasterized per window and pages OCR'd concurrently
+    PDF_DPI: int = 300
+    PDF_MIN_DPI: int = 150
+    PDF_PROBE_DPI: int = 72
+    # Use the embedded text layer of born-digital PDFs instead of OCR when usable
+    PDF_TEXT_LAYER: bool = True
+    PDF_TEXT_MIN_CHARS: int = 20
+    PDF_PAGE_WINDOW: int = 4
+    OCR_PAGE_WORKERS: int = 2
+
+    # "staged": chained OCR -> parse -> summarize -> persist tasks on separate
+    # queues; "single": one process_receipt_task per receipt
+    PIPELINE_MODE: str = "staged"
+    # "slim": task results hold only a status and /tasks/{id} reads the receipt
+    # row; "full": the whole result is also kept in the result backend
+    TASK_RESULT_MODE: str = "slim"
+    # Seconds results stay in the result backend (stored zlib-compressed)
+    CELERY_RESULT_EXPIRES: int = 3600
+
+    # Object storage: one pooled client per process, sized for concurrent transfers
+    S3_ENDPOINT: str = "http://storage:9000"
+    S3_KEY: str = "minioadmin"
+    S3_SECRET: str = "minioadmin"
+    S3_BUCKET: str = "receipts"
+    S3_MAX_POOL_CONNECTIONS: int = 20
+    # Uploads are streamed to storage; bodies larger than one part go multipart
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024
+    # Files of one bulk request uploaded to storage concurrently
+    BULK_UPLOAD_CONCURRENCY: int = 8
+    # Worker fetches stay in memory up to this size; larger PDFs spill to a temp file
+    STORAGE_MEMORY_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Ingest lanes: submissions are classified by type, size and PDF page count
+    # (first matching rule wins; keys: lane, types, min/max_bytes, min/max_pages)
+    # and their OCR work goes to the lane's queue, so small receipts never wait
+    # behind large PDFs. Lane capacity is set by the workers consuming each queue.
+    LANE_RULES: list[dict] = [
+        {"lane": "small", "types": ["image/jpeg", "image/png"], "max_bytes": 3 * 1024 * 1024},
+        {"lane": "small", "types": ["application/pdf"], "max_pages": 2, "max_bytes": 3 * 1024 * 1024},
+        {"lane": "large", "types": ["application/pdf"], "min_pages": 10},
+        {"lane": "large", "min_bytes": 20 * 1024 * 1024},
+    ]
+    DEFAULT_LANE: str = "standard"
+    LANE_QUEUES: dict[str, str] = {"small": "ocr.small", "standard": "ocr", "large": "ocr.large"}
+
+    # Admission control: per-lane budgets of queued messages and unfinished
+    # receipts; work for a lane over budget gets 429 with Retry-After
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_PROBE_TTL: float = 2.0
+    ADMISSION_RETRY_AFTER: int = 30
+    ADMISSION_LANE_BUDGETS: dict[str, dict] = {
+        "small": {"max_queued": 1000, "max_in_flight": 2000},
+        "standard": {"max_queued": 300, "max_in_flight": 600},
+        "large": {"max_queued": 50, "max_in_flight": 100},
+    }
+
+    # Task events for the streaming endpoint: "redis" pub/sub, or "local"
+    # (in-process stand-in, only for single-process setups)
+    EVENTS_BACKEND: str = "redis"
+    EVENTS_REDIS_URL: str | None = None  # defaults to the Celery result backend
+    SSE_KEEPALIVE_SECONDS: int = 15
+    SSE_MAX_TASKS: int = 100
+    SSE_MAX_STREAM_SECONDS: int = 600
+    # Webhooks: bodies signed with HMAC-SHA256 when a secret is set
+    WEBHOOK_SECRET: str | None = None
+    WEBHOOK_TIMEOUT: int = 5
+    # Callback hosts clients may use (".example.com" covers subdomains). Empty:
+    # any host that resolves to public addresses only
+    WEBHOOK_ALLOWED_HOSTS: list[str] = []
+
     OPENROUTER_API_KEY: str | None = None
     OPENROUTER_MODEL: str = "google/gemma-2-27b-it:free"
+    # Summary calls: pooled keep-alive client, per-process concurrency limit,
+    # retries with jittered exponential backoff
+    LLM_API_URL: str = "https://openrouter.ai/api/v1/chat/completions"
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_CONNECT_TIMEOUT: float = 3.0
+    LLM_TIMEOUT: float = 10.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_BACKOFF_BASE: float = 0.5
+    LLM_BACKOFF_MAX: float = 4.0
+    # Prompt compaction: page separators, noise and repeated lines stripped,
+    # then lines dropped by priority down to this (estimated) token budget
+    LLM_COMPACT_PROMPT: bool = True
+    LLM_PROMPT_TOKEN_BUDGET: int = 1500
+    # Summary cache: in-process LRU in front of a shared "redis" tier, or
+    # "local" (in-process stand-in for single-process setups)
+    SUMMARY_CACHE_ENABLED: bool = True
+    SUMMARY_CACHE_BACKEND: str = "redis"
+    # Defaults to the Celery result backend's server, on its own database
+    SUMMARY_CACHE_REDIS_URL: str | None = None
+    SUMMARY_CACHE_REDIS_DB: int = 1
+    SUMMARY_CACHE_TTL: int = 7 * 24 * 3600
+    SUMMARY_CACHE_MAX_ENTRIES: int = 1024
+    SUMMARY_CACHE_SHARED_MAX_ENTRIES: int = 100_000
+    # Circuit breaker shared across processes ("redis", or "local" stand-in):
+    # opens after consecutive failures or calls slower than the latency SLO,
+    # then defers summaries (backfilled later) until a probe call succeeds
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_BACKEND: str = "redis"
+    LLM_BREAKER_REDIS_URL: str | None = None  # defaults to the Celery result backend
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_WINDOW: int = 60
+    LLM_LATENCY_SLO: float = 8.0
+    LLM_BREAKER_OPEN_SECONDS: int = 30
+    SUMMARY_BACKFILL_BATCH: int = 50
+    SUMMARY_BACKFILL_MAX_ATTEMPTS: int = 3
+    # Receipt history pages (keyset pagination)
+    HISTORY_PAGE_SIZE: int = 50
+    HISTORY_MAX_PAGE_SIZE: int = 500
     
     SITE_URL: str = "http://localhost:8000"
     SITE_NAME: str = "ReceiptProcessor"
@@ -0,0 +1,50 @@
+import threading
+from collections import Counter
+
+
+class MetricsRegistry:
+    """
+    Process-local counters and value summaries.
+    Cheap enough to update on hot paths; read via snapshot().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+        self._summaries: dict[str, dict] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Tracks count/sum/min/max of a value (e.g. a ratio or latency)."""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "min": value, "max": value}
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+    def counters(self, prefix: str = "") -> dict[str, int]:
+        with self._lock:
+            return {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            summaries = {
+                name: {**s, "avg": s["sum"] / s["count"]}
+                for name, s in self._summaries.items()
+            }
+            return {"counters": dict(self._counters), "summaries": summaries}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+metrics = MetricsRegistry()
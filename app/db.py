@@ -2,6 +2,8 @@ import os
 from collections.abc import AsyncGenerator, Generator
 from contextlib import asynccontextmanager, contextmanager
 
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel, Session, create_engine
@@ -62,8 +64,73 @@ def get_sync_session_context() -> Generator[Session, None, None]:
         finally:
             session.close()
 
+# Arbitrary app-wide key: serializes schema changes between processes
+# (gunicorn workers and Celery workers all call init_db on startup)
+SCHEMA_LOCK_KEY = 7_320_114
+
+def _add_missing_columns(conn) -> None:
+    """
+    create_all() never alters existing tables, so add any model columns
+    that an older deployment's tables are missing. Their indexes are left to
+    create_missing_indexes (a separate step), since building one locks writes.
+    """
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+def create_missing_indexes() -> list[str]:
+    """
+    Builds model indexes that existing tables lack. On Postgres each one is
+    built with CREATE INDEX CONCURRENTLY, outside any transaction, so writes
+    to the table continue; an invalid index left by an interrupted build is
+    dropped and rebuilt. Meant to run once per deployment (python -m
+    app.migrate), not at startup. Returns the names of the indexes built.
+    """
+    built = []
+    with sync_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        postgres = conn.dialect.name == "postgresql"
+        invalid = set()
+        if postgres:
+            invalid = set(conn.execute(text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+            )).scalars())
+        inspector = inspect(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing and index.name not in invalid:
+                    continue
+                if not postgres:
+                    index.create(conn, checkfirst=True)
+                    built.append(index.name)
+                    continue
+                if index.name in invalid:
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+                conn.execute(text(ddl.replace("INDEX IF NOT EXISTS", "INDEX CONCURRENTLY IF NOT EXISTS", 1)))
+                built.append(index.name)
+    return built
+
 def init_db() -> None:
-    """Create tables if they don't exist. Typically run on startup."""
-    SQLModel.metadata.create_all(sync_engine)
+    """
+    Create tables if they don't exist, and add missing columns. Typically run
+    on startup; on Postgres, concurrent callers wait on an advisory lock held
+    for the transaction, so only one applies the DDL and the rest find it done.
+    Indexes on existing tables are built by create_missing_indexes instead.
+    """
+    with sync_engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        SQLModel.metadata.create_all(conn)
+        _add_missing_columns(conn)
     # async with async_engine.begin() as conn:
     #     await conn.run_sync(SQLModel.metadata.create_all)
\ No newline at end of file
@@ -4,6 +4,10 @@ from app.api.v1 import router as api_router
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.logging import setup_logging
 from app.db import init_db
+from app.services.storage import init_storage, close_storage
+from app.core.metrics import metrics
+from app.services.admission import admission_controller
+from app.services.circuit_breaker import get_llm_breaker
 
 # from contextlib import asynccontextmanager
 
@@ -41,7 +45,18 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 @app.on_event("startup")
 def on_startup():
     init_db()
+    init_storage()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    close_storage()
 
 @app.get("/")
 def health_check():
-    return {"status": "ok", "message": "Service is running"}
\ No newline at end of file
+    return {"status": "ok", "message": "Service is running"}
+
+@app.get("/metrics")
+def get_metrics():
+    """Process-local counters (e.g. admission.rejected.<lane>), admission state and the shared LLM breaker state."""
+    breaker_state = get_llm_breaker().state() if settings.LLM_BREAKER_ENABLED else "disabled"
+    return {**metrics.snapshot(), "admission": admission_controller.snapshot(), "llm_breaker": breaker_state}
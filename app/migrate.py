@@ -0,0 +1,20 @@
+import logging
+
+from app.core.logging import setup_logging
+from app.db import create_missing_indexes, init_db
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    """
+    CLI: python -m app.migrate
+    One-off schema step after a deploy: tables and columns (as on startup),
+    then the indexes existing tables lack, built without blocking writes.
+    """
+    setup_logging()
+    init_db()
+    built = create_missing_indexes()
+    logger.info(f"Schema up to date; built indexes: {', '.join(built) or 'none'}")
+
+if __name__ == "__main__":
+    main()
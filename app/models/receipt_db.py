@@ -1,14 +1,28 @@
-from sqlmodel import SQLModel, Field, JSON, Column
+from sqlmodel import SQLModel, Field, JSON, Column, Index
 from typing import Optional, List
 from datetime import datetime
 
 class Receipt(SQLModel, table=True):
+    # Keyset pagination of the history, newest first, optionally per status
+    __table_args__ = (
+        Index("ix_receipt_created_at_id", "created_at", "id"),
+        Index("ix_receipt_status_created_at_id", "status", "created_at", "id"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     task_id: str = Field(index=True, unique=True)
-    status: str = Field(default="pending")
+    status: str = Field(default="pending", index=True)
     
     filename: str
     s3_key: str
+    content_hash: Optional[str] = Field(default=None, index=True)
+    # Set for receipts submitted through the bulk endpoint
+    batch_id: Optional[str] = Field(default=None, index=True)
+    # Error message when status is "error"
+    error: Optional[str] = None
+    # Ingest lane the OCR work was routed to (see app.services.lanes)
+    lane: Optional[str] = None
+    # Optional webhook notified when processing finishes
+    callback_url: Optional[str] = None
     
     merchant: Optional[str] = None
     date: Optional[str] = None
@@ -20,7 +34,33 @@ class Receipt(SQLModel, table=True):
     other_fees: Optional[float] = None
     
     summary: Optional[str] = None
+    # Summary skipped while the LLM circuit breaker was open; filled in by the backfill
+    summary_deferred: bool = Field(default=False, index=True)
+    # The summary text is a fallback (the call failed), not a real summary
+    summary_failed: Optional[bool] = Field(default=False)
+    # Backfill attempts that failed outright; past SUMMARY_BACKFILL_MAX_ATTEMPTS it gives up
+    summary_backfill_attempts: int = Field(default=0)
     raw_text: Optional[str] = None
     tags: List[str] = Field(default=[], sa_column=Column(JSON))
+    # Source of each page's text: "text" (PDF text layer), "ocr", "ocr_roi" or "skipped"
+    page_sources: List[str] = Field(default=[], sa_column=Column(JSON))
+    # OCR mode that produced the text: "full" or "progressive"
+    ocr_mode: Optional[str] = None
     
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Batch(SQLModel, table=True):
+    """A bulk submission; its receipts reference it through Receipt.batch_id."""
+    id: str = Field(primary_key=True)
+    file_count: int = Field(default=0)
+    generate_summary: bool = Field(default=False)
+    ocr_mode: str = Field(default="full")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ReprocessCheckpoint(SQLModel, table=True):
+    """Progress of an offline re-parse job, so it can resume after a stop."""
+    job_name: str = Field(primary_key=True)
+    last_id: int = Field(default=0)
+    scanned: int = Field(default=0)
+    updated: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,65 @@
+from typing import Optional, Sequence
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, update
+from app.models.receipt_db import Batch, Receipt
+from app.repositories.base import BaseRepository
+
+# Receipt columns returned per item in batch progress
+BATCH_RECEIPT_FIELDS = ("id", "task_id", "filename", "status", "merchant", "total", "date")
+
+class BatchRepository(BaseRepository[Batch]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(Batch, session)
+
+    async def create_with_receipts(self, batch: Batch, receipts: Sequence[Receipt]) -> Batch:
+        """
+        Inserts the batch and all of its receipt rows in one transaction.
+        """
+        self.session.add(batch)
+        self.session.add_all(receipts)
+        await self.session.commit()
+        return batch
+
+    async def mark_pending_failed(self, batch_id: str) -> None:
+        """
+        Marks receipts of a batch that were never queued (dispatch failed) as errors.
+        """
+        await self.session.execute(
+            update(Receipt)
+            .where(Receipt.batch_id == batch_id, Receipt.status == "pending")
+            .values(status="error")
+        )
+        await self.session.commit()
+
+    async def get_progress(self, batch_id: str) -> Optional[dict]:
+        """
+        Aggregated status counts and per-receipt results of a batch, read with
+        a single batch LEFT JOIN receipt query. Returns None for unknown batches.
+        """
+        columns = [getattr(Receipt, field) for field in BATCH_RECEIPT_FIELDS]
+        statement = (
+            select(Batch, *columns)
+            .outerjoin(Receipt, Receipt.batch_id == Batch.id)
+            .where(Batch.id == batch_id)
+            .order_by(Receipt.id)
+        )
+        rows = (await self.session.execute(statement)).all()
+        if not rows:
+            return None
+
+        batch = rows[0][0]
+        receipts = [dict(zip(BATCH_RECEIPT_FIELDS, row[1:])) for row in rows if row[1] is not None]
+        counts = {"pending": 0, "completed": 0, "error": 0}
+        for receipt in receipts:
+            counts[receipt["status"]] = counts.get(receipt["status"], 0) + 1
+        finished = counts["completed"] + counts["error"]
+
+        return {
+            "batch_id": batch.id,
+            "created_at": batch.created_at,
+            "file_count": batch.file_count,
+            "counts": counts,
+            "progress": round(finished / len(receipts), 3) if receipts else 1.0,
+            "done": finished == len(receipts),
+            "receipts": receipts,
+        }
@@ -1,9 +1,40 @@
+import base64
+from datetime import datetime
 from typing import Optional
+from sqlalchemy import String, and_, cast, true, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from sqlmodel import select, func, or_
 from app.models.receipt_db import Receipt
 from app.repositories.base import BaseRepository
 
+# Columns of a history item; the large text columns only on request
+HISTORY_FIELDS = (
+    "id", "task_id", "filename", "status", "merchant", "date", "total", "subtotal", "tax",
+    "tip", "discount", "other_fees", "tags", "lane", "ocr_mode", "summary_deferred", "created_at",
+)
+HISTORY_TEXT_FIELDS = ("summary", "raw_text")
+# Fallback texts LLMService stores when a summary call fails
+FALLBACK_SUMMARY_PREFIXES = ("Summary unavailable", "LLM Summary unavailable", "Summary generation failed")
+
+
+def encode_cursor(created_at: datetime, receipt_id: int) -> str:
+    """Opaque history cursor: the (created_at, id) of the last item of a page."""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{receipt_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        created_at, receipt_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(receipt_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class ReceiptRepository(BaseRepository[Receipt]):
     def __init__(self, session: AsyncSession):
         super().__init__(Receipt, session)
@@ -13,7 +44,131 @@ class ReceiptRepository(BaseRepository[Receipt]):
         result = await self.session.execute(statement)
         return result.scalars().first()
 
-    async def get_history(self, limit: int = 100) -> list[Receipt]:
-        statement = select(self.model).order_by(self.model.created_at.desc()).limit(limit)
+    async def get_by_task_ids(self, task_ids: list[str]) -> list[Receipt]:
+        statement = select(self.model).where(self.model.task_id.in_(task_ids))
         result = await self.session.execute(statement)
         return result.scalars().all()
+
+    def _reusable_for(self, ocr_mode: str):
+        """
+        Results that can serve a request in `ocr_mode`: a full-text result
+        serves either mode, a progressive (header/footer pages only) one only
+        progressive requests. Rows without a mode predate it and are full.
+        """
+        if ocr_mode == "full":
+            return or_(self.model.ocr_mode == "full", self.model.ocr_mode.is_(None))
+        return true()
+
+    def _has_summary(self):
+        """A real summary: not missing, deferred, or a fallback from a failed call."""
+        return and_(
+            self.model.summary.is_not(None),
+            self.model.summary_deferred.is_not(True),
+            self.model.summary_failed.is_not(True),
+            # Rows stored before summary_failed existed: recognize the fallback texts
+            or_(
+                self.model.summary_failed.is_not(None),
+                ~or_(*(self.model.summary.startswith(prefix) for prefix in FALLBACK_SUMMARY_PREFIXES)),
+            ),
+        )
+
+    async def get_completed_by_hash(self, content_hash: str, require_summary: bool = False,
+                                    ocr_mode: str = "full") -> Optional[Receipt]:
+        statement = select(self.model).where(
+            self.model.content_hash == content_hash,
+            self.model.status == "completed",
+            self._reusable_for(ocr_mode),
+        )
+        if require_summary:
+            statement = statement.where(self._has_summary())
+        statement = statement.order_by(self.model.created_at.desc()).limit(1)
+        result = await self.session.execute(statement)
+        return result.scalars().first()
+
+    async def get_completed_by_hashes(self, content_hashes: list[str], require_summary: bool = False,
+                                      ocr_mode: str = "full") -> dict[str, Receipt]:
+        """
+        Batch form of get_completed_by_hash: one query, newest match per hash.
+        """
+        if not content_hashes:
+            return {}
+        statement = select(self.model).where(
+            self.model.content_hash.in_(set(content_hashes)),
+            self.model.status == "completed",
+            self._reusable_for(ocr_mode),
+        )
+        if require_summary:
+            statement = statement.where(self._has_summary())
+        statement = statement.order_by(self.model.created_at.desc())
+        result = await self.session.execute(statement)
+        matches: dict[str, Receipt] = {}
+        for receipt in result.scalars().all():
+            matches.setdefault(receipt.content_hash, receipt)
+        return matches
+
+    async def count_in_flight_by_lane(self) -> dict[str | None, int]:
+        """
+        Unfinished (pending) receipts per lane, for admission control.
+        """
+        statement = (
+            select(self.model.lane, func.count())
+            .where(self.model.status == "pending")
+            .group_by(self.model.lane)
+        )
+        result = await self.session.execute(statement)
+        return {lane: count for lane, count in result.all()}
+
+    async def get_history(
+        self,
+        limit: int = 50,
+        cursor: str | None = None,
+        include: tuple[str, ...] = (),
+        status: str | None = None,
+        merchant: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        total_min: float | None = None,
+        total_max: float | None = None,
+        tags: list[str] | None = None,
+    ) -> dict:
+        """
+        One page of receipts, newest first, with keyset pagination on
+        (created_at, id): each page is an index range scan that starts after
+        the cursor, so deep pages cost the same as the first one.
+        Returns {"items", "next_cursor"}; next_cursor is None on the last page.
+        """
+        fields = HISTORY_FIELDS + tuple(f for f in HISTORY_TEXT_FIELDS if f in include)
+        statement = select(*(getattr(self.model, field) for field in fields))
+
+        if cursor:
+            created_at, receipt_id = decode_cursor(cursor)
+            statement = statement.where(tuple_(self.model.created_at, self.model.id) < tuple_(created_at, receipt_id))
+        if status:
+            statement = statement.where(self.model.status == status)
+        if merchant:
+            statement = statement.where(self.model.merchant.ilike(f"%{_escape_like(merchant)}%", escape="\\"))
+        # Receipt dates are stored as YYYY-MM-DD, so string comparison is date order
+        if date_from:
+            statement = statement.where(self.model.date >= date_from)
+        if date_to:
+            statement = statement.where(self.model.date <= date_to)
+        if total_min is not None:
+            statement = statement.where(self.model.total >= total_min)
+        if total_max is not None:
+            statement = statement.where(self.model.total <= total_max)
+        # Receipts carrying every tag; matched on the JSON text so it works on any backend
+        for tag in tags or ():
+            statement = statement.where(
+                cast(self.model.tags, String).like(f'%"{_escape_like(tag)}"%', escape="\\")
+            )
+
+        statement = statement.order_by(self.model.created_at.desc(), self.model.id.desc()).limit(limit + 1)
+        rows = (await self.session.execute(statement)).all()
+
+        items = [dict(zip(fields, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return {"items": items, "next_cursor": next_cursor}
+
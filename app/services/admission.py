@@ -0,0 +1,123 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.lanes import lane_queue
+
+logger = logging.getLogger(__name__)
+
+
+def probe_queue_depths(queues: list[str]) -> dict[str, int]:
+    """
+    Messages waiting in each broker queue, read with passive declares
+    (no messages are touched). Queues that don't exist yet count as empty.
+    """
+    from app.core.celery_app import celery_app
+
+    depths = {}
+    with celery_app.connection_for_read() as conn:
+        for queue in queues:
+            # A failed passive declare closes its channel, so one channel per queue
+            channel = conn.channel()
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except conn.channel_errors:
+                depths[queue] = 0
+            finally:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+    return depths
+
+
+class AdmissionController:
+    """
+    Admission control for the ingest endpoints. Each lane has a budget
+    (ADMISSION_LANE_BUDGETS) of messages waiting in its queue ("max_queued")
+    and of unfinished receipts ("max_in_flight"). Work for a lane over budget
+    is rejected with a Retry-After hint.
+
+    Both numbers come from a probe (broker queue depths, pending rows per
+    lane) cached for ADMISSION_PROBE_TTL seconds; admissions within that
+    window are added to the cached counts so bursts can't overshoot.
+    """
+
+    def __init__(self, probe_depths: Callable[[list[str]], dict[str, int]] = probe_queue_depths):
+        self.probe_depths = probe_depths
+        self._state: dict[str, dict[str, int]] | None = None
+        self._probed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self, count_in_flight: Callable[[], Awaitable[dict[str, int]]]) -> dict[str, dict[str, int]]:
+        async with self._lock:
+            if self._state is not None and time.monotonic() - self._probed_at < settings.ADMISSION_PROBE_TTL:
+                return self._state
+
+            lanes = list(settings.ADMISSION_LANE_BUDGETS)
+            queues = [lane_queue(lane) for lane in lanes]
+            try:
+                depths = await asyncio.to_thread(self.probe_depths, queues)
+                in_flight = await count_in_flight()
+            except Exception as e:
+                # Fail open: without a probe, ingest keeps working as before
+                logger.warning(f"Admission probe failed, admitting without limits: {e}")
+                metrics.increment("admission.probe_failed")
+                self._state = {}
+            else:
+                default = settings.DEFAULT_LANE
+                self._state = {
+                    lane: {
+                        "queued": depths.get(queue, 0),
+                        # Rows from before lanes existed count against the default lane
+                        "in_flight": in_flight.get(lane, 0) + (in_flight.get(None, 0) if lane == default else 0),
+                    }
+                    for lane, queue in zip(lanes, queues)
+                }
+            self._probed_at = time.monotonic()
+            return self._state
+
+    async def check(self, lane: str, count_in_flight: Callable[[], Awaitable[dict[str, int]]],
+                    reserve: bool = True) -> dict:
+        """
+        Decides whether one more job may enter `lane`; with reserve=False it
+        only checks (e.g. before an upload whose final lane isn't known yet).
+        `count_in_flight` returns unfinished receipts per lane (a DB query).
+        Returns {"admitted": bool, "retry_after": int | None, "reason": str | None}.
+        """
+        if not settings.ADMISSION_CONTROL:
+            return {"admitted": True, "retry_after": None, "reason": None}
+
+        state = (await self._refresh(count_in_flight)).get(lane)
+        budget = settings.ADMISSION_LANE_BUDGETS.get(lane)
+        if state is None or budget is None:
+            if reserve:
+                metrics.increment(f"admission.admitted.{lane}")
+            return {"admitted": True, "retry_after": None, "reason": None}
+
+        overload = max(
+            state["queued"] / budget["max_queued"] if "max_queued" in budget else 0,
+            state["in_flight"] / budget["max_in_flight"] if "max_in_flight" in budget else 0,
+        )
+        if overload >= 1:
+            metrics.increment(f"admission.rejected.{lane}")
+            # The further over budget, the longer clients should wait (capped)
+            retry_after = settings.ADMISSION_RETRY_AFTER * min(math.ceil(overload), 10)
+            return {"admitted": False, "retry_after": retry_after, "reason": f"Lane '{lane}' is at capacity"}
+
+        if reserve:
+            state["queued"] += 1
+            state["in_flight"] += 1
+            metrics.increment(f"admission.admitted.{lane}")
+        return {"admitted": True, "retry_after": None, "reason": None}
+
+    def snapshot(self) -> dict[str, Any]:
+        """Last probed (plus admitted) counts per lane, for /metrics."""
+        return {"lanes": self._state or {}, "age": time.monotonic() - self._probed_at if self._state is not None else None}
+
+
+admission_controller = AdmissionController()
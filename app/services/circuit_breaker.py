@@ -0,0 +1,205 @@
+import time
+import logging
+import threading
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Store keys: "open" expires when the cool-down ends; "tripped" outlives it,
+# marking the half-open period in which a single probe call is let through.
+OPEN, TRIPPED, PROBE, FAILURES = "open", "tripped", "probe", "failures"
+TRIPPED_TTL = 24 * 3600
+
+
+class LocalBreakerStore:
+    """
+    In-process stand-in for the Redis store: state is only shared by the
+    threads of one process (single-process setups and tests).
+    """
+
+    def __init__(self):
+        self._values: dict[str, tuple[Any, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Any:
+        value, expires_at = self._values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        """Sets the key only if it is absent; True if it was set."""
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def incr(self, key: str, ttl: float) -> int:
+        """Increments a counter; the TTL starts with the first increment."""
+        with self._lock:
+            count = (self._live(key) or 0) + 1
+            expires_at = self._values[key][1] if count > 1 else time.monotonic() + ttl
+            self._values[key] = (count, expires_at)
+            return count
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+
+class RedisBreakerStore:
+    """Breaker state in Redis, shared by every API and worker process."""
+
+    def __init__(self, url: str, prefix: str):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _sync_client(self) -> Any:
+        import redis
+
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            return self._client
+
+    def get(self, key: str) -> str | None:
+        value = self._sync_client().get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._sync_client().set(self.prefix + key, value, ex=int(ttl))
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self._sync_client().set(self.prefix + key, value, ex=int(ttl), nx=True))
+
+    def incr(self, key: str, ttl: float) -> int:
+        client = self._sync_client()
+        count = client.incr(self.prefix + key)
+        if count == 1:
+            client.expire(self.prefix + key, int(ttl))
+        return count
+
+    def delete(self, *keys: str) -> None:
+        self._sync_client().delete(*(self.prefix + key for key in keys))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass; `failure_threshold` consecutive failures (or calls
+    slower than `latency_slo`) within `failure_window` seconds open it.
+    Open: calls are refused for `open_seconds`.
+    Half-open: one probe call is let through; success closes the breaker,
+    failure opens it again.
+    If the store itself is unreachable the breaker lets calls through.
+    """
+
+    def __init__(self, store: LocalBreakerStore | RedisBreakerStore, name: str,
+                 failure_threshold: int, latency_slo: float, open_seconds: float, failure_window: float):
+        self.store = store
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.open_seconds = open_seconds
+        self.failure_window = failure_window
+
+    def state(self) -> str:
+        try:
+            if self.store.get(OPEN):
+                return "open"
+            return "half_open" if self.store.get(TRIPPED) else "closed"
+        except Exception:
+            return "unknown"
+
+    def allow(self) -> bool:
+        try:
+            if self.store.get(OPEN):
+                allowed = False
+            elif self.store.get(TRIPPED):
+                # The probe slot expires with the cool-down, so a lost probe is retried
+                allowed = self.store.add(PROBE, "1", self.open_seconds)
+            else:
+                return True
+        except Exception as e:
+            logger.warning(f"{self.name} breaker store unavailable, letting call through: {e}")
+            return True
+        if not allowed:
+            metrics.increment(f"{self.name}.breaker.rejected")
+        return allowed
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.latency_slo:
+            logger.warning(f"{self.name} call took {latency:.1f}s (SLO {self.latency_slo}s)")
+            metrics.increment(f"{self.name}.breaker.slow_calls")
+            self.record_failure()
+            return
+        try:
+            if self.store.get(TRIPPED):
+                logger.info(f"{self.name} breaker closed: probe succeeded")
+                metrics.increment(f"{self.name}.breaker.closed")
+            self.store.delete(FAILURES, TRIPPED, PROBE)
+        except Exception as e:
+            logger.warning(f"{self.name} breaker store unavailable: {e}")
+
+    def record_failure(self) -> None:
+        try:
+            if self.store.get(TRIPPED) or self.store.incr(FAILURES, self.failure_window) >= self.failure_threshold:
+                self._open()
+        except Exception as e:
+            logger.warning(f"{self.name} breaker store unavailable: {e}")
+
+    def _open(self) -> None:
+        self.store.set(OPEN, "1", self.open_seconds)
+        self.store.set(TRIPPED, "1", TRIPPED_TTL)
+        self.store.delete(FAILURES, PROBE)
+        metrics.increment(f"{self.name}.breaker.opened")
+        logger.warning(f"{self.name} breaker opened for {self.open_seconds}s")
+
+    def claim(self, key: str, ttl: float) -> bool:
+        """
+        Shared once-per-`ttl` token (e.g. to schedule a single follow-up job
+        across processes). True when the caller got it, or the store is down.
+        """
+        try:
+            return self.store.add(key, "1", ttl)
+        except Exception:
+            return True
+
+
+_llm_breaker: CircuitBreaker | None = None
+_llm_breaker_lock = threading.Lock()
+
+
+def get_llm_breaker() -> CircuitBreaker:
+    """Process-wide breaker for summary calls, configured from Settings (LLM_BREAKER_*)."""
+    global _llm_breaker
+    with _llm_breaker_lock:
+        if _llm_breaker is None:
+            if settings.LLM_BREAKER_BACKEND == "local":
+                store = LocalBreakerStore()
+            else:
+                from app.core.celery_app import BACKEND_URL
+                store = RedisBreakerStore(settings.LLM_BREAKER_REDIS_URL or BACKEND_URL, "llm-breaker:")
+            _llm_breaker = CircuitBreaker(
+                store, "llm",
+                failure_threshold=settings.LLM_BREAKER_FAILURES,
+                latency_slo=settings.LLM_LATENCY_SLO,
+                open_seconds=settings.LLM_BREAKER_OPEN_SECONDS,
+                failure_window=settings.LLM_BREAKER_WINDOW,
+            )
+        return _llm_breaker
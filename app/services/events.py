@@ -0,0 +1,149 @@
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Iterable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "task-events:"
+# Events after which a task produces nothing more
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def channel_for(task_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{task_id}"
+
+
+class LocalSubscription:
+    def __init__(self, bus: "LocalEventBus", task_ids: list[str]):
+        self.bus = bus
+        self.task_ids = task_ids
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put_threadsafe(self, event: dict) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        self.bus._unsubscribe(self)
+
+
+class LocalEventBus:
+    """
+    In-process stand-in for Redis pub/sub: only reaches subscribers in the
+    same process (single-process dev setups and tests).
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[LocalSubscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, task_id: str, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for subscription in subscribers:
+            subscription.put_threadsafe(event)
+
+    async def subscribe(self, task_ids: Iterable[str]) -> LocalSubscription:
+        subscription = LocalSubscription(self, list(task_ids))
+        with self._lock:
+            for task_id in subscription.task_ids:
+                self._subscribers.setdefault(task_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: LocalSubscription) -> None:
+        with self._lock:
+            for task_id in subscription.task_ids:
+                subscribers = self._subscribers.get(task_id)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[task_id]
+
+
+class RedisSubscription:
+    def __init__(self, client: Any, pubsub: Any):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+    async def close(self) -> None:
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisEventBus:
+    """
+    Redis pub/sub, one channel per task id. Workers publish with a shared sync
+    client; each API subscription uses its own async connection.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _sync_client(self) -> Any:
+        import redis
+
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self.url)
+            return self._client
+
+    def publish(self, task_id: str, event: dict) -> None:
+        self._sync_client().publish(channel_for(task_id), json.dumps(event, default=str))
+
+    async def subscribe(self, task_ids: Iterable[str]) -> RedisSubscription:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*(channel_for(task_id) for task_id in task_ids))
+        return RedisSubscription(client, pubsub)
+
+
+_event_bus: LocalEventBus | RedisEventBus | None = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> LocalEventBus | RedisEventBus:
+    """Process-wide event bus, configured from Settings (EVENTS_BACKEND)."""
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            if settings.EVENTS_BACKEND == "local":
+                _event_bus = LocalEventBus()
+            else:
+                from app.core.celery_app import BACKEND_URL
+                _event_bus = RedisEventBus(settings.EVENTS_REDIS_URL or BACKEND_URL)
+        return _event_bus
+
+
+def publish_event(task_id: str | None, event: str, **data: Any) -> None:
+    """
+    Publishes a task event ({"task_id", "event", ...}). Best effort: progress
+    events must never fail the pipeline, so errors are only logged.
+    """
+    if not task_id:
+        return
+    try:
+        get_event_bus().publish(task_id, {"task_id": task_id, "event": event, **data})
+    except Exception as e:
+        logger.warning(f"Could not publish '{event}' event for {task_id}: {e}")
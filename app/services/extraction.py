@@ -0,0 +1,153 @@
+import logging
+import numpy as np
+from app.core.config import settings
+from app.services.image import ImageService
+from app.services.ocr import OCRService
+from app.services.parser import parse_receipt
+from app.services.pdf import PDFService
+
+logger = logging.getLogger(__name__)
+
+OCR_MODES = ("full", "progressive")
+
+class ExtractionService:
+    """
+    Turns a stored document into raw text.
+    PDFs use their embedded text layer where usable and OCR elsewhere; images
+    are OCR'd. In progressive mode only the header and footer bands are read
+    first, and the full document is OCR'd only if required fields are missing.
+    Results are dicts: {raw_text, page_sources, ocr_mode}; progressive
+    results also carry the check's `parsed` fields, so the text is not parsed
+    a second time.
+    """
+
+    def __init__(self, image_service: ImageService, ocr_service: OCRService, pdf_service: PDFService):
+        self.image_service = image_service
+        self.ocr_service = ocr_service
+        self.pdf_service = pdf_service
+
+    def parse_if_complete(self, text: str) -> dict | None:
+        """The parsed fields when every required field was found, else None."""
+        parsed = parse_receipt(text)
+        for field in settings.OCR_REQUIRED_FIELDS:
+            value = parsed.get(field)
+            if value is None or (field == "merchant" and value == "Unknown Merchant"):
+                return None
+        return parsed
+
+    def _ocr_bands(self, image: np.ndarray) -> str:
+        bands = self.image_service.split_bands(image, settings.OCR_HEADER_BAND, settings.OCR_FOOTER_BAND)
+        return "\n".join(self.ocr_service.extract_texts(bands))
+
+    # --- Images ---
+
+    def extract_image(self, file_bytes: bytes, mode: str = "full") -> dict:
+        image = self.image_service.prepare_image_from_bytes(file_bytes)
+
+        if mode == "progressive":
+            raw_text = self._ocr_bands(image)
+            parsed = self.parse_if_complete(raw_text)
+            if parsed:
+                return {"raw_text": raw_text, "page_sources": ["ocr_roi"], "ocr_mode": "progressive", "parsed": parsed}
+            logger.info("Header/footer OCR missed required fields; running full OCR")
+
+        raw_text = self.ocr_service.extract_text(image)
+        return {"raw_text": raw_text, "page_sources": ["ocr"], "ocr_mode": "full"}
+
+    # --- PDFs ---
+
+    def extract_pdf(self, pdf_path: str, mode: str = "full") -> dict:
+        page_count = self.pdf_service.page_count(pdf_path)
+        text_layer = self._usable_text_layer(pdf_path, page_count)
+
+        if mode == "progressive":
+            result = self._extract_pdf_progressive(pdf_path, page_count, text_layer)
+            if result:
+                return result
+            logger.info(f"{pdf_path}: progressive pass missed required fields; running full extraction")
+
+        return self._extract_pdf_full(pdf_path, page_count, text_layer)
+
+    def _usable_text_layer(self, pdf_path: str, page_count: int) -> dict[int, str]:
+        if not settings.PDF_TEXT_LAYER:
+            return {}
+        return {
+            number: text
+            for number, text in enumerate(self.pdf_service.extract_text_layer(pdf_path), start=1)
+            if number <= page_count and self.pdf_service.has_usable_text(text, settings.PDF_TEXT_MIN_CHARS)
+        }
+
+    def _choose_dpi(self, pdf_path: str, probe_page: int) -> int:
+        """
+        With adaptive resolution, the DPI comes from a low-DPI probe page.
+        """
+        if not self.image_service.adaptive_resolution:
+            return settings.PDF_DPI
+        probe = self.pdf_service.render_page(pdf_path, probe_page, dpi=settings.PDF_PROBE_DPI)
+        dpi = self.image_service.choose_pdf_dpi(
+            probe, settings.PDF_PROBE_DPI, settings.PDF_MIN_DPI, settings.PDF_DPI
+        )
+        logger.info(f"Rasterizing {pdf_path} at {dpi} DPI")
+        return dpi
+
+    @staticmethod
+    def _join_pages(page_texts: dict[int, str]) -> str:
+        raw_text = ""
+        for number in sorted(page_texts):
+            raw_text += f"\n--- Page {number} ---\n{page_texts[number]}"
+        return raw_text
+
+    def _extract_pdf_progressive(self, pdf_path: str, page_count: int, text_layer: dict[int, str]) -> dict | None:
+        """
+        Totals sit at the end of a document and the merchant/date at the start,
+        so read the last page first, then the first page, stopping as soon as
+        the required fields are found.
+        """
+        page_texts: dict[int, str] = {}
+        page_sources = ["skipped"] * page_count
+        dpi = None
+
+        for number in dict.fromkeys((page_count, 1)):
+            if number in text_layer:
+                page_texts[number] = text_layer[number]
+                page_sources[number - 1] = "text"
+            else:
+                dpi = dpi or self._choose_dpi(pdf_path, number)
+                page = self.pdf_service.render_page(pdf_path, number, dpi=dpi)
+                page_texts[number] = self._ocr_bands(self.image_service.apply_thresholding(page))
+                page_sources[number - 1] = "ocr_roi"
+
+            raw_text = self._join_pages(page_texts)
+            parsed = self.parse_if_complete(raw_text)
+            if parsed:
+                return {"raw_text": raw_text, "page_sources": page_sources, "ocr_mode": "progressive",
+                        "parsed": parsed}
+        return None
+
+    def _extract_pdf_full(self, pdf_path: str, page_count: int, text_layer: dict[int, str]) -> dict:
+        """
+        Uses the text layer of born-digital pages and OCRs only pages without
+        usable text. Pages to OCR are rasterized in bounded grayscale windows
+        and OCR'd concurrently; page order is preserved in the raw text.
+        """
+        page_texts = dict(text_layer)
+        page_sources = {number: "text" for number in text_layer}
+
+        ocr_pages = [number for number in range(1, page_count + 1) if number not in page_texts]
+        logger.info(f"{pdf_path}: {len(page_texts)} page(s) from text layer, {len(ocr_pages)} to OCR")
+
+        if ocr_pages:
+            dpi = self._choose_dpi(pdf_path, ocr_pages[0])
+            for numbers, images in self.pdf_service.iter_page_windows(
+                pdf_path, ocr_pages, dpi=dpi, window=settings.PDF_PAGE_WINDOW
+            ):
+                texts = self.ocr_service.extract_texts(images, preprocess=self.image_service.apply_thresholding)
+                for number, page_text in zip(numbers, texts):
+                    page_texts[number] = page_text
+                    page_sources[number] = "ocr"
+
+        return {
+            "raw_text": self._join_pages(page_texts),
+            "page_sources": [page_sources[number] for number in range(1, page_count + 1)],
+            "ocr_mode": "full",
+        }
@@ -1,11 +1,74 @@
+import io
+import math
 import cv2
 import numpy as np
 import logging
 from PIL import Image
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Reduced-size decode modes (JPEG is scaled inside the decoder).
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+# Glyph height is estimated on a copy bounded to this many pixels.
+_ESTIMATE_MAX_PIXELS = 2_000_000
+# Receipt localization runs on a copy bounded to this many pixels.
+_LOCATE_MAX_PIXELS = 500_000
+# A detected paper region outside this fraction of the frame is not trusted.
+_MIN_RECEIPT_AREA = 0.15
+_MAX_RECEIPT_AREA = 0.9
+_CROP_PADDING = 0.02
+_MIN_GLYPHS = 20
+_MAX_UPSCALE = 2.0
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable file over a bytes-like object; unlike io.BytesIO it does not copy it."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
 class ImageService:
+    def __init__(
+        self,
+        adaptive_resolution: bool | None = None,
+        target_glyph_height: int | None = None,
+        max_pixels: int | None = None,
+        crop_receipt: bool | None = None,
+    ):
+        self.adaptive_resolution = (
+            settings.OCR_ADAPTIVE_RESOLUTION if adaptive_resolution is None else adaptive_resolution
+        )
+        self.target_glyph_height = target_glyph_height or settings.OCR_TARGET_GLYPH_HEIGHT
+        self.max_pixels = max_pixels or settings.OCR_MAX_PIXELS
+        self.crop_receipt = settings.OCR_CROP_RECEIPT if crop_receipt is None else crop_receipt
+
     def pil_to_cv2(self, pil_image: Image.Image) -> np.ndarray:
         """
         Converts a PIL Image (from pdf2image) to an OpenCV BGR numpy array.
@@ -15,9 +78,10 @@ class ImageService:
     def apply_thresholding(self, image: np.ndarray) -> np.ndarray:
         """
         Applies Grayscale and Otsu's thresholding to a loaded OpenCV image.
+        Single-channel input is thresholded as-is.
         """
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
             return thresh
         except Exception as e:
@@ -27,8 +91,20 @@ class ImageService:
     def prepare_image_from_bytes(self, file_bytes: bytes) -> np.ndarray:
         """
         Converts raw bytes -> OpenCV Image -> Thresholded Image
+        Any bytes-like object works (e.g. a memoryview of a fetch buffer).
+        With adaptive resolution, decodes to grayscale (reduced where the
+        source is oversized) and rescales to the OCR target glyph height.
+        With receipt cropping, the paper region is cut out first.
         """
-        image = self.decode_image(file_bytes)
+        if self.adaptive_resolution:
+            image = self.decode_image_for_ocr(file_bytes)
+            if self.crop_receipt:
+                image = self.crop_to_receipt(image)
+            image = self.normalize_resolution(image)
+        else:
+            image = self.decode_image(file_bytes)
+            if self.crop_receipt:
+                image = self.crop_to_receipt(image)
         return self.apply_thresholding(image)
 
     def decode_image(self, file_bytes: bytes) -> np.ndarray:
@@ -40,3 +116,150 @@ class ImageService:
         if image is None:
             raise ValueError("Could not decode image.")
         return image
+
+    def decode_image_for_ocr(self, file_bytes: bytes) -> np.ndarray:
+        """
+        Decodes raw bytes straight to grayscale, using the largest reduced-size
+        mode that still leaves at least `max_pixels` pixels.
+        """
+        flag = cv2.IMREAD_GRAYSCALE
+        try:
+            width, height = Image.open(_BufferReader(file_bytes)).size  # header only
+            for factor, reduced_flag in _REDUCED_GRAYSCALE:
+                if (width // factor) * (height // factor) >= self.max_pixels:
+                    flag = reduced_flag
+                    break
+        except Exception:
+            logger.debug("Could not read image header; decoding at full size.")
+
+        nparr = np.frombuffer(file_bytes, np.uint8)
+        image = cv2.imdecode(nparr, flag)
+        if image is None:
+            raise ValueError("Could not decode image.")
+        return image
+
+    def locate_receipt(self, image: np.ndarray) -> tuple[int, int, int, int] | None:
+        """
+        Finds the bounding box (x, y, w, h) of the receipt paper: the largest
+        bright contour on a size-bounded copy, after closing the gaps left by
+        the printed text. Returns None when no plausible region is found.
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        scale = min(1.0, math.sqrt(_LOCATE_MAX_PIXELS / (height * width)))
+        sample = gray
+        if scale < 1.0:
+            sample = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        blurred = cv2.GaussianBlur(sample, (5, 5), 0)
+        _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+
+        x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+        area_ratio = (w * h) / (sample.shape[0] * sample.shape[1])
+        if not _MIN_RECEIPT_AREA <= area_ratio <= _MAX_RECEIPT_AREA:
+            return None
+
+        pad_x = int(w * _CROP_PADDING)
+        pad_y = int(h * _CROP_PADDING)
+        x0 = max(0, int((x - pad_x) / scale))
+        y0 = max(0, int((y - pad_y) / scale))
+        x1 = min(width, int((x + w + pad_x) / scale))
+        y1 = min(height, int((y + h + pad_y) / scale))
+        return x0, y0, x1 - x0, y1 - y0
+
+    def crop_to_receipt(self, image: np.ndarray) -> np.ndarray:
+        """
+        Crops to the receipt region, falling back to the full frame.
+        """
+        try:
+            box = self.locate_receipt(image)
+        except cv2.error as e:
+            logger.warning(f"Receipt localization failed, using full frame: {e}")
+            return image
+
+        if box is None:
+            return image
+        x, y, w, h = box
+        logger.debug(f"Cropping {image.shape[1]}x{image.shape[0]} frame to receipt {w}x{h}")
+        return image[y:y + h, x:x + w]
+
+    def split_bands(self, image: np.ndarray, header: float, footer: float) -> list[np.ndarray]:
+        """
+        Returns the top `header` and bottom `footer` fractions of the image
+        (views, no copies), where merchant and totals usually sit.
+        """
+        height = image.shape[0]
+        header_end = max(1, int(height * header))
+        footer_start = min(height - 1, int(height * (1.0 - footer)))
+        return [image[:header_end], image[footer_start:]]
+
+    def estimate_glyph_height(self, gray: np.ndarray) -> float | None:
+        """
+        Estimates the median text glyph height (in pixels of `gray`) from the
+        connected components of a binarized, size-bounded copy.
+        Returns None when too few character-like components are found.
+        """
+        pixels = gray.shape[0] * gray.shape[1]
+        scale = min(1.0, math.sqrt(_ESTIMATE_MAX_PIXELS / pixels))
+        sample = gray
+        if scale < 1.0:
+            sample = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        _, binary = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        areas = stats[1:, cv2.CC_STAT_AREA]
+
+        glyphs = (
+            (heights >= 3)
+            & (heights <= sample.shape[0] * 0.1)
+            & (widths <= heights * 3)
+            & (areas >= 6)
+        )
+        if np.count_nonzero(glyphs) < _MIN_GLYPHS:
+            return None
+        return float(np.median(heights[glyphs])) / scale
+
+    def resolution_scale(self, gray: np.ndarray) -> float:
+        """
+        Scale factor that brings glyphs to the target height, bounded by
+        `max_pixels` and a maximum upscale.
+        """
+        glyph_height = self.estimate_glyph_height(gray)
+        factor = self.target_glyph_height / glyph_height if glyph_height else 1.0
+        factor = min(factor, _MAX_UPSCALE)
+
+        pixels = gray.shape[0] * gray.shape[1]
+        if pixels * factor * factor > self.max_pixels:
+            factor = math.sqrt(self.max_pixels / pixels)
+        return factor
+
+    def normalize_resolution(self, gray: np.ndarray) -> np.ndarray:
+        """
+        Rescales a grayscale image to the resolution Tesseract needs.
+        """
+        factor = self.resolution_scale(gray)
+        if abs(factor - 1.0) < 0.1:
+            return gray
+
+        interpolation = cv2.INTER_AREA if factor < 1.0 else cv2.INTER_CUBIC
+        logger.debug(f"Rescaling {gray.shape[1]}x{gray.shape[0]} image by {factor:.2f}")
+        return cv2.resize(gray, None, fx=factor, fy=factor, interpolation=interpolation)
+
+    def choose_pdf_dpi(self, probe: np.ndarray, probe_dpi: int, min_dpi: int, max_dpi: int) -> int:
+        """
+        Picks a rasterization DPI from a low-resolution probe render so that
+        glyphs land near the target height.
+        """
+        glyph_height = self.estimate_glyph_height(probe)
+        if not glyph_height:
+            return max_dpi
+        dpi = int(probe_dpi * self.target_glyph_height / glyph_height)
+        return max(min_dpi, min(max_dpi, dpi))
@@ -0,0 +1,71 @@
+import re
+import logging
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Page objects and page-tree counts, as written in uncompressed PDF objects
+_PAGE_OBJECT_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PAGE_COUNT_RE = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b")
+# Bytes kept between chunks so tokens split across a boundary still match
+_OVERLAP = 64
+
+
+class PDFPageCounter:
+    """
+    Estimates a PDF's page count from its raw bytes while they stream past,
+    without parsing or rasterizing. Uses the page tree's /Count when visible,
+    else the number of /Type /Page objects. PDFs whose objects all sit in
+    compressed object streams expose neither: page_count is then None.
+    """
+
+    def __init__(self):
+        self._tail = b""
+        self._pages = 0
+        self._count = 0
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._tail + chunk
+        # Count matches ending past the overlap (already seen ones end inside it);
+        # one ending right at the chunk end may still be "/Pages", so it waits.
+        skip = len(self._tail)
+        for match in _PAGE_OBJECT_RE.finditer(data):
+            if skip <= match.end() < len(data):
+                self._pages += 1
+        for match in _PAGE_COUNT_RE.finditer(data):
+            self._count = max(self._count, int(match.group(1) or match.group(2)))
+        self._tail = data[-_OVERLAP:]
+
+    @property
+    def page_count(self) -> int | None:
+        return self._count or self._pages or None
+
+
+def _rule_matches(rule: dict, content_type: str, size: int, page_count: int | None) -> bool:
+    if "types" in rule and content_type not in rule["types"]:
+        return False
+    if "min_bytes" in rule and size < rule["min_bytes"]:
+        return False
+    if "max_bytes" in rule and size > rule["max_bytes"]:
+        return False
+    # Page conditions never match when the page count is unknown
+    if "min_pages" in rule and (page_count is None or page_count < rule["min_pages"]):
+        return False
+    if "max_pages" in rule and (page_count is None or page_count > rule["max_pages"]):
+        return False
+    return True
+
+
+def choose_lane(content_type: str, size: int, page_count: int | None = None, rules: list[dict] | None = None) -> str:
+    """
+    Lane of a submission: the first matching rule of LANE_RULES, else DEFAULT_LANE.
+    """
+    for rule in settings.LANE_RULES if rules is None else rules:
+        if _rule_matches(rule, content_type, size, page_count):
+            return rule["lane"]
+    return settings.DEFAULT_LANE
+
+
+def lane_queue(lane: str | None) -> str:
+    """Queue consumed by the OCR workers of a lane."""
+    return settings.LANE_QUEUES.get(lane or settings.DEFAULT_LANE, settings.LANE_QUEUES[settings.DEFAULT_LANE])
@@ -1,24 +1,108 @@
-import logging
+import os
 import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.circuit_breaker import CircuitBreaker, get_llm_breaker
+from app.services.prompt_compaction import compact_receipt_text
+from app.services.summary_cache import SummaryCache, get_summary_cache, summary_key
 
 logger = logging.getLogger(__name__)
 
+# Provider responses worth retrying (rate limits and transient server errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Returned instead of a summary while the circuit breaker is open; such
+# receipts are flagged and summarized later by backfill_summaries_task
+SUMMARY_DEFERRED = "Summary deferred (provider unavailable)."
+
+
+class InvalidLLMResponse(ValueError):
+    pass
+
+
+def failed_summary(fallback: str, deferred: bool = False) -> dict:
+    """Outcome of a summary attempt that produced no summary."""
+    return {"summary": fallback, "ok": False, "deferred": deferred}
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    True when an error says the provider is unhealthy (timeouts, connection
+    errors, 429/5xx), which is what the circuit breaker counts. Errors about
+    one request (other 4xx, unparseable answers) are not.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, (requests.exceptions.HTTPError, httpx.HTTPStatusError)):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return False
+
+# --- Process-wide HTTP pool ---
+# One keep-alive session per process (rebuilt after fork), sized to the
+# concurrency limit, so summaries reuse TCP/TLS connections.
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
+# Caps concurrent provider calls across all threads of the process
+_call_slots = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+
+
+def get_http_session() -> requests.Session:
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.LLM_MAX_CONCURRENCY)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def close_http_session() -> None:
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    Full-jitter exponential backoff; a provider's Retry-After (seconds) is
+    honoured up to LLM_BACKOFF_MAX.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), settings.LLM_BACKOFF_MAX)
+    return random.uniform(0, min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2 ** attempt))
+
+
 class LLMService:
-    def __init__(self, api_key: str | None = None, model: str | None = None):
+    def __init__(self, api_key: str | None = None, model: str | None = None, url: str | None = None,
+                 cache: SummaryCache | None = None, breaker: CircuitBreaker | None = None):
         self.api_key = api_key or settings.OPENROUTER_API_KEY
         self.model = model or settings.OPENROUTER_MODEL
-        self.url = "https://openrouter.ai/api/v1/chat/completions"
+        self.url = url or settings.LLM_API_URL
+        self.cache = cache if cache is not None or not settings.SUMMARY_CACHE_ENABLED else get_summary_cache()
+        self.breaker = breaker if breaker is not None or not settings.LLM_BREAKER_ENABLED else get_llm_breaker()
+        self.timeout = (settings.LLM_CONNECT_TIMEOUT, settings.LLM_TIMEOUT)
+        # Async client and slots are bound to the event loop that created them
+        self._async_loop = None
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_slots: asyncio.Semaphore | None = None
 
-    def generate_summary(self, raw_text: str, total: float | None, date: str | None) -> str:
-        """
-        Sends data to OpenRouter (DeepSeek/Llama/etc) for summarization.
-        """
-        if not self.api_key:
-            return "LLM Summary unavailable (API Key not configured)."
-
-        user_content = f"""
+    def build_prompt(self, raw_text: str, total: float | None, date: str | None) -> str:
+        return f"""
             Act as a financial assistant. Analyze the following receipt text and extracted data.
             
             Extracted Data:
@@ -36,52 +120,243 @@ class LLMService:
             Format the output as a simple string, do not use Markdown.
             """
 
-        headers = {
+    def _headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": settings.SITE_URL, 
             "X-Title": settings.SITE_NAME,
         }
-        
+
+    def _body(self, raw_text: str, total: float | None, date: str | None) -> str:
+        if settings.LLM_COMPACT_PROMPT:
+            compacted = compact_receipt_text(raw_text, settings.LLM_PROMPT_TOKEN_BUDGET)
+            metrics.observe("llm.prompt.compression_ratio", compacted["ratio"])
+            metrics.observe("llm.prompt.tokens", compacted["tokens"])
+            raw_text = compacted["text"]
         data = {
             "model": self.model,
             "messages": [
                 {
                     "role": "user",
-                    "content": user_content
+                    "content": self.build_prompt(raw_text, total, date)
                 }
             ],
             "temperature": 0.3, 
         }
+        return json.dumps(data)
 
-        try:        
-            response = requests.post(
-                url=self.url, 
-                headers=headers, 
-                data=json.dumps(data),
-                timeout=10
-            )
+    @staticmethod
+    def _parse_content(result_json: dict) -> str:
+        if 'choices' in result_json and len(result_json['choices']) > 0:
+            content = result_json['choices'][0]['message']['content']
+            if "<think>" in content:
+                content = content.split("</think>")[-1].strip()
+            return content
+        raise InvalidLLMResponse(f"Unexpected API response format: {result_json}")
 
-            response.raise_for_status()
-            result_json = response.json()
-            
-            if 'choices' in result_json and len(result_json['choices']) > 0:
-                content = result_json['choices'][0]['message']['content']
-                if "<think>" in content:
-                    content = content.split("</think>")[-1].strip()
-                return content
-            else:
-                logger.warning(f"Unexpected API response format: {result_json}")
-                return "Summary unavailable (Invalid response format)."
+    def cache_key(self, raw_text: str, total: float | None, date: str | None) -> str:
+        return summary_key(self.model, raw_text, total, date)
+
+    def generate_summary(self, raw_text: str, total: float | None, date: str | None) -> str:
+        """
+        Sends data to OpenRouter (DeepSeek/Llama/etc) for summarization.
+        Returns the summary, or a fallback string when none could be made
+        (see summarize for the outcome).
+        """
+        return self.summarize(raw_text, total, date)["summary"]
+
+    def summarize(self, raw_text: str, total: float | None, date: str | None) -> dict:
+        """
+        Summary with its outcome: {"summary", "ok", "deferred"}. `ok` is True
+        only for a real summary; otherwise `summary` is a fallback string and
+        `deferred` tells whether the circuit breaker skipped the call.
+        Repeated receipts are answered from the summary cache; only real
+        summaries are cached.
+        """
+        if not self.api_key:
+            return failed_summary("LLM Summary unavailable (API Key not configured).")
 
+        key = self.cache_key(raw_text, total, date)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return {"summary": cached, "ok": True, "deferred": False}
+        if self.breaker is not None and not self.breaker.allow():
+            return failed_summary(SUMMARY_DEFERRED, deferred=True)
+
+        try:
+            summary = self._call(self._body(raw_text, total, date))
         except requests.exceptions.Timeout:
             logger.error("OpenRouter API timed out.")
-            return "Summary unavailable (Timeout)."
-            
+            return failed_summary("Summary unavailable (Timeout).")
         except requests.exceptions.HTTPError as e:
             logger.error(f"OpenRouter HTTP Error: {e}")
-            return f"Summary unavailable (Provider Error: {response.status_code if 'response' in locals() else 'Unknown'})"
-            
+            return failed_summary(f"Summary unavailable (Provider Error: {e.response.status_code})")
+        except InvalidLLMResponse as e:
+            logger.warning(str(e))
+            return failed_summary("Summary unavailable (Invalid response format).")
         except Exception as e:
             logger.error(f"LLM Error: {e}")
-            return "Summary generation failed."
+            return failed_summary("Summary generation failed.")
+
+        if self.cache is not None:
+            self.cache.set(key, summary)
+        return {"summary": summary, "ok": True, "deferred": False}
+
+    def _call(self, body: str) -> str:
+        """
+        _complete, with its outcome and latency reported to the breaker. Only
+        provider failures count against it; a request the provider answered
+        but rejected counts as a (possibly slow) answer.
+        """
+        started = time.monotonic()
+        try:
+            summary = self._complete(body)
+        except Exception as e:
+            if self.breaker is not None:
+                if is_provider_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success(time.monotonic() - started)
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success(time.monotonic() - started)
+        return summary
+
+    def _complete(self, body: str) -> str:
+        """
+        One completion over the pooled session, at most LLM_MAX_CONCURRENCY
+        calls per process. Timeouts, connection errors and 429/5xx are retried
+        with jittered backoff; the last error is raised.
+        """
+        session = get_http_session()
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            retries_left = attempt < settings.LLM_MAX_RETRIES
+            try:
+                with _call_slots:
+                    response = session.post(url=self.url, headers=self._headers(), data=body, timeout=self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if not retries_left:
+                    raise
+                logger.warning(f"OpenRouter call failed ({e}); retrying")
+                time.sleep(backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and retries_left:
+                logger.warning(f"OpenRouter returned {response.status_code}; retrying")
+                time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            response.raise_for_status()
+            return self._parse_content(response.json())
+
+    # --- Async variant ---
+
+    def _async_resources(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            limits = httpx.Limits(
+                max_connections=settings.LLM_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.LLM_MAX_CONCURRENCY,
+            )
+            timeout = httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+            self._async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+            self._async_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+            self._async_loop = loop
+        return self._async_client, self._async_slots
+
+    async def generate_summary_async(self, raw_text: str, total: float | None, date: str | None) -> str:
+        return (await self.summarize_async(raw_text, total, date))["summary"]
+
+    async def summarize_async(self, raw_text: str, total: float | None, date: str | None) -> dict:
+        """
+        Non-blocking summarize: a pooled httpx client per event loop, at most
+        LLM_MAX_CONCURRENCY calls in flight, same cache, breaker and outcomes.
+        """
+        if not self.api_key:
+            return failed_summary("LLM Summary unavailable (API Key not configured).")
+
+        key = self.cache_key(raw_text, total, date)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return {"summary": cached, "ok": True, "deferred": False}
+        if self.breaker is not None and not await asyncio.to_thread(self.breaker.allow):
+            return failed_summary(SUMMARY_DEFERRED, deferred=True)
+
+        try:
+            summary = await self._call_async(self._body(raw_text, total, date))
+        except httpx.TimeoutException:
+            logger.error("OpenRouter API timed out.")
+            return failed_summary("Summary unavailable (Timeout).")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"OpenRouter HTTP Error: {e}")
+            return failed_summary(f"Summary unavailable (Provider Error: {e.response.status_code})")
+        except InvalidLLMResponse as e:
+            logger.warning(str(e))
+            return failed_summary("Summary unavailable (Invalid response format).")
+        except Exception as e:
+            logger.error(f"LLM Error: {e!r}")
+            return failed_summary("Summary generation failed.")
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, summary)
+        return {"summary": summary, "ok": True, "deferred": False}
+
+    async def _call_async(self, body: str) -> str:
+        started = time.monotonic()
+        try:
+            summary = await self._complete_async(body)
+        except Exception as e:
+            if self.breaker is not None:
+                if is_provider_failure(e):
+                    await asyncio.to_thread(self.breaker.record_failure)
+                else:
+                    await asyncio.to_thread(self.breaker.record_success, time.monotonic() - started)
+            raise
+        if self.breaker is not None:
+            await asyncio.to_thread(self.breaker.record_success, time.monotonic() - started)
+        return summary
+
+    async def _complete_async(self, body: str) -> str:
+        client, slots = self._async_resources()
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            retries_left = attempt < settings.LLM_MAX_RETRIES
+            try:
+                async with slots:
+                    response = await client.post(self.url, headers=self._headers(), content=body)
+            except httpx.TransportError as e:
+                if not retries_left:
+                    raise
+                logger.warning(f"OpenRouter call failed ({e!r}); retrying")
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and retries_left:
+                logger.warning(f"OpenRouter returned {response.status_code}; retrying")
+                await asyncio.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            response.raise_for_status()
+            return self._parse_content(response.json())
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = self._async_loop = self._async_slots = None
+
+    def generate_summaries(self, items: list[tuple[str, float | None, str | None]]) -> list[str]:
+        """
+        Summarizes many receipts concurrently from sync code. Items are
+        (raw_text, total, date); order is preserved.
+        """
+        return [result["summary"] for result in self.summarize_many(items)]
+
+    def summarize_many(self, items: list[tuple[str, float | None, str | None]]) -> list[dict]:
+        """Batch summarize (e.g. the worker backfill), outcomes included."""
+        async def run() -> list[dict]:
+            try:
+                return await asyncio.gather(*(self.summarize_async(*item) for item in items))
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
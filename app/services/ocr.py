@@ -1,24 +1,150 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, List
 import pytesseract
 import numpy as np
 import logging
 from app.core.config import settings
 
+try:
+    import tesserocr
+except ImportError:  # Optional: falls back to the pytesseract subprocess path
+    tesserocr = None
+
 logger = logging.getLogger(__name__)
 
+OCR_BACKENDS = ("auto", "tesserocr", "pytesseract")
+
+
+class OCREngineUnavailable(RuntimeError):
+    """Raised when an in-process Tesseract engine cannot be initialized."""
+
+
+class TesseractEnginePool:
+    """
+    Pool of initialized in-process Tesseract engines (tesserocr / C API).
+    Engines are created lazily up to `size` and reused across calls, so the
+    language model is loaded once per engine rather than once per image.
+    """
+
+    def __init__(self, size: int = 1, lang: str = "eng", psm: int = 4, oem: int = 3,
+                 tessdata_path: str | None = None):
+        self.size = max(1, size)
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.tessdata_path = tessdata_path
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Engines must not cross a fork; remember which process owns them.
+        self._pid = os.getpid()
+
+    def _create_engine(self):
+        kwargs = {"lang": self.lang, "psm": self.psm, "oem": self.oem}
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path
+        try:
+            return tesserocr.PyTessBaseAPI(**kwargs)
+        except RuntimeError as e:
+            raise OCREngineUnavailable(str(e)) from e
+
+    def _reset_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            self._idle = queue.LifoQueue()
+            self._created = 0
+            self._pid = os.getpid()
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            self._reset_after_fork()
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = None
+                if self._created < self.size:
+                    engine = self._create_engine()
+                    self._created += 1
+
+        if engine is None:
+            engine = self._idle.get()
+
+        try:
+            yield engine
+        finally:
+            engine.Clear()
+            self._idle.put(engine)
+
+    def recognize(self, image: np.ndarray) -> str:
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        with self.acquire() as engine:
+            engine.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+            return engine.GetUTF8Text()
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().End()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+_engine_pool: TesseractEnginePool | None = None
+_engine_pool_lock = threading.Lock()
+
+
+def get_engine_pool() -> TesseractEnginePool:
+    """Process-wide engine pool, configured from Settings."""
+    global _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is None:
+            # One engine per concurrent page worker, so threads never queue on the pool
+            _engine_pool = TesseractEnginePool(
+                size=max(settings.OCR_POOL_SIZE, settings.OCR_PAGE_WORKERS),
+                lang=settings.OCR_LANG,
+                tessdata_path=settings.TESSDATA_PATH,
+            )
+        return _engine_pool
+
+
 class OCRService:
-    def __init__(self, tesseract_path: str | None = None):
+    def __init__(self, tesseract_path: str | None = None, backend: str | None = None):
         if tesseract_path:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
         elif settings.TESSERACT_PATH:
             pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_PATH
 
+        self.backend = self._resolve_backend(backend or settings.OCR_BACKEND)
+
+    def _resolve_backend(self, backend: str) -> str:
+        if backend not in OCR_BACKENDS:
+            raise ValueError(f"Unknown OCR backend '{backend}'. Allowed: {', '.join(OCR_BACKENDS)}")
+
+        if backend == "pytesseract":
+            return backend
+        if tesserocr is None:
+            if backend == "tesserocr":
+                logger.warning("tesserocr is not installed; falling back to pytesseract.")
+            return "pytesseract"
+        return "tesserocr"
+
     def extract_text(self, image: np.ndarray) -> str:
         """
         Wraps Tesseract execution with error handling and logging.
         """
         try:
-            custom_config = r'--oem 3 --psm 4'
-            text = pytesseract.image_to_string(image, config=custom_config)
+            if self.backend == "tesserocr":
+                text = self._extract_with_engine(image)
+            else:
+                text = self._extract_with_subprocess(image)
             
             if not text.strip():
                 logger.warning("OCR returned empty text.")
@@ -32,3 +158,44 @@ class OCRService:
         except Exception as e:
             logger.error(f"OCR Failed: {str(e)}")
             raise RuntimeError("Failed to extract text from image.")
+
+    def extract_texts(
+        self,
+        images: List[np.ndarray],
+        preprocess: Callable[[np.ndarray], np.ndarray] | None = None,
+        max_workers: int | None = None,
+    ) -> List[str]:
+        """
+        OCRs several images concurrently, returning texts in input order.
+        Tesseract and OpenCV release the GIL, so threads spread across cores.
+        """
+        def run(image: np.ndarray) -> str:
+            if preprocess:
+                image = preprocess(image)
+            return self.extract_text(image)
+
+        max_workers = max_workers or settings.OCR_PAGE_WORKERS
+        if max_workers <= 1 or len(images) <= 1:
+            return [run(image) for image in images]
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as executor:
+            return list(executor.map(run, images))
+
+    def _extract_with_subprocess(self, image: np.ndarray) -> str:
+        custom_config = r'--oem 3 --psm 4'
+        return pytesseract.image_to_string(image, config=custom_config)
+
+    def _extract_with_engine(self, image: np.ndarray) -> str:
+        try:
+            return get_engine_pool().recognize(image)
+        except OCREngineUnavailable as e:
+            # Engine init failures (e.g. missing tessdata) are permanent for
+            # this process, so stop trying the pool and use the subprocess path.
+            logger.error(f"Tesseract engine unavailable, falling back to pytesseract: {e}")
+            self.backend = "pytesseract"
+            return self._extract_with_subprocess(image)
+
+    def close(self) -> None:
+        """Releases pooled engines (call on worker process shutdown)."""
+        if _engine_pool is not None:
+            _engine_pool.close()
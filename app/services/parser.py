@@ -1,18 +1,181 @@
 import re
 import logging
+from datetime import date
+from functools import lru_cache
 from typing import Optional, List, Tuple
 from dateparser.search import search_dates
+from app.core.metrics import metrics
 from app.schemas.receipt import LineItem
 
 logger = logging.getLogger(__name__)
 
+# Regex for currency: Matches $10.00, 1,000.50, 50.00, (20.00), -15.00 etc.
+MONEY_PATTERN = r"([\(|-]?\s*(?:[$€£¥]?\s*)?\d{1,3}(?:,\d{3})*(\.\d{2})\s*[\)|-]?)"
+MONEY_RE = re.compile(MONEY_PATTERN)
+_NON_NUMERIC_RE = re.compile(r'[^\d.,-]')
+_DIGIT_RE = re.compile(r"\d")
+
+# Keyword families, matched as lowercase substrings of a line.
+TOTAL_KEYWORDS = ("total", "amount due", "grand total", "balance due", "payment", "grand amount")
+SUBTOTAL_KEYWORDS = ("subtotal", "sub total", "net amount", "taxable")
+TAX_KEYWORDS = ("tax", "vat", "gst", "hst", "sales tax")
+TIP_KEYWORDS = ("tip", "gratuity", "service charge", "svc chg")
+DISCOUNT_KEYWORDS = ("discount", "savings", "coupon", "promo", "credit")
+OTHER_FEES_KEYWORDS = ("fee", "charge", "surcharge", "extra", "convenience")
+
+
+_MONTHS = ("january", "february", "march", "april", "may", "june", "july",
+           "august", "september", "october", "november", "december")
+_MONTH_ALT = "Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec"
+
+# Cheap date strategies, tried in order before falling back to dateparser.
+# Each entry: (strategy name, compiled pattern, native format kind).
+DATE_STRATEGIES = (
+    # Labeled Date (e.g., "Date: 10/12/23")
+    ("labeled", re.compile(r"(?i)date\s*[:.]?\s*(\d{1,2}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{2,4})"), "numeric"),
+    # Standard Slash/Dash (e.g., 12/12/2023 or 2023-12-12)
+    ("numeric", re.compile(r"(\d{1,2}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{4})"), "numeric"),
+    ("year_first", re.compile(r"(\d{4}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{1,2})"), "year_first"),
+    # Text Month (e.g., 12 Oct 2023)
+    ("month_name", re.compile(rf"(\d{{1,2}}\s+(?:{_MONTH_ALT})[a-z]*\s+\d{{4}})"), "day_month"),
+    # Month first (e.g., Nov 12, 2023)
+    ("month_first", re.compile(rf"((?:{_MONTH_ALT})[a-z]*\.?\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}})"), "month_day"),
+)
+DATEPARSER_STRATEGY = "dateparser"
+_DATE_PARTS_RE = re.compile(r"\d+|[A-Za-z]+")
+
+
+def _month_number(name: str) -> Optional[int]:
+    name = name.lower()
+    if len(name) < 3:
+        return None
+    for i, month in enumerate(_MONTHS, start=1):
+        if month.startswith(name):
+            return i
+    return None
+
+
+def _build_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        candidate = date(year, month, day)
+    except ValueError:
+        return None
+    return candidate if 1970 <= candidate.year <= 2030 else None
+
+
+@lru_cache(maxsize=4096)
+def normalize_date(date_str: str, kind: str) -> Optional[str]:
+    """
+    Native parser for the formats matched by DATE_STRATEGIES.
+    Mirrors dateparser's English defaults: month-first for numeric dates,
+    falling back to day-first when the month is out of range.
+    Returns YYYY-MM-DD, or None if the string is not a valid receipt date.
+    """
+    parts = _DATE_PARTS_RE.findall(date_str)
+    if len(parts) < 3:
+        return None
+
+    if kind == "numeric":
+        first, second, year_str = parts[:3]
+        if len(year_str) == 3:
+            return None
+        year = int(year_str)
+        if len(year_str) <= 2:
+            year += 2000 if year < 69 else 1900
+        first, second = int(first), int(second)
+        parsed = _build_date(year, first, second) or _build_date(year, second, first)
+    elif kind == "year_first":
+        year, first, second = (int(p) for p in parts[:3])
+        parsed = _build_date(year, first, second) or _build_date(year, second, first)
+    elif kind == "day_month":
+        month = _month_number(parts[1])
+        parsed = _build_date(int(parts[2]), month, int(parts[0])) if month else None
+    elif kind == "month_day":
+        month = _month_number(parts[0])
+        day = parts[1] if parts[1].isdigit() else None
+        parsed = _build_date(int(parts[-1]), month, int(day)) if month and day and parts[-1].isdigit() else None
+    else:
+        raise ValueError(f"Unknown date kind: {kind}")
+
+    return parsed.strftime("%Y-%m-%d") if parsed else None
+
+
+def get_date_strategy_stats() -> dict:
+    """
+    Per-strategy hit counts and rates for extract_date in this process,
+    plus the memo cache statistics.
+    """
+    counters = metrics.counters("parser.date_strategy.")
+    calls = sum(counters.values())
+    strategies = {}
+    for key, hits in counters.items():
+        name = key.rsplit(".", 1)[-1]
+        strategies[name] = {"hits": hits, "rate": hits / calls if calls else 0.0}
+    cache = normalize_date.cache_info()
+    return {
+        "calls": calls,
+        "strategies": strategies,
+        "cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize},
+    }
+
+
+class LineClassifier:
+    """
+    Precompiled single-pass line classifier.
+
+    All keyword families are folded into one alternation wrapped in a
+    lookahead, so a single scan of a line reports every keyword occurrence
+    (overlapping ones included) instead of one substring scan per keyword.
+    """
+
+    def __init__(self, families: dict[str, Tuple[str, ...]]):
+        keyword_families: dict[str, set[str]] = {}
+        for family, keywords in families.items():
+            for keyword in keywords:
+                keyword_families.setdefault(keyword, set()).add(family)
+
+        # Alternation picks one keyword per start position, so a longer match
+        # ("taxable") inherits the families of every keyword it contains ("tax").
+        self._families = {
+            keyword: frozenset().union(*(
+                fams for other, fams in keyword_families.items() if other in keyword
+            ))
+            for keyword in keyword_families
+        }
+        alternation = "|".join(
+            re.escape(k) for k in sorted(keyword_families, key=len, reverse=True)
+        )
+        self._keyword_re = re.compile(f"(?=({alternation}))")
+
+    def families(self, line: str) -> frozenset:
+        """Returns every keyword family present in the line."""
+        found = frozenset()
+        for match in self._keyword_re.finditer(line.lower()):
+            found |= self._families[match.group(1)]
+        return found
+
+    def money_values(self, line: str) -> List[str]:
+        """Returns all currency-formatted strings in the line, in order."""
+        return [m.group(1) for m in MONEY_RE.finditer(line)]
+
+
+LINE_CLASSIFIER = LineClassifier({
+    "total": TOTAL_KEYWORDS,
+    "subtotal": SUBTOTAL_KEYWORDS,
+    "tax": TAX_KEYWORDS,
+    "tip": TIP_KEYWORDS,
+    "discount": DISCOUNT_KEYWORDS,
+    "other_fees": OTHER_FEES_KEYWORDS,
+    # "sub" guards against "Subtotal" triggering "Total"
+    "sub": ("sub",),
+})
+
 class FinancialParser:
     def __init__(self, text: str):
         self.text = text
         self.lines = [line.strip() for line in text.split('\n') if line.strip()]
-        
-        # Regex for currency: Matches $10.00, 1,000.50, 50.00, (20.00), -15.00 etc.
-        self.money_pattern = r"([\(|-]?\s*(?:[$€£¥]?\s*)?\d{1,3}(?:,\d{3})*(\.\d{2})\s*[\)|-]?)"
+        self.money_pattern = MONEY_RE
+        self.classifier = LINE_CLASSIFIER
 
     def _parse_float(self, amount_str: str) -> float:
         """
@@ -22,7 +185,7 @@ class FinancialParser:
         """
         try:
             # Remove currency symbols and whitespace
-            clean_str = re.sub(r'[^\d.,-]', '', amount_str)
+            clean_str = _NON_NUMERIC_RE.sub('', amount_str)
             
             # Handle trailing negative sign (OCR quirk: "5.00-")
             if clean_str.endswith('-'):
@@ -45,33 +208,18 @@ class FinancialParser:
         1. Look for 'Date:' label + Regex (Highest Confidence)
         2. Look for strict Regex patterns (Medium Confidence)
         3. Fallback to dateparser (Low Confidence)
+        Steps 1-2 use the native normalize_date; dateparser only runs
+        when every cheap strategy has failed.
         """
         full_text = "\n".join(self.lines)
 
-        # --- STRATEGY 1: Regex Patterns ---
-        regex_patterns = [
-            # Labeled Date (e.g., "Date: 10/12/23")
-            r"(?i)date\s*[:.]?\s*(\d{1,2}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{2,4})",
-            # Standard Slash/Dash (e.g., 12/12/2023 or 2023-12-12)
-            r"(\d{1,2}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{4})", 
-            r"(\d{4}\s*[/\-.]\s*\d{1,2}\s*[/\-.]\s*\d{1,2})",
-            # Text Month (e.g., 12 Oct 2023)
-            r"(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})"
-        ]
-
-        for pattern in regex_patterns:
-            matches = re.search(pattern, full_text)
-            if matches:
-                date_str = matches.group(1)
-                # use dateparser to convert the clean regex string to an object
-                try:
-                    parsed = search_dates(date_str, languages=['en'])
-                    if parsed:
-                        date_obj = parsed[0][1]
-                        if self._is_valid_date(date_obj):
-                            return date_obj.strftime("%Y-%m-%d")
-                except Exception:
-                    continue
+        for name, pattern, kind in DATE_STRATEGIES:
+            match = pattern.search(full_text)
+            if match:
+                normalized = normalize_date(match.group(1), kind)
+                if normalized:
+                    metrics.increment(f"parser.date_strategy.{name}")
+                    return normalized
 
         try:
             settings = {
@@ -84,16 +232,20 @@ class FinancialParser:
             if dates:
                 for _, date_obj in dates:
                     if self._is_valid_date(date_obj):
+                        metrics.increment(f"parser.date_strategy.{DATEPARSER_STRATEGY}")
                         return date_obj.strftime("%Y-%m-%d")
 
         except Exception as e:
             logger.warning(f"Date extraction failed: {e}")
         
+        metrics.increment("parser.date_strategy.none")
         return None
 
     def extract_financials(self) -> dict:
         """
         Extracts Total, Subtotal, and Tax using a tiered keyword strategy.
+        Each line is tokenized once; the money values collected on the way
+        feed the max-value fallback without a second pass.
         """
         results = {
             "total": None, 
@@ -103,68 +255,58 @@ class FinancialParser:
             "tip": None,
             "other_fees": None
         }
-        
-        total_keywords = ["total", "amount due", "grand total", "balance due", "payment", "grand amount"]
-        subtotal_keywords = ["subtotal", "sub total", "net amount", "taxable"]
-        tax_keywords = ["tax", "vat", "gst", "hst", "sales tax"]
-        tip_keywords = ["tip", "gratuity", "service charge", "svc chg"]
-        discount_keywords = ["discount", "savings", "coupon", "promo", "credit"]
-        other_fees_keywords = ["fee", "charge", "surcharge", "extra", "convenience"]
+        all_floats = []
 
         # Iterate lines backwards (Totals are usually at the bottom)
         for line in reversed(self.lines):
-            lower_line = line.lower()
-            
-            # Find all numbers in the line
-            matches = re.findall(self.money_pattern, line)
+            matches = self.classifier.money_values(line)
             if not matches:
                 continue
-            
+
+            values = [self._parse_float(m) for m in matches]
+            all_floats.extend(values)
+
             # The last number in the line is usually the value (e.g., "Total ........ 10.00")
-            val_str = matches[-1][0] 
-            val = self._parse_float(val_str)
-            
+            val = values[-1]
+            families = self.classifier.families(line)
+            if not families:
+                continue
+
             # Check for Total (High Priority)
-            if not results["total"] and any(k in lower_line for k in total_keywords):
+            if not results["total"] and "total" in families:
                 # Avoid "Subtotal" triggering "Total"
-                if "sub" not in lower_line: 
+                if "sub" not in families:
                     results["total"] = val
                     continue
 
             # Check for Subtotal
-            if not results["subtotal"] and any(k in lower_line for k in subtotal_keywords):
+            if not results["subtotal"] and "subtotal" in families:
                 results["subtotal"] = val
                 continue
 
             # Check for Tax
-            if not results["tax"] and any(k in lower_line for k in tax_keywords):
+            if not results["tax"] and "tax" in families:
                 results["tax"] = val
                 continue
 
-            if not results["tip"] and any(k in lower_line for k in tip_keywords):
+            if not results["tip"] and "tip" in families:
                 results["tip"] = val
                 continue
 
             # checking for Discount
-            if not results["discount"] and any(k in lower_line for k in discount_keywords):
+            if not results["discount"] and "discount" in families:
                 results["discount"] = val
                 continue
             
             # checking for Other Fees
-            if not results.get("other_fees") and any(k in lower_line for k in other_fees_keywords):
+            if not results["other_fees"] and "other_fees" in families:
                 # Avoid confusing with currency or tip
-                if not any(k in lower_line for k in tip_keywords + total_keywords):
+                if "tip" not in families and "total" not in families:
                     results["other_fees"] = val
                     continue
 
-        if not results["total"]:
-            all_floats = []
-            for line in self.lines:
-                matches = re.findall(self.money_pattern, line)
-                for m in matches:
-                    all_floats.append(self._parse_float(m[0]))
-            if all_floats:
-                results["total"] = max(all_floats)
+        if not results["total"] and all_floats:
+            results["total"] = max(all_floats)
 
         return results
 
@@ -174,7 +316,7 @@ class FinancialParser:
         """
         for line in self.lines[:5]: # Check top 5 lines
             if len(line) < 3: continue
-            if re.search(r"\d", line): continue # Skip lines with numbers (dates/phones)
+            if _DIGIT_RE.search(line): continue # Skip lines with numbers (dates/phones)
             if "welcome" in line.lower(): continue
             return line.title()
         return "Unknown Merchant"
@@ -193,4 +335,17 @@ def parse_receipt(text: str) -> dict:
         "tip": financials.get("tip"),           
         "discount": financials.get("discount"),
         "other_fees": financials.get("other_fees")
-    }
\ No newline at end of file
+    }
+
+def parse_receipts(texts: List[str]) -> List[dict]:
+    """
+    Batch entry point for re-parsing many receipts with the shared,
+    precompiled classifier. Identical texts are parsed only once.
+    """
+    cache: dict[str, dict] = {}
+    results = []
+    for text in texts:
+        if text not in cache:
+            cache[text] = parse_receipt(text)
+        results.append(dict(cache[text]))
+    return results
@@ -0,0 +1,87 @@
+import logging
+import subprocess
+from typing import Iterator, List, Sequence, Tuple
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+logger = logging.getLogger(__name__)
+
+class PDFService:
+    def page_count(self, pdf_path: str) -> int:
+        """
+        Reads the page count from the PDF metadata without rasterizing anything.
+        """
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+    def extract_text_layer(self, pdf_path: str, timeout: int = 60) -> List[str]:
+        """
+        Extracts the embedded text layer of every page with poppler's pdftotext.
+        Returns one string per page, or an empty list if extraction fails.
+        """
+        try:
+            result = subprocess.run(
+                ["pdftotext", "-layout", "-enc", "UTF-8", pdf_path, "-"],
+                capture_output=True,
+                timeout=timeout,
+                check=True,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"pdftotext failed for {pdf_path}: {e}")
+            return []
+
+        # pdftotext terminates every page with a form feed
+        pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+        if pages and not pages[-1].strip():
+            pages.pop()
+        return pages
+
+    def has_usable_text(self, page_text: str, min_chars: int = 20) -> bool:
+        """
+        True when a text layer page has enough real characters to skip OCR
+        (image-only pages and junk glyph layers fail this check).
+        """
+        visible = [c for c in page_text if not c.isspace()]
+        alnum = sum(c.isalnum() for c in visible)
+        return alnum >= min_chars and alnum >= 0.5 * len(visible)
+
+    def render_page(self, pdf_path: str, page: int = 1, dpi: int = 72) -> np.ndarray:
+        """
+        Rasterizes a single page to grayscale (e.g. a low-DPI probe).
+        """
+        pages = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page, grayscale=True)
+        return np.asarray(pages[0])
+
+    def iter_page_windows(
+        self,
+        pdf_path: str,
+        pages: Sequence[int],
+        dpi: int = 300,
+        window: int = 4,
+    ) -> Iterator[Tuple[List[int], List[np.ndarray]]]:
+        """
+        Lazily rasterizes the given 1-based pages straight to 8-bit grayscale,
+        at most `window` consecutive pages per call. Yields (page numbers, images);
+        only one window of pages is held in memory at once.
+        """
+        window = max(1, window)
+        for run in self._consecutive_runs(sorted(pages), window):
+            logger.debug(f"Rasterizing pages {run[0]}-{run[-1]} of {pdf_path}")
+            images = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=run[0],
+                last_page=run[-1],
+                grayscale=True,
+            )
+            yield run, [np.asarray(image) for image in images]
+
+    @staticmethod
+    def _consecutive_runs(pages: List[int], max_length: int) -> Iterator[List[int]]:
+        run: List[int] = []
+        for page in pages:
+            if run and (page != run[-1] + 1 or len(run) == max_length):
+                yield run
+                run = []
+            run.append(page)
+        if run:
+            yield run
@@ -0,0 +1,136 @@
+import re
+import logging
+
+from app.services.parser import LINE_CLASSIFIER, MONEY_RE
+
+logger = logging.getLogger(__name__)
+
+# Separators written by ExtractionService._join_pages
+PAGE_SEPARATOR_RE = re.compile(r"^-{2,}\s*page\s+\d+\s*-{2,}$", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_ALNUM_RE = re.compile(r"[a-z0-9]", re.IGNORECASE)
+# Dotted and starred leaders ("TOTAL ...... 7.48", "CARD **** 1234") count as one character
+_LEADER_RE = re.compile(r"([.*])(?:\s*\1)+")
+
+# Merchant/address/date sit at the top, payment details at the bottom
+HEADER_LINES = 5
+FOOTER_LINES = 4
+# Below this share of letters/digits a line is OCR noise (rules, borders, smudges)
+MIN_ALNUM_RATIO = 0.4
+
+# Keep priority when over budget: financial lines first, then header, footer, the rest
+_FINANCIAL, _HEADER, _FOOTER, _BODY = range(4)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for receipt-style English)."""
+    return (len(text) + 3) // 4
+
+
+def _is_financial(line: str) -> bool:
+    return bool(MONEY_RE.search(line) and LINE_CLASSIFIER.families(line))
+
+
+def _is_noise(line: str) -> bool:
+    if _is_financial(line):
+        return False
+    line = _LEADER_RE.sub(r"\1", line)
+    alnum = len(_ALNUM_RE.findall(line))
+    return alnum < 2 or alnum / len(line) < MIN_ALNUM_RATIO
+
+
+def _split_pages(raw_text: str) -> list[list[str]]:
+    pages = [[]]
+    for line in raw_text.splitlines():
+        line = _WHITESPACE_RE.sub(" ", line).strip()
+        if PAGE_SEPARATOR_RE.match(line):
+            pages.append([])
+        elif line and not _is_noise(line):
+            pages[-1].append(line)
+    return [page for page in pages if page]
+
+
+def clean_lines(raw_text: str) -> list[str]:
+    """
+    Drops page separators and noise lines. On multi-page text, the header
+    block (and footer block) OCR'd again at the top (and bottom) of later pages
+    is dropped too; repeated item lines within the body are kept.
+    """
+    pages = _split_pages(raw_text)
+    if not pages:
+        return []
+    first = pages[0]
+    header = {line.casefold() for line in first[:HEADER_LINES]}
+    footer = {line.casefold() for line in first[-FOOTER_LINES:]}
+    lines = list(first)
+    for page in pages[1:]:
+        start = 0
+        while start < min(len(page), HEADER_LINES) and page[start].casefold() in header:
+            start += 1
+        end = len(page)
+        while end > max(start, len(page) - FOOTER_LINES) and page[end - 1].casefold() in footer:
+            end -= 1
+        lines.extend(page[start:end])
+    return lines
+
+
+def _priority(index: int, line: str, count: int) -> int:
+    if _is_financial(line):
+        return _FINANCIAL
+    if index < HEADER_LINES:
+        return _HEADER
+    if index >= count - FOOTER_LINES:
+        return _FOOTER
+    return _BODY
+
+
+def _render(lines: list[str], keep: set[int]) -> str:
+    rendered = []
+    dropped = 0
+    for i, line in enumerate(lines):
+        if i not in keep:
+            dropped += 1
+            continue
+        if dropped:
+            rendered.append(f"[{dropped} lines omitted]")
+            dropped = 0
+        rendered.append(line)
+    if dropped:
+        rendered.append(f"[{dropped} lines omitted]")
+    return "\n".join(rendered)
+
+
+def compact_receipt_text(raw_text: str, token_budget: int) -> dict:
+    """
+    Shrinks OCR text for the summary prompt. After cleaning, if the text is
+    still over `token_budget`, lines are kept by priority (financial lines the
+    parser recognizes, header, footer, then item lines in order) and each run
+    of dropped lines is replaced by a short marker.
+    Returns the text with its original/compacted token estimates and ratio.
+    """
+    original_tokens = estimate_tokens(raw_text or "")
+    lines = clean_lines(raw_text or "")
+    text = "\n".join(lines)
+
+    if estimate_tokens(text) > token_budget:
+        ranked = sorted(range(len(lines)), key=lambda i: (_priority(i, lines[i], len(lines)), i))
+        keep = []
+        used = 0
+        for i in ranked:
+            cost = estimate_tokens(lines[i]) + 1  # +1 for the newline
+            if used + cost <= token_budget:
+                keep.append(i)
+                used += cost
+        text = _render(lines, set(keep))
+        # Omission markers take room too: shed the lowest-priority lines until it fits
+        while keep and estimate_tokens(text) > token_budget:
+            keep.pop()
+            text = _render(lines, set(keep))
+
+    tokens = estimate_tokens(text)
+    return {
+        "text": text,
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "ratio": tokens / original_tokens if original_tokens else 1.0,
+    }
@@ -0,0 +1,184 @@
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app.models.receipt_db import Receipt, ReprocessCheckpoint
+from app.services.analysis import AnalysisService
+from app.services.parser import parse_receipts
+
+logger = logging.getLogger(__name__)
+
+# Columns recomputed from raw_text by parse_receipt + analyze_receipt
+REPARSED_FIELDS = ("merchant", "date", "total", "subtotal", "tax", "tip", "discount", "other_fees", "tags")
+
+def reparse_chunk(rows: List[Tuple]) -> dict:
+    """
+    Re-parses and re-analyzes one chunk of (id, raw_text, *REPARSED_FIELDS) rows.
+    Returns the chunk size, its last id and (id, new values, old values) for
+    rows whose derived fields changed. Top-level so it can run in a process pool.
+    """
+    analysis_service = AnalysisService()
+    parsed_rows = parse_receipts([row[1] for row in rows])
+
+    changes = []
+    for row, parsed in zip(rows, parsed_rows):
+        parsed["tags"] = analysis_service.analyze_receipt(parsed)
+        current = dict(zip(REPARSED_FIELDS, row[2:]))
+        changed = {
+            field: parsed.get(field)
+            for field in REPARSED_FIELDS
+            if parsed.get(field) != current[field]
+        }
+        if changed:
+            changes.append((row[0], changed, {field: current[field] for field in changed}))
+    return {"scanned": len(rows), "last_id": rows[-1][0], "changes": changes}
+
+def bounded_map(executor: Executor | None, fn: Callable, items: Iterable, max_pending: int) -> Iterator:
+    """
+    Like Executor.map, but keeps at most `max_pending` items in flight so a
+    streamed input is never read ahead in full. Results keep input order.
+    """
+    if executor is None:
+        yield from map(fn, items)
+        return
+
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class ReprocessService:
+    """
+    Re-runs parse_receipt and analyze_receipt over stored raw_text without OCR.
+    Rows are streamed by id through a server-side cursor in chunks, parsed
+    across a process pool and written back with bulk UPDATEs. Progress is
+    checkpointed per job so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, engine: Engine, chunk_size: int = 1000, workers: int = 1):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def _iter_chunks(self, after_id: int, limit: int | None) -> Iterator[List[Tuple]]:
+        columns = [Receipt.id, Receipt.raw_text] + [getattr(Receipt, f) for f in REPARSED_FIELDS]
+        statement = (
+            select(*columns)
+            .where(Receipt.id > after_id, Receipt.raw_text.is_not(None))
+            .order_by(Receipt.id)
+        )
+        if limit:
+            statement = statement.limit(limit)
+
+        # A dedicated connection keeps the cursor open while chunks are committed elsewhere
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=self.chunk_size).execute(statement)
+            for partition in result.partitions(self.chunk_size):
+                yield [tuple(row) for row in partition]
+
+    def get_checkpoint(self, job_name: str) -> ReprocessCheckpoint | None:
+        with Session(self.engine) as session:
+            return session.get(ReprocessCheckpoint, job_name)
+
+    def reset_checkpoint(self, job_name: str) -> None:
+        with Session(self.engine) as session:
+            checkpoint = session.get(ReprocessCheckpoint, job_name)
+            if checkpoint:
+                session.delete(checkpoint)
+                session.commit()
+
+    def _write_chunk(self, job_name: str, changes: List[Tuple], last_id: int, scanned: int) -> None:
+        with Session(self.engine) as session:
+            if changes:
+                session.execute(
+                    update(Receipt),
+                    [{"id": receipt_id, **values} for receipt_id, values, _ in changes],
+                )
+            checkpoint = session.get(ReprocessCheckpoint, job_name) or ReprocessCheckpoint(job_name=job_name)
+            checkpoint.last_id = last_id
+            checkpoint.scanned += scanned
+            checkpoint.updated += len(changes)
+            checkpoint.updated_at = datetime.utcnow()
+            session.add(checkpoint)
+            session.commit()
+
+    def run(self, job_name: str = "default", dry_run: bool = False, limit: int | None = None,
+            max_diffs: int = 20) -> dict:
+        """
+        Processes every receipt after the job's checkpoint.
+        In dry-run mode nothing is written (checkpoint included) and a sample
+        of the field-level differences is returned instead.
+        """
+        checkpoint = self.get_checkpoint(job_name)
+        after_id = checkpoint.last_id if checkpoint else 0
+        stats = {"job": job_name, "dry_run": dry_run, "start_id": after_id, "last_id": after_id,
+                 "scanned": 0, "changed": 0, "field_changes": {}, "diffs": []}
+        logger.info(f"Reprocess job '{job_name}' starting after id {after_id} (dry_run={dry_run})")
+
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            chunks = self._iter_chunks(after_id, limit)
+            for result in bounded_map(executor, reparse_chunk, chunks, max_pending=self.workers * 2):
+                changes = result["changes"]
+                stats["scanned"] += result["scanned"]
+                stats["changed"] += len(changes)
+                stats["last_id"] = result["last_id"]
+                for receipt_id, values, previous in changes:
+                    for field in values:
+                        stats["field_changes"][field] = stats["field_changes"].get(field, 0) + 1
+                    if dry_run and len(stats["diffs"]) < max_diffs:
+                        stats["diffs"].append({
+                            "id": receipt_id,
+                            "changes": {f: {"old": previous[f], "new": values[f]} for f in values},
+                        })
+                if not dry_run:
+                    self._write_chunk(job_name, changes, result["last_id"], result["scanned"])
+                logger.info(f"Reprocess job '{job_name}': scanned {stats['scanned']}, changed {stats['changed']}")
+        finally:
+            if executor:
+                executor.shutdown()
+
+        return stats
+
+def main(argv: List[str] | None = None) -> None:
+    """
+    CLI: python -m app.services.reprocess [--job NAME] [--dry-run] [--restart] ...
+    """
+    from app.core.logging import setup_logging
+    from app.db import init_db, sync_engine
+
+    arg_parser = argparse.ArgumentParser(description="Re-parse and re-analyze stored receipts without OCR.")
+    arg_parser.add_argument("--job", default="default", help="Checkpoint name; reruns resume from it")
+    arg_parser.add_argument("--chunk-size", type=int, default=1000)
+    arg_parser.add_argument("--workers", type=int, default=1, help="Parser processes")
+    arg_parser.add_argument("--limit", type=int, default=None, help="Max rows to process in this run")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Report differences without writing")
+    arg_parser.add_argument("--restart", action="store_true", help="Discard the job's checkpoint first")
+    args = arg_parser.parse_args(argv)
+
+    setup_logging()
+    init_db()
+    service = ReprocessService(sync_engine, chunk_size=args.chunk_size, workers=args.workers)
+    if args.restart:
+        service.reset_checkpoint(args.job)
+
+    stats = service.run(args.job, dry_run=args.dry_run, limit=args.limit)
+    print(f"Scanned {stats['scanned']} receipts, {stats['changed']} changed "
+          f"(ids {stats['start_id']}..{stats['last_id']}).")
+    for field, count in sorted(stats["field_changes"].items()):
+        print(f"  {field}: {count}")
+    for diff in stats["diffs"]:
+        print(f"  #{diff['id']}: {diff['changes']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,55 @@
+import os
+import asyncio
+import shutil
+import hashlib
+import logging
+import tempfile
 import mimetypes
-from typing import Any
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
 import boto3
 from botocore.client import Config
 
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+# S3 rejects multipart parts under 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised while streaming once an upload exceeds its size limit."""
+
+
 class StorageService:
+    # Buckets already checked (or created) by this process
+    _checked_buckets: set[str] = set()
+    _checked_lock = threading.Lock()
+
     def __init__(self, s3_client: Any, bucket_name: str = "receipts"):
         self.s3 = s3_client
         self.bucket = bucket_name
+        # Per-thread fetch buffer, reused across read_object calls
+        self._local = threading.local()
         self._ensure_bucket()
 
     def _ensure_bucket(self) -> None:
-        try:
-            self.s3.head_bucket(Bucket=self.bucket)
-        except Exception:
+        with self._checked_lock:
+            if self.bucket in self._checked_buckets:
+                return
             try:
-                self.s3.create_bucket(Bucket=self.bucket)
+                self.s3.head_bucket(Bucket=self.bucket)
             except Exception:
-                # In some cases (like localstack or specific MinIO configs), 
-                # bucket creation might fail if already exists or due to permissions
-                pass
+                try:
+                    self.s3.create_bucket(Bucket=self.bucket)
+                except Exception:
+                    # In some cases (like localstack or specific MinIO configs), 
+                    # bucket creation might fail if already exists or due to permissions
+                    pass
+            self._checked_buckets.add(self.bucket)
 
     def upload_file(self, local_path: str, s3_key: str) -> str:
         content_type, _ = mimetypes.guess_type(local_path)
@@ -32,8 +63,225 @@ class StorageService:
         )
         return f"{self.bucket}/{s3_key}"
 
+    def upload_stream(
+        self,
+        stream: Any,
+        s3_key: str,
+        content_type: str,
+        max_bytes: int | None = None,
+        head: bytes = b"",
+        part_size: int | None = None,
+        observer: Callable[[bytes], None] | None = None,
+    ) -> dict:
+        """
+        Streams a file-like object to storage without a local copy, hashing it
+        on the way. Bodies that fit in one part go up with a single put_object,
+        larger ones as a multipart upload. `head` is content already read from
+        the stream (e.g. for type sniffing). Raises UploadTooLarge past
+        max_bytes; nothing is left behind in the bucket in that case.
+        `observer`, if given, sees every part as it goes (e.g. to inspect content).
+        Returns {"size": int, "sha256": str}.
+        """
+        part_size = max(part_size or settings.S3_MULTIPART_PART_SIZE, MIN_PART_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+
+        def read_part() -> bytes:
+            nonlocal head, size
+            buf = bytearray(head)
+            head = b""
+            while len(buf) < part_size:
+                chunk = stream.read(min(READ_CHUNK_SIZE, part_size - len(buf)))
+                if not chunk:
+                    break
+                buf += chunk
+            size += len(buf)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            digest.update(buf)
+            part = bytes(buf)
+            if observer and part:
+                observer(part)
+            return part
+
+        part = read_part()
+        if len(part) < part_size:
+            self.s3.put_object(Bucket=self.bucket, Key=s3_key, Body=part, ContentType=content_type)
+            return {"size": size, "sha256": digest.hexdigest()}
+
+        upload_id = self.s3.create_multipart_upload(
+            Bucket=self.bucket, Key=s3_key, ContentType=content_type
+        )["UploadId"]
+        try:
+            parts = []
+            while part:
+                number = len(parts) + 1
+                response = self.s3.upload_part(
+                    Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                    PartNumber=number, Body=part,
+                )
+                parts.append({"PartNumber": number, "ETag": response["ETag"]})
+                part = read_part()
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=s3_key, UploadId=upload_id)
+            raise
+        return {"size": size, "sha256": digest.hexdigest()}
+
+    def delete_object(self, s3_key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=s3_key)
+
+    def _fetch_buffer(self, size: int) -> bytearray:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < size:
+            # A new array rather than a resize: views of the old one may still be alive
+            buffer = bytearray(size)
+            if size <= settings.STORAGE_MEMORY_MAX_BYTES:
+                self._local.buffer = buffer
+        return buffer
+
+    def read_object(self, s3_key: str) -> memoryview:
+        """
+        Reads an object into this thread's reusable buffer and returns a view of
+        its content (e.g. for np.frombuffer / cv2.imdecode, with no further copy).
+        The view is only valid until the next read_object call on the same thread.
+        """
+        response = self.s3.get_object(Bucket=self.bucket, Key=s3_key)
+        size = response["ContentLength"]
+        view = memoryview(self._fetch_buffer(size))
+        body = response["Body"]
+        pos = 0
+        try:
+            while pos < size:
+                chunk = body.read(min(READ_CHUNK_SIZE, size - pos))
+                if not chunk:
+                    break
+                view[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+        finally:
+            body.close()
+        return view[:pos]
+
+    @contextmanager
+    def object_file(self, s3_key: str, max_memory_bytes: int | None = None) -> Iterator[str]:
+        """
+        Fetches an object for tools that need a file path (e.g. poppler).
+        Objects up to max_memory_bytes go to an anonymous in-memory file
+        (memfd, readable by subprocesses through /proc); larger ones, or all of
+        them where memfd is unavailable, spill to a uniquely named temp file.
+        Yields the path; the file is released on exit.
+        """
+        if max_memory_bytes is None:
+            max_memory_bytes = settings.STORAGE_MEMORY_MAX_BYTES
+        response = self.s3.get_object(Bucket=self.bucket, Key=s3_key)
+        name = os.path.basename(s3_key)
+
+        spilled = response["ContentLength"] > max_memory_bytes or not hasattr(os, "memfd_create")
+        if spilled:
+            fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+        else:
+            fd = os.memfd_create(name)
+            path = f"/proc/{os.getpid()}/fd/{fd}"
+
+        try:
+            with os.fdopen(fd, "wb", closefd=False) as f:
+                shutil.copyfileobj(response["Body"], f, READ_CHUNK_SIZE)
+            yield path
+        finally:
+            response["Body"].close()
+            os.close(fd)
+            if spilled:
+                os.remove(path)
+
     def download_file(self, s3_key: str, local_path: str) -> None:
         self.s3.download_file(self.bucket, s3_key, local_path)
 
     def get_object(self, s3_key: str) -> Any:
         return self.s3.get_object(Bucket=self.bucket, Key=s3_key)
+
+    # --- Async interface ---
+    # boto3 is blocking, so async callers (the API) run each call in a worker
+    # thread instead of stalling the event loop for the whole transfer.
+
+    async def upload_stream_async(self, stream: Any, s3_key: str, content_type: str, **kwargs) -> dict:
+        return await asyncio.to_thread(self.upload_stream, stream, s3_key, content_type, **kwargs)
+
+    async def delete_object_async(self, s3_key: str) -> None:
+        await asyncio.to_thread(self.delete_object, s3_key)
+
+    async def get_object_async(self, s3_key: str) -> Any:
+        return await asyncio.to_thread(self.get_object, s3_key)
+
+
+# --- Process-wide client ---
+# boto3 clients are thread-safe but not fork-safe, so each process (API worker
+# or Celery child) lazily builds its own client and reuses its connection pool.
+
+_s3_client: Any = None
+_s3_client_pid: int | None = None
+_storage_service: StorageService | None = None
+_storage_lock = threading.Lock()
+
+
+def create_s3_client() -> Any:
+    return boto3.client(
+        's3',
+        endpoint_url=settings.S3_ENDPOINT,
+        aws_access_key_id=settings.S3_KEY,
+        aws_secret_access_key=settings.S3_SECRET,
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+        ),
+        region_name='us-east-1'
+    )
+
+
+def _reset_after_fork() -> None:
+    global _s3_client, _s3_client_pid, _storage_service
+    if _s3_client_pid != os.getpid():
+        # Connections inherited from the parent must not be shared with it
+        _s3_client = None
+        _storage_service = None
+        _s3_client_pid = os.getpid()
+        StorageService._checked_buckets.clear()
+
+
+def get_s3_client() -> Any:
+    """Process-wide S3 client, created on first use."""
+    global _s3_client
+    with _storage_lock:
+        _reset_after_fork()
+        if _s3_client is None:
+            _s3_client = create_s3_client()
+        return _s3_client
+
+
+def get_storage_service() -> StorageService:
+    """Process-wide StorageService; the bucket is checked once per process."""
+    global _storage_service
+    client = get_s3_client()
+    with _storage_lock:
+        if _storage_service is None:
+            _storage_service = StorageService(client, settings.S3_BUCKET)
+        return _storage_service
+
+
+def init_storage() -> StorageService:
+    """Build the client and check the bucket up front (startup hook)."""
+    service = get_storage_service()
+    logger.info(f"Storage ready: bucket '{service.bucket}' at {settings.S3_ENDPOINT}")
+    return service
+
+
+def close_storage() -> None:
+    """Release the process-wide client and its pooled connections (shutdown hook)."""
+    global _s3_client, _storage_service
+    with _storage_lock:
+        client, _s3_client, _storage_service = _s3_client, None, None
+        StorageService._checked_buckets.clear()
+    if client is not None and hasattr(client, "close"):
+        client.close()
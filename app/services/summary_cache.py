@@ -0,0 +1,199 @@
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt changes so old summaries stop matching
+KEY_PREFIX = "llm-summary:v2:"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def summary_key(model: str, raw_text: str, total: float | None, date: str | None) -> str:
+    """
+    Cache key for a summary request. OCR noise that cannot change the answer
+    (case, runs of whitespace, blank lines) is normalized away before hashing.
+    """
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in (raw_text or "").casefold().splitlines())
+    text = "\n".join(line for line in lines if line)
+    total_part = f"{total:.2f}" if total is not None else ""
+    date_part = (date or "").strip()
+    digest = hashlib.sha256(f"{text}\x00{total_part}\x00{date_part}".encode()).hexdigest()
+    return f"{KEY_PREFIX}{model}:{digest}"
+
+
+class MemoryTier:
+    """Size-bounded LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("llm.cache.evictions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisTier:
+    """
+    Shared tier in Redis: entries expire after the TTL and the tier is kept to
+    max_entries by evicting the least recently used keys. Recency lives in a
+    sorted set (key -> last use), so the bound holds without relying on the
+    server's maxmemory policy. Concurrent trims may briefly overshoot.
+    """
+
+    INDEX_KEY = f"{KEY_PREFIX}lru"
+
+    def __init__(self, url: str, ttl: float, max_entries: int):
+        self.url = url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _sync_client(self) -> Any:
+        import redis
+
+        with self._lock:
+            if self._client is None:
+                # Short timeouts: a slow cache must not be slower than a cache miss
+                self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            return self._client
+
+    def get(self, key: str) -> str | None:
+        client = self._sync_client()
+        value = client.get(key)
+        if value is None:
+            return None
+        client.zadd(self.INDEX_KEY, {key: time.time()})
+        return value.decode()
+
+    def set(self, key: str, value: str) -> None:
+        client = self._sync_client()
+        now = time.time()
+        pipe = client.pipeline()
+        pipe.set(key, value, ex=int(self.ttl))
+        pipe.zadd(self.INDEX_KEY, {key: now})
+        # Keys past their TTL are already gone; drop them from the index
+        pipe.zremrangebyscore(self.INDEX_KEY, "-inf", now - self.ttl)
+        pipe.zcard(self.INDEX_KEY)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            self._evict(client, size - self.max_entries)
+
+    def _evict(self, client: Any, count: int) -> None:
+        keys = client.zrange(self.INDEX_KEY, 0, count - 1)
+        if not keys:
+            return
+        pipe = client.pipeline()
+        pipe.delete(*keys)
+        pipe.zrem(self.INDEX_KEY, *keys)
+        pipe.execute()
+        metrics.increment("llm.cache.evictions", len(keys))
+
+
+def shared_tier_url() -> str:
+    """
+    SUMMARY_CACHE_REDIS_URL, or the Celery result backend's server on its own
+    database (SUMMARY_CACHE_REDIS_DB), so cache keys never share a keyspace
+    with task results.
+    """
+    if settings.SUMMARY_CACHE_REDIS_URL:
+        return settings.SUMMARY_CACHE_REDIS_URL
+    from app.core.celery_app import BACKEND_URL
+    return urlsplit(BACKEND_URL)._replace(path=f"/{settings.SUMMARY_CACHE_REDIS_DB}").geturl()
+
+
+class SummaryCache:
+    """
+    Two tiers: an in-process LRU in front of a shared tier that every API and
+    worker process sees. Shared-tier errors are logged and treated as misses.
+    """
+
+    def __init__(self, memory: MemoryTier, shared: MemoryTier | RedisTier | None = None):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key: str) -> str | None:
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.increment("llm.cache.hits.memory")
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                metrics.increment("llm.cache.errors")
+                logger.warning(f"Summary cache lookup failed: {e}")
+            if value is not None:
+                metrics.increment("llm.cache.hits.shared")
+                self.memory.set(key, value)
+                return value
+        metrics.increment("llm.cache.misses")
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                metrics.increment("llm.cache.errors")
+                logger.warning(f"Summary cache store failed: {e}")
+
+
+_summary_cache: SummaryCache | None = None
+_summary_cache_lock = threading.Lock()
+# In-process stand-in for the shared tier (SUMMARY_CACHE_BACKEND=local)
+_local_shared: MemoryTier | None = None
+
+
+def get_summary_cache() -> SummaryCache:
+    """Process-wide summary cache, configured from Settings (SUMMARY_CACHE_BACKEND)."""
+    global _summary_cache, _local_shared
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            memory = MemoryTier(settings.SUMMARY_CACHE_MAX_ENTRIES, settings.SUMMARY_CACHE_TTL)
+            if settings.SUMMARY_CACHE_BACKEND == "local":
+                if _local_shared is None:
+                    _local_shared = MemoryTier(settings.SUMMARY_CACHE_MAX_ENTRIES * 8, settings.SUMMARY_CACHE_TTL)
+                shared = _local_shared
+            else:
+                shared = RedisTier(
+                    shared_tier_url(), settings.SUMMARY_CACHE_TTL, settings.SUMMARY_CACHE_SHARED_MAX_ENTRIES
+                )
+            _summary_cache = SummaryCache(memory, shared)
+        return _summary_cache
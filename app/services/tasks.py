@@ -1,118 +1,398 @@
-import os
+import hmac
+import json
+import hashlib
 import logging
+import requests
+from celery import chain, group, uuid
+from celery.signals import worker_process_init, worker_process_shutdown
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.services.image import ImageService
 from app.services.ocr import OCRService
 from app.services.parser import parse_receipt
 from app.services.analysis import AnalysisService
-from app.services.llm import LLMService
-from app.services.storage import StorageService
-from app.db import get_sync_session_context
-from app.api.dependencies import get_s3_client
+from app.services.llm import LLMService, close_http_session
+from app.services.pdf import PDFService
+from app.services.extraction import ExtractionService
+from app.services.storage import get_storage_service, init_storage, close_storage
+from app.services.reprocess import ReprocessService
+from app.services.events import publish_event
+from app.services.lanes import lane_queue
+from app.services.webhooks import UnsafeWebhookURL, check_webhook_url
+from app.db import get_sync_session_context, sync_engine
 from app.models.receipt_db import Receipt
-from pdf2image import convert_from_path
 
 logger = logging.getLogger(__name__)
 
 # Instantiate services
 image_service = ImageService()
 ocr_service = OCRService()
+pdf_service = PDFService()
+extraction_service = ExtractionService(image_service, ocr_service, pdf_service)
 analysis_service = AnalysisService()
 llm_service = LLMService()
 
+# Fields returned in a successful task result
+RESULT_FIELDS = (
+    "merchant", "total", "subtotal", "tax", "tip", "discount",
+    "other_fees", "date", "summary", "raw_text", "tags", "page_sources", "ocr_mode",
+)
+PARSED_FIELDS = ("merchant", "total", "subtotal", "tax", "tip", "discount", "other_fees", "date")
+
+def build_task_result(receipt: Receipt) -> dict:
+    """
+    Task result payload for an already processed receipt record.
+    """
+    return {
+        "status": "success",
+        "data": {field: getattr(receipt, field) for field in RESULT_FIELDS},
+    }
+
+def celery_result(result: dict, receipt_id: int | None) -> dict:
+    """
+    What a finished task stores in the result backend. In "slim" mode only a
+    small status (clients read the data from the receipt row via /tasks/{id});
+    "full" keeps the whole result there as well.
+    """
+    if settings.TASK_RESULT_MODE == "full":
+        return result
+    slim = {"status": result["status"], "receipt_id": receipt_id}
+    if "error" in result:
+        slim["error"] = result["error"]
+    return slim
+
+@worker_process_init.connect
+def open_storage(**kwargs):
+    try:
+        init_storage()
+    except Exception as e:
+        # Not fatal: the client is created lazily on the first task instead
+        logger.warning(f"Storage init failed in worker process: {e}")
+
+@worker_process_shutdown.connect
+def close_ocr_engines(**kwargs):
+    ocr_service.close()
+    close_storage()
+    close_http_session()
+
+# --- Pipeline stages ---
+# Each stage takes and returns a plain JSON payload dict, so they can run
+# inline (process_receipt_task) or as chained tasks on separate queues.
+
+def run_ocr_stage(s3_key: str, generate_summary: bool, ocr_mode: str, task_id: str | None = None) -> dict:
+    """
+    Fetches the file into memory and extracts its text.
+    `task_id` is the id clients poll; it travels in the payload so every
+    stage can publish progress events for it.
+    """
+    publish_event(task_id, "stage", stage="ocr")
+    storage_service = get_storage_service()
+
+    # A summary needs the whole document text, so read everything
+    mode = "full" if generate_summary else ocr_mode
+
+    if s3_key.lower().endswith('.pdf'):
+        logger.info(f"Processing PDF: {s3_key} ({mode})")
+        with storage_service.object_file(s3_key) as pdf_path:
+            extraction = extraction_service.extract_pdf(pdf_path, mode)
+    else:
+        logger.info(f"Processing Image: {s3_key} ({mode})")
+        extraction = extraction_service.extract_image(storage_service.read_object(s3_key), mode)
+
+    return {"task_id": task_id, "s3_key": s3_key, "generate_summary": generate_summary, **extraction}
+
+def run_parse_stage(payload: dict) -> dict:
+    """
+    Parses the raw text (unless the progressive OCR check already did) and
+    applies the audit rules.
+    """
+    publish_event(payload.get("task_id"), "stage", stage="parse")
+    payload = dict(payload)
+    parsed_data = payload.pop("parsed", None) or parse_receipt(payload["raw_text"])
+    audit_tags = analysis_service.analyze_receipt(parsed_data)
+    return {**payload, **{field: parsed_data.get(field) for field in PARSED_FIELDS}, "tags": audit_tags}
+
+def run_summarize_stage(payload: dict) -> dict:
+    """
+    Optional LLM summary.
+    """
+    summary_text = None
+    deferred = failed = False
+    if payload["generate_summary"]:
+        publish_event(payload.get("task_id"), "stage", stage="summarize")
+        outcome = llm_service.summarize(
+            payload["raw_text"],
+            payload["total"],
+            payload["date"]
+        )
+        summary_text, deferred = outcome["summary"], outcome["deferred"]
+        failed = not outcome["ok"] and not deferred
+    return {**payload, "summary": summary_text, "summary_deferred": deferred, "summary_failed": failed}
+
+def persist_results(task_id: str, payload: dict) -> dict:
+    """
+    Updates the database record (created by API) and builds the task result.
+    """
+    publish_event(task_id, "stage", stage="persist")
+    callback_url = receipt_id = None
+    with get_sync_session_context() as db:
+        receipt_record = db.query(Receipt).filter(Receipt.task_id == task_id).first()
+
+        if receipt_record:
+            for field in RESULT_FIELDS:
+                setattr(receipt_record, field, payload.get(field))
+            receipt_record.status = "completed"
+            receipt_record.summary_deferred = payload.get("summary_deferred", False)
+            receipt_record.summary_failed = payload.get("summary_failed", False)
+            callback_url = receipt_record.callback_url
+            receipt_id = receipt_record.id
+            db.commit()
+
+    if payload.get("summary_deferred"):
+        schedule_summary_backfill()
+
+    result = {
+        "status": "success",
+        "data": {field: payload.get(field) for field in RESULT_FIELDS}
+    }
+    notify_finished(task_id, "completed", result, callback_url)
+    return celery_result(result, receipt_id)
+
+def mark_failed(task_id: str, error: Exception) -> dict:
+    logger.error(f"Task Failed: {error}")
+    callback_url = receipt_id = None
+    with get_sync_session_context() as db:
+        receipt_record = db.query(Receipt).filter(Receipt.task_id == task_id).first()
+        if receipt_record:
+            receipt_record.status = "error"
+            receipt_record.error = str(error)[:1000]
+            callback_url = receipt_record.callback_url
+            receipt_id = receipt_record.id
+            db.commit()
+    result = {"status": "error", "error": str(error)}
+    notify_finished(task_id, "failed", result, callback_url)
+    return celery_result(result, receipt_id)
+
+# --- Completion notifications ---
+
+def notify_finished(task_id: str, event: str, result: dict, callback_url: str | None) -> None:
+    """
+    Publishes the terminal event to stream subscribers and queues the
+    receipt's webhook, if it registered one.
+    """
+    publish_event(task_id, event, result=result)
+    if callback_url:
+        deliver_webhook_task.delay(callback_url, {"task_id": task_id, "event": event, "result": result})
+
+def sign_webhook(body: bytes) -> str:
+    return "sha256=" + hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+class WebhookServerError(Exception):
+    pass
+
+@celery_app.task(autoretry_for=(requests.ConnectionError, requests.Timeout, WebhookServerError),
+                 max_retries=5, retry_backoff=True)
+def deliver_webhook_task(url: str, body: dict) -> int | None:
+    """
+    POSTs a completion notification to a client's callback URL. With
+    WEBHOOK_SECRET set, the body is signed (X-Receipt-Signature).
+    The URL is re-checked here (DNS may have changed since the upload).
+    Redirects are not followed. Connection errors, timeouts and 5xx are
+    retried with backoff; other answers are final.
+    """
+    try:
+        check_webhook_url(url)
+    except UnsafeWebhookURL as e:
+        logger.warning(f"Webhook to {url} not sent: {e}")
+        return None
+
+    data = json.dumps(body, default=str).encode()
+    headers = {"Content-Type": "application/json"}
+    if settings.WEBHOOK_SECRET:
+        headers["X-Receipt-Signature"] = sign_webhook(data)
+    response = requests.post(url, data=data, headers=headers, timeout=settings.WEBHOOK_TIMEOUT,
+                             allow_redirects=False)
+    if response.status_code >= 500:
+        raise WebhookServerError(f"Webhook {url} answered {response.status_code}")
+    if response.status_code >= 300:
+        logger.warning(f"Webhook {url} rejected with {response.status_code}; not retried")
+    return response.status_code
+
+# --- Single-task pipeline ---
+
 @celery_app.task(bind=True)
-def process_receipt_task(self, s3_key: str, generate_summary: bool):
+def process_receipt_task(self, s3_key: str, generate_summary: bool, ocr_mode: str = "full"):
     """
     Celery task to process receipt: 
     1. Downloads from storage
-    2. OCR / Image processing
+    2. OCR / Image processing (full or progressive header/footer first)
     3. Parsing & Analysis
     4. Optional LLM Summary
     5. Database Update
     """
-    s3_client = get_s3_client()
-    storage_service = StorageService(s3_client)
-    local_temp_path = f"/tmp/{os.path.basename(s3_key)}"
-    
-    # Manually manage session lifecycle for Celery worker
+    try:
+        payload = run_ocr_stage(s3_key, generate_summary, ocr_mode, self.request.id)
+        payload = run_parse_stage(payload)
+        payload = run_summarize_stage(payload)
+        return persist_results(self.request.id, payload)
+    except Exception as e:
+        return mark_failed(self.request.id, e)
+
+# --- Staged pipeline ---
+# Stages are routed to their own queues (see celery_app.task_routes) so the
+# CPU-bound OCR pool, the light parse/persist pool and the I/O-bound LLM pool
+# can be sized independently. Payloads are zlib-compressed between stages.
+# Intermediate stages ignore their results: the chain hands each payload to
+# the next stage in the message, so the OCR text never lands in Redis.
+
+@celery_app.task(ignore_result=True)
+def ocr_stage_task(s3_key: str, generate_summary: bool, ocr_mode: str = "full", task_id: str | None = None) -> dict:
+    return run_ocr_stage(s3_key, generate_summary, ocr_mode, task_id)
+
+@celery_app.task(ignore_result=True)
+def parse_stage_task(payload: dict) -> dict:
+    return run_parse_stage(payload)
+
+@celery_app.task(ignore_result=True)
+def summarize_stage_task(payload: dict) -> dict:
+    # Provider errors are retried inside LLMService and end in a fallback
+    # summary, so this stage does not fail the pipeline or repeat OCR
+    return run_summarize_stage(payload)
+
+@celery_app.task(bind=True)
+def persist_stage_task(self, payload: dict) -> dict:
+    return persist_results(self.request.id, payload)
+
+@celery_app.task
+def pipeline_failed_task(request, exc, traceback, task_id: str):
+    """
+    Error callback of the staged pipeline: marks the receipt as failed and
+    stores the error as the pipeline result so polling clients see it.
+    """
+    result = mark_failed(task_id, exc)
+    celery_app.backend.store_result(task_id, result, "SUCCESS")
+
+def build_pipeline(s3_key: str, generate_summary: bool, ocr_mode: str = "full",
+                   task_id: str | None = None, lane: str | None = None):
+    """
+    Signature that processes one receipt, with `task_id` (generated if not
+    given) as the id to poll. In staged mode this is the id of the final
+    (persist) stage. The OCR work goes to the queue of the receipt's lane.
+    """
+    task_id = task_id or uuid()
+    queue = lane_queue(lane)
+    if settings.PIPELINE_MODE != "staged":
+        return process_receipt_task.s(s3_key, generate_summary, ocr_mode).set(task_id=task_id, queue=queue)
+
+    stages = [
+        ocr_stage_task.s(s3_key, generate_summary, ocr_mode, task_id).set(queue=queue),
+        parse_stage_task.s(),
+    ]
+    if generate_summary:
+        stages.append(summarize_stage_task.s())
+    stages.append(persist_stage_task.s().set(task_id=task_id))
+
+    pipeline = chain(*(stage.set(compression="zlib") for stage in stages))
+    return pipeline.on_error(pipeline_failed_task.s(task_id=task_id))
+
+def dispatch_receipt(s3_key: str, generate_summary: bool, ocr_mode: str = "full",
+                     task_id: str | None = None, lane: str | None = None) -> str:
+    """
+    Queues a receipt for processing and returns the task id to poll.
+    """
+    task_id = task_id or uuid()
+    build_pipeline(s3_key, generate_summary, ocr_mode, task_id, lane).apply_async()
+    return task_id
+
+def dispatch_receipts(items: list[dict]) -> None:
+    """
+    Queues many receipts as one Celery group, published over a single producer.
+    Each item holds build_pipeline's arguments, including its pre-generated task_id.
+    """
+    if items:
+        group(build_pipeline(**item) for item in items).apply_async()
+
+# --- Deferred summaries ---
+
+def schedule_summary_backfill() -> None:
+    """
+    Queues one backfill per breaker cool-down (shared across processes), to
+    run once the breaker may let a probe through.
+    """
+    delay = settings.LLM_BREAKER_OPEN_SECONDS
+    if llm_service.breaker is None or llm_service.breaker.claim("backfill", delay):
+        backfill_summaries_task.apply_async(countdown=delay)
+
+@celery_app.task
+def backfill_summaries_task(batch_size: int | None = None, after_id: int = 0, retry: bool = False) -> dict:
+    """
+    Summarizes receipts whose summary was deferred by the circuit breaker,
+    a batch at a time (keyset on id) and concurrently, with no DB transaction
+    open during the calls. Only a real summary clears the flag. A receipt whose
+    summary fails outright SUMMARY_BACKFILL_MAX_ATTEMPTS times keeps the
+    fallback and leaves the queue; deferred-again ones stay. After the last
+    batch, a pass that left receipts behind is repeated after a cool-down.
+    """
+    batch_size = batch_size or settings.SUMMARY_BACKFILL_BATCH
+    with get_sync_session_context() as db:
+        rows = (
+            db.query(Receipt.id, Receipt.raw_text, Receipt.total, Receipt.date)
+            .filter(
+                Receipt.summary_deferred == True,  # noqa: E712
+                Receipt.status == "completed",
+                Receipt.id > after_id,
+            )
+            .order_by(Receipt.id)
+            .limit(batch_size)
+            .all()
+        )
+
+    outcomes = llm_service.summarize_many([(row.raw_text or "", row.total, row.date) for row in rows])
+
+    backfilled = given_up = 0
     with get_sync_session_context() as db:
-        try:
-            logger.info(f"Downloading {s3_key} from storage to {local_temp_path}")
-            storage_service.download_file(s3_key, local_temp_path)
-
-            raw_text = ""
-            
-            if local_temp_path.lower().endswith('.pdf'):
-                logger.info(f"Processing PDF: {local_temp_path}")
-                pages = convert_from_path(local_temp_path, dpi=300)
-                for i, page in enumerate(pages):
-                    cv2_img = image_service.pil_to_cv2(page)
-                    processed_img = image_service.apply_thresholding(cv2_img)
-                    page_text = ocr_service.extract_text(processed_img)
-                    raw_text += f"\n--- Page {i+1} ---\n{page_text}"
-            else:
-                logger.info(f"Processing Image: {local_temp_path}")
-                with open(local_temp_path, "rb") as f:
-                    file_bytes = f.read()
-                processed_image = image_service.prepare_image_from_bytes(file_bytes)
-                raw_text = ocr_service.extract_text(processed_image)
-
-            parsed_data = parse_receipt(raw_text)
-            audit_tags = analysis_service.analyze_receipt(parsed_data)
-
-            summary_text = None
-            if generate_summary:
-                summary_text = llm_service.generate_summary(
-                    raw_text, 
-                    parsed_data["total"], 
-                    parsed_data["date"]
-                )
-
-            # Update database record (created by API)
-            receipt_record = db.query(Receipt).filter(Receipt.task_id == self.request.id).first()
-            
-            if receipt_record:
-                receipt_record.merchant = parsed_data.get("merchant")
-                receipt_record.total = parsed_data.get("total")
-                receipt_record.subtotal = parsed_data.get("subtotal")
-                receipt_record.tax = parsed_data.get("tax")
-                receipt_record.tip = parsed_data.get("tip")
-                receipt_record.discount = parsed_data.get("discount")
-                receipt_record.other_fees = parsed_data.get("other_fees")
-                receipt_record.date = parsed_data.get("date")
-                receipt_record.summary = summary_text
-                receipt_record.raw_text = raw_text
-                receipt_record.tags = audit_tags
-                receipt_record.status = "completed"
-                
-                db.commit()
-
-            return {
-                "status": "success",
-                "data": {
-                    "merchant": parsed_data.get("merchant"),
-                    "total": parsed_data.get("total"),
-                    "subtotal": parsed_data.get("subtotal"),
-                    "tax": parsed_data.get("tax"),
-                    "tip": parsed_data.get("tip"),
-                    "discount": parsed_data.get("discount"),
-                    "other_fees": parsed_data.get("other_fees"),
-                    "date": parsed_data.get("date"),
-                    "summary": summary_text,
-                    "raw_text": raw_text,
-                    "tags": audit_tags
-                }
-            }
-
-        except Exception as e:
-            logger.error(f"Task Failed: {e}")
-            receipt_record = db.query(Receipt).filter(Receipt.task_id == self.request.id).first()
-            if receipt_record:
-                receipt_record.status = "error"
-                db.commit()
-            return {"status": "error", "error": str(e)}
-
-        finally:
-            # Clean up the temporary file on the worker
-            if os.path.exists(local_temp_path):
-                os.remove(local_temp_path)
\ No newline at end of file
+        for row, outcome in zip(rows, outcomes):
+            # Deferred again (breaker open): no attempt was made, keep it queued
+            if outcome["deferred"]:
+                continue
+            receipt = db.get(Receipt, row.id)
+            if receipt is None or not receipt.summary_deferred:
+                continue
+            if outcome["ok"]:
+                receipt.summary = outcome["summary"]
+                receipt.summary_deferred = False
+                backfilled += 1
+                continue
+            receipt.summary_backfill_attempts = (receipt.summary_backfill_attempts or 0) + 1
+            if receipt.summary_backfill_attempts >= settings.SUMMARY_BACKFILL_MAX_ATTEMPTS:
+                receipt.summary = outcome["summary"]
+                receipt.summary_deferred = False
+                receipt.summary_failed = True
+                given_up += 1
+        db.commit()
+
+    deferred = len(rows) - backfilled - given_up
+    logger.info(f"Summary backfill: {backfilled} summarized, {given_up} given up, {deferred} still deferred")
+    retry = retry or deferred > 0
+    if len(rows) == batch_size:
+        backfill_summaries_task.delay(batch_size, rows[-1].id, retry)
+    elif retry:
+        schedule_summary_backfill()
+    return {"backfilled": backfilled, "given_up": given_up, "deferred": deferred}
+
+@celery_app.task
+def reprocess_receipts_task(job_name: str = "default", dry_run: bool = False,
+                            chunk_size: int = 1000, workers: int = 1, limit: int | None = None):
+    """
+    Re-parses and re-analyzes stored receipts from their raw_text (no OCR),
+    resuming from the job's checkpoint. See app.services.reprocess.
+    Runs serially: prefork children are daemonic and cannot start the parser
+    process pool, so `workers` > 1 is only available from the CLI.
+    """
+    if workers > 1:
+        raise ValueError(
+            "reprocess_receipts_task runs in a daemonic worker process and cannot use a process pool; "
+            "use `python -m app.services.reprocess --workers N` for parallel runs"
+        )
+    service = ReprocessService(sync_engine, chunk_size=chunk_size, workers=1)
+    return service.run(job_name, dry_run=dry_run, limit=limit)
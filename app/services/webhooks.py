@@ -0,0 +1,52 @@
+import socket
+import ipaddress
+import logging
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UnsafeWebhookURL(ValueError):
+    pass
+
+
+def _host_allowed(host: str) -> bool:
+    """Exact match, or a ".example.com" entry for any subdomain."""
+    for allowed in settings.WEBHOOK_ALLOWED_HOSTS:
+        allowed = allowed.lower()
+        if host == allowed or (allowed.startswith(".") and host.endswith(allowed)):
+            return True
+    return False
+
+
+def check_webhook_url(url: str) -> None:
+    """
+    Rejects callback URLs a worker must not POST receipt data to: anything
+    but http(s), hosts outside WEBHOOK_ALLOWED_HOSTS (when set), and hosts
+    resolving to private, loopback, link-local or otherwise non-global
+    addresses (compose services, cloud metadata endpoints, ...).
+    Raises UnsafeWebhookURL.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise UnsafeWebhookURL("Callback URL must be an absolute http(s) URL.")
+
+    if settings.WEBHOOK_ALLOWED_HOSTS:
+        if not _host_allowed(host):
+            raise UnsafeWebhookURL(f"Callback host {host} is not allowed.")
+        # Allowlisted hosts are trusted by the operator, internal ones included
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise UnsafeWebhookURL(f"Callback host {host} cannot be resolved.") from e
+
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeWebhookURL(f"Callback host {host} resolves to a non-public address.")
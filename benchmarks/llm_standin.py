@@ -0,0 +1,102 @@
+"""
+Local stand-in for the OpenRouter chat-completions endpoint.
+
+Answers every POST with a canned completion after a configurable delay,
+and can fail a share of requests with 429/503 so retry behaviour can be
+exercised. Used by tests and by benchmarks.llm_throughput; it can also be
+run on its own and pointed at with LLM_API_URL.
+
+Usage:
+    python -m benchmarks.llm_standin [--port 8099] [--latency 0.2] [--fail-rate 0.0]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency: float = 0.0, fail_rate: float = 0.0,
+                 fail_status: int = 503, content: str = "Merchant: Walmart. Groceries. Weekly shop."):
+        super().__init__(address, StandinHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.content = content
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = set()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self) -> "StandinServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real provider
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if random.random() < server.fail_rate:
+                self._reply(server.fail_status, {"error": "stand-in failure"})
+            else:
+                self._reply(200, {"choices": [{"message": {"role": "assistant", "content": server.content}}]})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = StandinServer(("127.0.0.1", args.port), args.latency, args.fail_rate, args.fail_status)
+    print(f"LLM stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Summary throughput: one-off requests vs the pooled client vs the async variant.
+
+Starts the local LLM stand-in (no network, no API key needed) and
+summarizes N receipts three ways:
+  - baseline: sequential bare requests.post, a new connection per call
+  - pooled:   generate_summary from a thread pool sharing the keep-alive session
+  - async:    generate_summaries (httpx, LLM_MAX_CONCURRENCY in flight)
+
+Reports wall time, summaries/s and the number of TCP connections opened.
+
+Usage:
+    python -m benchmarks.llm_throughput [--receipts 64] [--latency 0.2] [--fail-rate 0.0] [--threads 8]
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.services.llm import LLMService
+from benchmarks.llm_standin import StandinServer
+
+RAW_TEXT = "WALMART SUPERCENTER\nMILK 2% GAL 3.49\nBREAD WHEAT 2.99\nTOTAL 6.48"
+
+
+def run(label: str, server: StandinServer, fn) -> None:
+    server.requests, server.connections, server.peak_in_flight = 0, set(), 0
+    start = time.perf_counter()
+    summaries = fn()
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for s in summaries if not s.startswith("Summary"))
+    print(f"{label:<10} {elapsed:8.2f}s {len(summaries) / elapsed:10.1f}/s "
+          f"{ok:>5}/{len(summaries)} ok {len(server.connections):>6} conns {server.peak_in_flight:>5} peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = StandinServer(latency=args.latency, fail_rate=args.fail_rate).start()
+    service = LLMService(api_key="standin", url=server.url)
+    items = [(RAW_TEXT, 6.48, "2023-10-12")] * args.receipts
+
+    def baseline():
+        results = []
+        for item in items:
+            response = requests.post(server.url, data=json.dumps({"prompt": service.build_prompt(*item)}),
+                                     headers={"Connection": "close"}, timeout=10)
+            results.append("ok" if response.ok else "Summary failed")
+        return results
+
+    def pooled():
+        with ThreadPoolExecutor(args.threads) as pool:
+            return list(pool.map(lambda item: service.generate_summary(*item), items))
+
+    print(f"{'mode':<10} {'wall':>9} {'rate':>12} {'ok':>11} {'conns':>12} {'peak':>10}")
+    try:
+        run("baseline", server, baseline)
+        run("pooled", server, pooled)
+        run("async", server, lambda: service.generate_summaries(items))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Accuracy/time trade-off of adaptive resolution normalization before OCR.
+
+Runs every image through the native-resolution pipeline and the adaptive
+one, and reports OCR time, pixel count, text similarity and whether the
+parsed total is correct. Without --images, synthetic receipts of
+different sizes (phone photo, scan, small thumbnail) are rendered.
+
+Usage:
+    python -m benchmarks.ocr_resolution [--images DIR] [--repeat N]
+
+Requires a working Tesseract installation.
+"""
+import argparse
+import difflib
+import pathlib
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from app.services.image import ImageService
+from app.services.ocr import OCRService
+from app.services.parser import parse_receipt
+
+RECEIPT_LINES = [
+    "WALMART SUPERCENTER",
+    "123 MAIN ST SPRINGFIELD",
+    "Date: 10/12/2023",
+    "MILK 2% GAL        3.49",
+    "BREAD WHEAT        2.99",
+    "EGGS LARGE DZ      4.29",
+    "COFFEE BEANS      12.99",
+    "SUBTOTAL          23.76",
+    "TAX                1.90",
+    "TOTAL             25.66",
+]
+EXPECTED_TOTAL = 25.66
+
+# (label, width, height, font scale)
+SYNTHETIC_SIZES = [
+    ("48mp-photo", 6000, 8000, 6.0),
+    ("12mp-photo", 3000, 4000, 3.0),
+    ("scan", 1240, 1754, 1.2),
+    ("thumbnail", 500, 700, 0.45),
+]
+
+
+def render_receipt(width: int, height: int, font_scale: float) -> bytes:
+    image = np.full((height, width, 3), 235, np.uint8)
+    thickness = max(1, int(2 * font_scale))
+    y = int(80 * font_scale)
+    for line in RECEIPT_LINES:
+        cv2.putText(image, line, (int(40 * font_scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (20, 20, 20), thickness)
+        y += int(50 * font_scale)
+    noise = np.random.default_rng(0).normal(0, 8, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    _, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def similarity(text: str) -> float:
+    expected = " ".join(" ".join(RECEIPT_LINES).split())
+    actual = " ".join(text.split())
+    return difflib.SequenceMatcher(None, expected, actual).ratio()
+
+
+def run(service: ImageService, ocr: OCRService, file_bytes: bytes, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prepared = service.prepare_image_from_bytes(file_bytes)
+        text = ocr.extract_text(prepared)
+        timings.append(time.perf_counter() - start)
+    return {
+        "seconds": statistics.median(timings),
+        "pixels": prepared.shape[0] * prepared.shape[1],
+        "text": text,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument("--images", type=pathlib.Path, help="Directory of receipt images")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if args.images:
+        samples = [(p.name, p.read_bytes(), None)
+                   for p in sorted(args.images.iterdir()) if p.suffix.lower() in {".jpg", ".jpeg", ".png"}]
+    else:
+        samples = [(label, render_receipt(w, h, scale), EXPECTED_TOTAL)
+                   for label, w, h, scale in SYNTHETIC_SIZES]
+
+    ocr = OCRService()
+    variants = {
+        "native": ImageService(adaptive_resolution=False),
+        "adaptive": ImageService(adaptive_resolution=True),
+    }
+
+    header = f"{'sample':<14}{'mode':<10}{'megapixels':>11}{'ocr_s':>9}{'similarity':>12}{'total_ok':>10}"
+    print(header)
+    print("-" * len(header))
+    for label, file_bytes, expected_total in samples:
+        for mode, service in variants.items():
+            result = run(service, ocr, file_bytes, args.repeat)
+            total_ok = "-"
+            if expected_total is not None:
+                total_ok = "yes" if parse_receipt(result["text"])["total"] == expected_total else "no"
+            sim = f"{similarity(result['text']):.3f}" if expected_total is not None else "-"
+            print(f"{label:<14}{mode:<10}{result['pixels'] / 1e6:>11.2f}"
+                  f"{result['seconds']:>9.2f}{sim:>12}{total_ok:>10}")
+
+
+if __name__ == "__main__":
+    main()
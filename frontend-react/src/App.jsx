@@ -21,6 +21,7 @@ import { useHistory } from './hooks/useHistory';
 
 // Utils
 import { API_BASE } from './utils/constants';
+import { fetchReceipt } from './services/api';
 
 function App() {
     const [mode, setMode] = useState('single'); // 'single' | 'bulk' | 'history'
@@ -30,7 +31,14 @@ function App() {
     const [modalResult, setModalResult] = useState(null);
 
     const { healthStatus } = useHealthCheck();
-    const { history, loading: historyLoading, refreshHistory } = useHistory(mode === 'history');
+    const {
+        history,
+        loading: historyLoading,
+        loadingMore: historyLoadingMore,
+        hasMore: historyHasMore,
+        refreshHistory,
+        loadMore: loadMoreHistory,
+    } = useHistory(mode === 'history');
 
     const single = useSingleProcessing();
     const bulk = useBulkProcessing();
@@ -77,7 +85,15 @@ function App() {
         }
     };
 
-    const handleViewData = (data) => {
+    const handleViewData = async (data) => {
+        // History rows leave out the large text fields; load the full receipt
+        if (data.id && data.raw_text === undefined) {
+            try {
+                data = await fetchReceipt(data.id);
+            } catch (err) {
+                console.error("Failed to fetch receipt", err);
+            }
+        }
         setModalResult(data);
     };
 
@@ -149,7 +165,10 @@ function App() {
                     <HistoryView
                         history={history}
                         loading={historyLoading}
+                        hasMore={historyHasMore}
+                        loadingMore={historyLoadingMore}
                         onRefresh={refreshHistory}
+                        onLoadMore={loadMoreHistory}
                         onViewImage={(item) => handleViewImageHistory(item)}
                         onViewData={handleViewData}
                     />
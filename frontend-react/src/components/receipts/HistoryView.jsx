@@ -6,7 +6,10 @@ import { API_BASE } from '../../utils/constants';
 const HistoryView = ({
     history,
     loading,
+    hasMore,
+    loadingMore,
     onRefresh,
+    onLoadMore,
     onViewImage,
     onViewData
 }) => {
@@ -51,6 +54,15 @@ const HistoryView = ({
                     {history.length === 0 && (
                         <div className="empty-bulk">No history found.</div>
                     )}
+                    {hasMore && (
+                        <button
+                            className="secondary-btn"
+                            onClick={onLoadMore}
+                            disabled={loadingMore}
+                        >
+                            {loadingMore ? 'Loading...' : 'Load More'}
+                        </button>
+                    )}
                 </div>
             )}
         </div>
@@ -60,7 +72,10 @@ const HistoryView = ({
 HistoryView.propTypes = {
     history: PropTypes.array.isRequired,
     loading: PropTypes.bool.isRequired,
+    hasMore: PropTypes.bool.isRequired,
+    loadingMore: PropTypes.bool.isRequired,
     onRefresh: PropTypes.func.isRequired,
+    onLoadMore: PropTypes.func.isRequired,
     onViewImage: PropTypes.func.isRequired,
     onViewData: PropTypes.func.isRequired,
 };
@@ -3,7 +3,9 @@ import { fetchHistory as fetchHistoryApi } from '../services/api';
 
 export const useHistory = (shouldFetch) => {
     const [history, setHistory] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [loading, setLoading] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState(null);
 
     const loadHistory = useCallback(async () => {
@@ -11,7 +13,8 @@ export const useHistory = (shouldFetch) => {
         setError(null);
         try {
             const data = await fetchHistoryApi();
-            setHistory(data);
+            setHistory(data.items);
+            setNextCursor(data.next_cursor);
         } catch (err) {
             setError(err.message);
             console.error("Failed to fetch history", err);
@@ -20,11 +23,36 @@ export const useHistory = (shouldFetch) => {
         }
     }, []);
 
+    // Appends the next (older) page
+    const loadMore = useCallback(async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        setError(null);
+        try {
+            const data = await fetchHistoryApi(nextCursor);
+            setHistory(prev => [...prev, ...data.items]);
+            setNextCursor(data.next_cursor);
+        } catch (err) {
+            setError(err.message);
+            console.error("Failed to fetch more history", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [nextCursor]);
+
     useEffect(() => {
         if (shouldFetch) {
             loadHistory();
         }
     }, [shouldFetch, loadHistory]);
 
-    return { history, loading, error, refreshHistory: loadHistory };
+    return {
+        history,
+        loading,
+        loadingMore,
+        hasMore: Boolean(nextCursor),
+        error,
+        refreshHistory: loadHistory,
+        loadMore,
+    };
 };
@@ -6,9 +6,16 @@ export const checkHealth = async () => {
     return true;
 };
 
-export const fetchHistory = async () => {
-    const res = await fetch(`${API_BASE}/api/v1/receipts/history`);
+export const fetchHistory = async (cursor = null) => {
+    const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const res = await fetch(`${API_BASE}/api/v1/receipts/history${params}`);
     if (!res.ok) throw new Error('Failed to fetch history');
+    return res.json(); // { items, next_cursor }
+};
+
+export const fetchReceipt = async (id) => {
+    const res = await fetch(`${API_BASE}/api/v1/receipts/${id}`);
+    if (!res.ok) throw new Error('Failed to fetch receipt');
     return res.json();
 };
 
@@ -0,0 +1,58 @@
+import asyncio
+from unittest.mock import patch
+from app.core.metrics import metrics
+from app.services.admission import AdmissionController
+
+BUDGETS = {"small": {"max_queued": 10, "max_in_flight": 20}, "standard": {"max_queued": 2}}
+
+
+def run_checks(controller, lanes, in_flight, reserve=True):
+    async def count():
+        count.calls += 1
+        return in_flight
+    count.calls = 0
+
+    async def scenario():
+        return [await controller.check(lane, count, reserve) for lane in lanes]
+
+    with patch("app.services.admission.settings.ADMISSION_CONTROL", True), \
+         patch("app.services.admission.settings.ADMISSION_LANE_BUDGETS", BUDGETS), \
+         patch("app.services.admission.settings.ADMISSION_PROBE_TTL", 60):
+        return asyncio.run(scenario()), count.calls
+
+
+def test_admission_counts_admitted_work_between_probes():
+    probes = []
+    controller = AdmissionController(lambda queues: probes.append(queues) or {"ocr": 0})
+
+    decisions, count_calls = run_checks(controller, ["standard"] * 3, {})
+
+    assert [d["admitted"] for d in decisions] == [True, True, False]
+    assert decisions[2]["retry_after"] == 30
+    # One cached probe for the whole burst
+    assert probes == [["ocr.small", "ocr"]] and count_calls == 1
+
+
+def test_admission_uses_in_flight_budget_and_scales_retry_after():
+    controller = AdmissionController(lambda queues: {})
+    metrics.reset()
+
+    decisions, _ = run_checks(controller, ["small", "standard"], {"small": 50, None: 1})
+
+    assert not decisions[0]["admitted"]
+    assert decisions[0]["retry_after"] == 30 * 3
+    assert decisions[1]["admitted"]
+    assert controller.snapshot()["lanes"]["standard"]["in_flight"] == 2
+    assert metrics.counters("admission.") == {"admission.rejected.small": 1, "admission.admitted.standard": 1}
+
+
+def test_admission_check_without_reserve_and_fail_open():
+    controller = AdmissionController(lambda queues: {"ocr": 1})
+    decisions, _ = run_checks(controller, ["standard"] * 3, {}, reserve=False)
+    assert all(d["admitted"] for d in decisions)
+
+    def broken(queues):
+        raise ConnectionError("broker down")
+
+    decisions, _ = run_checks(AdmissionController(broken), ["standard"], {})
+    assert decisions[0]["admitted"]
@@ -1,8 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.main import app
-from app.api.dependencies import get_receipt_repository, get_storage_service
+from app.api.dependencies import get_receipt_repository, get_batch_repository, get_storage_service
 
 client = TestClient(app)
 
@@ -11,6 +11,9 @@ class MockReceiptRepository:
     async def create(self, session, obj_in):
         return MagicMock(id=1, task_id="mock-task-id")
 
+    async def get_by_task_id(self, task_id):
+        return None
+
 class MockStorageService:
     async def upload_file(self, content, filename, content_type):
         return "mock-s3-key"
@@ -19,17 +22,23 @@ class MockStorageService:
 app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
 app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
 
+@pytest.fixture(autouse=True)
+def no_admission_control():
+    # Admission control probes the broker; tests that need it turn it back on
+    with patch("app.services.admission.settings.ADMISSION_CONTROL", False):
+        yield
+
 @pytest.fixture
 def mock_image_file():
-    return ("test.jpg", b"fake_image_bytes", "image/jpeg")
+    return ("test.jpg", b"\xff\xd8\xff\xe0fake_image_bytes", "image/jpeg")
 
-@patch("app.api.v1.endpoints.receipts.process_receipt_task.delay")
-def test_process_receipt_endpoint(mock_task_delay, mock_image_file):
+@patch("app.api.v1.endpoints.receipts.dispatch_receipt")
+def test_process_receipt_endpoint(mock_dispatch, mock_image_file):
     """
     Test that the POST /process-receipt endpoint correctly uploads file,
     creates DB record, and dispatches Celery task.
     """
-    mock_task_delay.return_value = MagicMock(id="mock-task-id")
+    mock_dispatch.return_value = "mock-task-id"
     
     filename, filebytes, content_type = mock_image_file
     response = client.post(
@@ -43,7 +52,7 @@ def test_process_receipt_endpoint(mock_task_delay, mock_image_file):
     assert json_data["status"] == "success"
     assert "task_id" in json_data["data"]
     
-    mock_task_delay.assert_called_once()
+    mock_dispatch.assert_called_once()
 
 def test_process_receipt_invalid_file_type():
     """
@@ -88,4 +97,530 @@ async def test_get_receipt_history(mock_get_multi):
     assert response.status_code == 200
     json_data = response.json()
     assert len(json_data) == 2
-    assert json_data[0]["merchant"] == "Shop A"
\ No newline at end of file
+    assert json_data[0]["merchant"] == "Shop A"
+class DuplicateReceiptRepository:
+    def __init__(self, existing):
+        self.existing = existing
+        self.created = []
+
+    async def get_completed_by_hash(self, content_hash, require_summary=False, ocr_mode="full"):
+        return self.existing
+
+    async def create(self, obj_in):
+        self.created.append(obj_in)
+        return obj_in
+
+@patch("app.api.v1.endpoints.receipts.celery_app")
+@patch("app.api.v1.endpoints.receipts.dispatch_receipt")
+def test_process_receipt_reuses_duplicate_upload(mock_dispatch, mock_celery_app, mock_image_file):
+    """
+    Test that re-submitting already processed content reuses its results and
+    skips both the storage upload and OCR.
+    """
+    import hashlib
+    from app.models.receipt_db import Receipt
+
+    filename, filebytes, content_type = mock_image_file
+    existing = Receipt(
+        id=7, task_id="old-task", filename="old.jpg", s3_key="uploads/old.jpg",
+        content_hash=hashlib.sha256(filebytes).hexdigest(), status="completed",
+        merchant="Mock Shop", total=12.5, tags=[]
+    )
+    repo = DuplicateReceiptRepository(existing)
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock()
+    storage.delete_object_async = AsyncMock()
+    app.dependency_overrides[get_receipt_repository] = lambda: repo
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    try:
+        response = client.post(
+            "/api/v1/process-receipt",
+            files={"file": (filename, filebytes, content_type)},
+        )
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+
+    assert response.status_code == 201
+    assert response.json()["duplicate_of"] == 7
+    mock_dispatch.assert_not_called()
+    # Hashed from the spooled body: nothing is sent to storage, the record points at the original object
+    storage.upload_stream_async.assert_not_called()
+    storage.delete_object_async.assert_not_called()
+
+    created = repo.created[0]
+    assert created.status == "completed"
+    assert created.merchant == "Mock Shop"
+    assert created.s3_key == "uploads/old.jpg"
+    # Slim results: /tasks/{task_id} reads the completed row, nothing goes to the backend
+    mock_celery_app.backend.store_result.assert_not_called()
+
+def test_process_receipt_rejects_mismatched_content():
+    """
+    Test that the declared type is checked against the file's leading bytes.
+    """
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock()
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    try:
+        response = client.post(
+            "/api/v1/process-receipt",
+            files={"file": ("test.pdf", b"\xff\xd8\xff\xe0jpeg", "application/pdf")},
+        )
+    finally:
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+
+    assert response.status_code == 400
+    storage.upload_stream_async.assert_not_called()
+
+def test_process_receipt_rejects_oversized_upload(mock_image_file):
+    """
+    Test that uploads over MAX_UPLOAD_BYTES are rejected with 413.
+    """
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock()
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    try:
+        filename, filebytes, content_type = mock_image_file
+        with patch("app.api.v1.endpoints.receipts.settings.MAX_UPLOAD_BYTES", len(filebytes) - 1):
+            response = client.post(
+                "/api/v1/process-receipt",
+                files={"file": (filename, filebytes, content_type)},
+            )
+    finally:
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+
+    assert response.status_code == 413
+    storage.upload_stream_async.assert_not_called()
+
+class RecordingReceiptRepository(DuplicateReceiptRepository):
+    def __init__(self, existing=None):
+        super().__init__(existing)
+
+    async def get_completed_by_hashes(self, content_hashes, require_summary=False, ocr_mode="full"):
+        return {h: self.existing for h in content_hashes if self.existing and h == self.existing.content_hash}
+
+class RecordingBatchRepository:
+    def __init__(self):
+        self.batches = []
+
+    async def create_with_receipts(self, batch, receipts):
+        self.batches.append((batch, list(receipts)))
+        return batch
+
+@patch("app.api.v1.endpoints.receipts.dispatch_receipts")
+def test_bulk_upload_runs_files_concurrently(mock_dispatch, mock_image_file):
+    """
+    Test that bulk files are uploaded concurrently, bounded by BULK_UPLOAD_CONCURRENCY,
+    and that results keep the request order.
+    """
+    import asyncio
+
+    state = {"active": 0, "peak": 0}
+
+    async def slow_upload(stream, s3_key, content_type, **kwargs):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return {"size": 1, "sha256": s3_key}
+
+    repo = RecordingReceiptRepository()
+    batch_repo = RecordingBatchRepository()
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock(side_effect=slow_upload)
+    app.dependency_overrides[get_receipt_repository] = lambda: repo
+    app.dependency_overrides[get_batch_repository] = lambda: batch_repo
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    filename, filebytes, content_type = mock_image_file
+    files = [("files", (f"{i}.jpg", filebytes, content_type)) for i in range(6)]
+    files.append(("files", ("notes.txt", b"text", "text/plain")))
+    try:
+        with patch("app.api.v1.endpoints.receipts.settings.BULK_UPLOAD_CONCURRENCY", 3):
+            response = client.post("/api/v1/process-receipt/bulk", files=files)
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+        app.dependency_overrides.pop(get_batch_repository)
+
+    assert response.status_code == 201
+    tasks = response.json()["tasks"]
+    assert [t["filename"] for t in tasks] == [f"{i}.jpg" for i in range(6)] + ["notes.txt"]
+    assert [t["status"] for t in tasks] == ["queued"] * 6 + ["error"]
+    assert all(t["lane"] == "small" for t in tasks[:6])
+    assert state["peak"] == 3
+
+    # One batch insert with every accepted row, then one group dispatch
+    batch, receipts = batch_repo.batches[0]
+    assert batch.id == response.json()["batch_id"] and batch.file_count == 7
+    assert [r.filename for r in receipts] == [f"{i}.jpg" for i in range(6)]
+    assert all(r.batch_id == batch.id and r.status == "pending" for r in receipts)
+    mock_dispatch.assert_called_once()
+    pipelines = mock_dispatch.call_args[0][0]
+    assert [p["task_id"] for p in pipelines] == [t["task_id"] for t in tasks[:6]]
+    assert [p["task_id"] for p in pipelines] == [r.task_id for r in receipts]
+    assert all(p["lane"] == r.lane == "small" for p, r in zip(pipelines, receipts))
+
+def test_get_batch_progress():
+    """
+    Test the GET /batches/{batch_id} endpoint.
+    """
+    class ProgressRepository:
+        async def get_progress(self, batch_id):
+            if batch_id == "b1":
+                return {"batch_id": "b1", "counts": {"pending": 0, "completed": 2, "error": 0}, "done": True}
+            return None
+
+    app.dependency_overrides[get_batch_repository] = lambda: ProgressRepository()
+    try:
+        found = client.get("/api/v1/batches/b1")
+        missing = client.get("/api/v1/batches/nope")
+    finally:
+        app.dependency_overrides.pop(get_batch_repository)
+
+    assert found.status_code == 200 and found.json()["done"]
+    assert missing.status_code == 404
+
+def test_stream_task_events():
+    """
+    Test that /tasks/events reports finished tasks from the DB and streams
+    published events until every task is done.
+    """
+    from app.models.receipt_db import Receipt
+    from app.services.events import LocalEventBus
+
+    bus = LocalEventBus()
+
+    class EventsRepository:
+        async def get_by_task_ids(self, task_ids):
+            # Runs after the subscription is made: events published now must arrive
+            bus.publish("t2", {"task_id": "t2", "event": "stage", "stage": "ocr"})
+            bus.publish("t2", {"task_id": "t2", "event": "completed", "result": {"status": "success"}})
+            return [
+                Receipt(task_id="t1", filename="a.jpg", s3_key="k", status="completed", merchant="Shop", tags=[]),
+                Receipt(task_id="t2", filename="b.jpg", s3_key="k", status="pending"),
+            ]
+
+    app.dependency_overrides[get_receipt_repository] = lambda: EventsRepository()
+    try:
+        with patch("app.api.v1.endpoints.tasks.get_event_bus", return_value=bus):
+            response = client.get("/api/v1/tasks/events", params={"task_ids": "t1,t2"})
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line for line in response.text.splitlines() if line.startswith("event:")]
+    assert events == ["event: completed", "event: stage", "event: completed"]
+    assert '"merchant": "Shop"' in response.text
+    assert bus._subscribers == {}
+
+def test_stream_task_events_ends_for_unknown_and_stalled_tasks():
+    """
+    Test that ids with no receipt are reported as unknown instead of keeping
+    the stream open, and that a stream is closed after SSE_MAX_STREAM_SECONDS.
+    """
+    from app.models.receipt_db import Receipt
+    from app.services.events import LocalEventBus
+
+    bus = LocalEventBus()
+
+    class EventsRepository:
+        async def get_by_task_ids(self, task_ids):
+            return [Receipt(task_id="t1", filename="a.jpg", s3_key="k", status="processing")]
+
+    app.dependency_overrides[get_receipt_repository] = lambda: EventsRepository()
+    try:
+        with patch("app.api.v1.endpoints.tasks.get_event_bus", return_value=bus):
+            unknown = client.get("/api/v1/tasks/events", params={"task_ids": "nope"})
+            with patch("app.api.v1.endpoints.tasks.settings.SSE_MAX_STREAM_SECONDS", 0.05):
+                stalled = client.get("/api/v1/tasks/events", params={"task_ids": "t1,nope"})
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+
+    assert [line for line in unknown.text.splitlines() if line.startswith("event:")] == ["event: unknown"]
+    events = [line for line in stalled.text.splitlines() if line.startswith("event:")]
+    assert events == ["event: unknown", "event: timeout"]
+    assert '"task_ids": ["t1"]' in stalled.text
+    assert bus._subscribers == {}
+
+@pytest.fixture
+def busy_lanes():
+    """Admission control on, with the small lane over budget and the others idle."""
+    from app.services.admission import admission_controller
+
+    def probe(queues):
+        return {"ocr.small": 5000}
+
+    with patch("app.services.admission.settings.ADMISSION_CONTROL", True), \
+         patch.object(admission_controller, "probe_depths", probe), \
+         patch.object(admission_controller, "_state", None):
+        yield
+
+class InFlightRepository(RecordingReceiptRepository):
+    async def count_in_flight_by_lane(self):
+        return {"standard": 3}
+
+@patch("app.api.v1.endpoints.receipts.dispatch_receipt")
+def test_process_receipt_rejects_when_lane_is_full(mock_dispatch, busy_lanes, mock_image_file):
+    """
+    Test that a full lane gets 429 with Retry-After and nothing is uploaded.
+    """
+    from app.core.metrics import metrics
+
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock()
+    app.dependency_overrides[get_receipt_repository] = lambda: InFlightRepository()
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    before = metrics.counters("admission.rejected.small").get("admission.rejected.small", 0)
+    try:
+        filename, filebytes, content_type = mock_image_file
+        response = client.post(
+            "/api/v1/process-receipt",
+            files={"file": (filename, filebytes, content_type)},
+        )
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 30
+    storage.upload_stream_async.assert_not_called()
+    mock_dispatch.assert_not_called()
+    assert metrics.counters("admission.rejected.small")["admission.rejected.small"] == before + 1
+
+@patch("app.api.v1.endpoints.receipts.dispatch_receipt")
+def test_duplicate_accepted_while_lane_is_full(mock_dispatch, busy_lanes, mock_image_file):
+    """
+    Test that duplicates need no queue slot: they are served even when their lane is full.
+    """
+    import hashlib
+    from app.models.receipt_db import Receipt
+
+    filename, filebytes, content_type = mock_image_file
+    existing = Receipt(id=7, task_id="old-task", filename="old.jpg", s3_key="uploads/old.jpg",
+                       content_hash=hashlib.sha256(filebytes).hexdigest(), status="completed", tags=[])
+    app.dependency_overrides[get_receipt_repository] = lambda: DuplicateReceiptRepository(existing)
+    try:
+        response = client.post(
+            "/api/v1/process-receipt",
+            files={"file": (filename, filebytes, content_type)},
+        )
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+
+    assert response.status_code == 201
+    assert response.json()["duplicate_of"] == 7
+    mock_dispatch.assert_not_called()
+
+@patch("app.api.v1.endpoints.receipts.dispatch_receipts")
+def test_bulk_upload_defers_files_for_full_lanes(mock_dispatch, busy_lanes, mock_image_file):
+    """
+    Test that bulk files for a full lane are deferred while others are queued.
+    """
+    big_png = b"\x89PNG\r\n\x1a\n" + b"0" * (4 * 1024 * 1024)
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock(return_value={"size": len(big_png), "sha256": "h"})
+    storage.delete_object_async = AsyncMock()
+    batch_repo = RecordingBatchRepository()
+    app.dependency_overrides[get_receipt_repository] = lambda: InFlightRepository()
+    app.dependency_overrides[get_batch_repository] = lambda: batch_repo
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    filename, filebytes, content_type = mock_image_file
+    try:
+        response = client.post("/api/v1/process-receipt/bulk", files=[
+            ("files", (filename, filebytes, content_type)),
+            ("files", ("big.png", big_png, "image/png")),
+        ])
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+        app.dependency_overrides.pop(get_batch_repository)
+
+    assert response.status_code == 201
+    tasks = response.json()["tasks"]
+    assert tasks[0]["status"] == "deferred" and tasks[0]["retry_after"] >= 30
+    assert tasks[1]["status"] == "queued"
+    assert storage.upload_stream_async.call_count == 1
+
+@patch("app.api.v1.endpoints.receipts.dispatch_receipts")
+def test_bulk_upload_skips_storage_for_duplicates(mock_dispatch, mock_image_file):
+    """
+    Test that bulk files matching completed content are not uploaded at all.
+    """
+    import hashlib
+    from app.models.receipt_db import Receipt
+
+    filename, filebytes, content_type = mock_image_file
+    existing = Receipt(
+        id=7, task_id="old-task", filename="old.jpg", s3_key="uploads/old.jpg",
+        content_hash=hashlib.sha256(filebytes).hexdigest(), status="completed", tags=[]
+    )
+    fresh = filebytes + b"\x00"
+    uploaded = []
+
+    async def upload(stream, s3_key, content_type, **kwargs):
+        uploaded.append(stream.read())
+
+    storage = MagicMock()
+    storage.upload_stream_async = AsyncMock(side_effect=upload)
+    storage.delete_object_async = AsyncMock()
+    batch_repo = RecordingBatchRepository()
+    app.dependency_overrides[get_receipt_repository] = lambda: RecordingReceiptRepository(existing)
+    app.dependency_overrides[get_batch_repository] = lambda: batch_repo
+    app.dependency_overrides[get_storage_service] = lambda: storage
+    try:
+        response = client.post("/api/v1/process-receipt/bulk", files=[
+            ("files", ("dup.jpg", filebytes, content_type)),
+            ("files", ("new.jpg", fresh, content_type)),
+        ])
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides[get_storage_service] = lambda: MockStorageService()
+        app.dependency_overrides.pop(get_batch_repository)
+
+    assert response.status_code == 201
+    tasks = response.json()["tasks"]
+    assert tasks[0]["status"] == "completed" and tasks[0]["duplicate_of"] == 7
+    assert tasks[1]["status"] == "queued"
+    # Only the new file is uploaded, rewound after hashing
+    assert uploaded == [fresh]
+    storage.delete_object_async.assert_not_called()
+
+@patch("app.api.v1.endpoints.tasks.AsyncResult")
+def test_get_task_status_reads_receipt_row(mock_async_result):
+    """
+    Test that receipt tasks are answered from the DB without touching the result backend.
+    """
+    from app.models.receipt_db import Receipt
+
+    rows = {
+        "done": Receipt(task_id="done", filename="a.jpg", s3_key="k", status="completed",
+                        merchant="Mock Shop", total=100.0, tags=[]),
+        "failed": Receipt(task_id="failed", filename="b.jpg", s3_key="k", status="error", error="OCR failed"),
+        "queued": Receipt(task_id="queued", filename="c.jpg", s3_key="k", status="pending"),
+    }
+
+    class TaskRepository:
+        async def get_by_task_id(self, task_id):
+            return rows.get(task_id)
+
+    app.dependency_overrides[get_receipt_repository] = lambda: TaskRepository()
+    try:
+        done = client.get("/api/v1/tasks/done").json()
+        failed = client.get("/api/v1/tasks/failed").json()
+        queued = client.get("/api/v1/tasks/queued").json()
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+
+    assert done["state"] == "SUCCESS"
+    assert done["result"]["data"]["merchant"] == "Mock Shop"
+    assert failed == {"state": "FAILURE", "error": "OCR failed"}
+    assert queued["state"] == "PENDING"
+    mock_async_result.assert_not_called()
+
+class HistoryRepository:
+    def __init__(self):
+        self.calls = []
+
+    async def get_history(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs["cursor"] == "bad":
+            raise ValueError("Invalid cursor: bad")
+        return {"items": [{"id": 3, "merchant": "Shop A"}], "next_cursor": "c2"}
+
+def test_history_passes_filters_and_cursor():
+    """
+    Test that GET /receipts/history forwards paging, projection and filters.
+    """
+    repo = HistoryRepository()
+    app.dependency_overrides[get_receipt_repository] = lambda: repo
+    try:
+        response = client.get("/api/v1/receipts/history", params={
+            "limit": 20, "cursor": "c1", "include": "summary", "status": "completed",
+            "merchant": "shop", "date_from": "2024-01-01", "total_min": 5, "tags": ["Weekend", "High Value"],
+        })
+        bad_include = client.get("/api/v1/receipts/history", params={"include": "summary,s3_key"})
+        bad_cursor = client.get("/api/v1/receipts/history", params={"cursor": "bad"})
+        too_big = client.get("/api/v1/receipts/history", params={"limit": 100000})
+        bad_date = client.get("/api/v1/receipts/history", params={"date_to": "2024-13-01"})
+        not_a_date = client.get("/api/v1/receipts/history", params={"date_from": "last week"})
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+
+    assert response.status_code == 200
+    assert response.json() == {"items": [{"id": 3, "merchant": "Shop A"}], "next_cursor": "c2"}
+    assert repo.calls[0] == {
+        "limit": 20, "cursor": "c1", "include": ("summary",), "status": "completed", "merchant": "shop",
+        "date_from": "2024-01-01", "date_to": None, "total_min": 5.0, "total_max": None,
+        "tags": ["Weekend", "High Value"],
+    }
+    assert bad_include.status_code == 400
+    assert bad_cursor.status_code == 400
+    assert too_big.status_code == 422
+    assert bad_date.status_code == 400 and "date_to" in bad_date.json()["detail"]
+    assert not_a_date.status_code == 400
+    assert len(repo.calls) == 2  # invalid requests never reach the repository
+
+def test_build_duplicate_keeps_deferred_summary_flag():
+    from app.api.v1.endpoints.receipts import build_duplicate
+    from app.models.receipt_db import Receipt
+
+    existing = Receipt(task_id="t1", filename="a.jpg", s3_key="k", status="completed", content_hash="h",
+                       summary="Summary deferred (provider unavailable).", summary_deferred=True, tags=[])
+    duplicate = build_duplicate(existing, "b.jpg")
+
+    assert duplicate.summary_deferred is True
+    assert duplicate.summary == existing.summary
+
+def test_process_receipt_rejects_internal_callback_url(mock_image_file):
+    """
+    Test that callback URLs pointing at internal addresses are refused (SSRF).
+    """
+    filename, filebytes, content_type = mock_image_file
+    response = client.post(
+        "/api/v1/process-receipt",
+        files={"file": (filename, filebytes, content_type)},
+        data={"callback_url": "http://169.254.169.254/latest/meta-data"},
+    )
+    assert response.status_code == 400
+    assert "non-public" in response.json()["detail"]
+
+@patch("app.api.v1.endpoints.receipts.check_webhook_url")
+@patch("app.api.v1.endpoints.receipts.notify_finished")
+def test_duplicates_notify_their_callback(mock_notify, mock_check, mock_image_file):
+    """
+    Test that duplicate completions store the callback URL and send the
+    completion event/webhook, in the single and bulk endpoints.
+    """
+    import hashlib
+    from app.models.receipt_db import Receipt
+
+    filename, filebytes, content_type = mock_image_file
+    existing = Receipt(id=7, task_id="old-task", filename="old.jpg", s3_key="uploads/old.jpg",
+                       content_hash=hashlib.sha256(filebytes).hexdigest(), status="completed",
+                       merchant="Mock Shop", tags=[])
+    repo = RecordingReceiptRepository(existing)
+    batch_repo = RecordingBatchRepository()
+    app.dependency_overrides[get_receipt_repository] = lambda: repo
+    app.dependency_overrides[get_batch_repository] = lambda: batch_repo
+    callback = {"callback_url": "https://client.example.com/hook"}
+    try:
+        single = client.post("/api/v1/process-receipt", files={"file": (filename, filebytes, content_type)},
+                             data=callback)
+        bulk = client.post("/api/v1/process-receipt/bulk", files=[("files", (filename, filebytes, content_type))],
+                           data=callback)
+    finally:
+        app.dependency_overrides[get_receipt_repository] = lambda: MockReceiptRepository()
+        app.dependency_overrides.pop(get_batch_repository)
+
+    assert single.status_code == 201 and bulk.status_code == 201
+    assert repo.created[0].callback_url == callback["callback_url"]
+    assert batch_repo.batches[0][1][0].callback_url == callback["callback_url"]
+    task_ids = [single.json()["task_id"], bulk.json()["tasks"][0]["task_id"]]
+    assert [c.args[0] for c in mock_notify.call_args_list] == task_ids
+    for c in mock_notify.call_args_list:
+        task_id, event, result, url = c.args
+        assert (event, url) == ("completed", callback["callback_url"])
+        assert result["data"]["merchant"] == "Mock Shop"
+
@@ -0,0 +1,74 @@
+import asyncio
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.models.receipt_db import Batch, Receipt
+from app.repositories.batch import BatchRepository
+
+
+class SyncSessionAdapter:
+    """Runs the repository's awaited session calls on a sync SQLite session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def add(self, obj):
+        self.session.add(obj)
+
+    def add_all(self, objs):
+        self.session.add_all(objs)
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+    async def commit(self):
+        self.session.commit()
+
+
+def make_repo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batches.db'}")
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    return BatchRepository(SyncSessionAdapter(session)), session
+
+
+def receipt(task_id, status, batch_id="b1", **fields):
+    return Receipt(task_id=task_id, filename=f"{task_id}.jpg", s3_key="k",
+                   status=status, batch_id=batch_id, tags=[], **fields)
+
+
+def test_batch_progress_aggregates_receipts(tmp_path):
+    repo, session = make_repo(tmp_path)
+    asyncio.run(repo.create_with_receipts(
+        Batch(id="b1", file_count=4),
+        [receipt("t1", "completed", merchant="Shop", total=5.0), receipt("t2", "pending"), receipt("t3", "error")],
+    ))
+    session.add(receipt("other", "pending", batch_id="b2"))
+    session.commit()
+
+    progress = asyncio.run(repo.get_progress("b1"))
+
+    assert progress["file_count"] == 4
+    assert progress["counts"] == {"pending": 1, "completed": 1, "error": 1}
+    assert progress["progress"] == 0.667 and not progress["done"]
+    assert [r["task_id"] for r in progress["receipts"]] == ["t1", "t2", "t3"]
+    assert progress["receipts"][0]["merchant"] == "Shop"
+
+
+def test_batch_progress_unknown_and_empty(tmp_path):
+    repo, _ = make_repo(tmp_path)
+    asyncio.run(repo.create_with_receipts(Batch(id="empty", file_count=1), []))
+
+    assert asyncio.run(repo.get_progress("missing")) is None
+    empty = asyncio.run(repo.get_progress("empty"))
+    assert empty["receipts"] == [] and empty["done"]
+
+
+def test_mark_pending_failed_only_touches_pending_rows(tmp_path):
+    repo, session = make_repo(tmp_path)
+    asyncio.run(repo.create_with_receipts(
+        Batch(id="b1"), [receipt("t1", "completed"), receipt("t2", "pending")]
+    ))
+
+    asyncio.run(repo.mark_pending_failed("b1"))
+
+    statuses = session.exec(select(Receipt.status).order_by(Receipt.id)).all()
+    assert statuses == ["completed", "error"]
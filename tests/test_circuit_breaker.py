@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from app.core.metrics import metrics
+from app.services.circuit_breaker import CircuitBreaker, LocalBreakerStore
+
+
+def make_breaker(store=None):
+    return CircuitBreaker(store or LocalBreakerStore(), "llm", failure_threshold=3,
+                          latency_slo=2.0, open_seconds=30, failure_window=60)
+
+
+def test_opens_after_consecutive_failures():
+    metrics.reset()
+    breaker = make_breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(0.5)  # a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state() == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state() == "open"
+    assert not breaker.allow()
+    assert metrics.counters("llm.breaker.") == {"llm.breaker.opened": 1, "llm.breaker.rejected": 1}
+
+
+def test_latency_slo_breaches_count_as_failures():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_success(2.5)
+    assert breaker.state() == "open"
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker()
+    with patch("app.services.circuit_breaker.time.monotonic", return_value=100.0):
+        for _ in range(3):
+            breaker.record_failure()
+    with patch("app.services.circuit_breaker.time.monotonic", return_value=131.0):
+        assert breaker.state() == "half_open"
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.record_failure()  # failed probe opens it again
+        assert breaker.state() == "open"
+    with patch("app.services.circuit_breaker.time.monotonic", return_value=162.0):
+        assert breaker.allow()
+        breaker.record_success(0.1)
+        assert breaker.state() == "closed"
+        assert breaker.allow() and breaker.allow()
+
+
+def test_state_is_shared_through_the_store():
+    store = LocalBreakerStore()
+    worker_a, worker_b = make_breaker(store), make_breaker(store)
+    for _ in range(3):
+        worker_a.record_failure()
+    assert not worker_b.allow()
+
+
+class BrokenStore:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("redis down")
+        return fail
+
+
+def test_unreachable_store_lets_calls_through():
+    breaker = make_breaker(BrokenStore())
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state() == "unknown"
+    assert breaker.claim("backfill", 30)
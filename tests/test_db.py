@@ -0,0 +1,23 @@
+from unittest.mock import patch
+
+from sqlalchemy import inspect
+from sqlmodel import create_engine
+
+from app import db
+
+
+def test_indexes_are_left_to_the_migration_step(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE receipt (id INTEGER PRIMARY KEY, task_id VARCHAR, status VARCHAR)")
+
+    with patch.object(db, "sync_engine", engine):
+        db.init_db()
+        columns = {column["name"] for column in inspect(engine).get_columns("receipt")}
+        # Startup only adds columns: no index build on an existing (possibly large) table
+        assert {"created_at", "summary_deferred"} <= columns
+        assert inspect(engine).get_indexes("receipt") == []
+
+        built = db.create_missing_indexes()
+        assert {"ix_receipt_created_at_id", "ix_receipt_status_created_at_id", "ix_receipt_status"} <= set(built)
+        assert db.create_missing_indexes() == []
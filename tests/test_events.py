@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from unittest.mock import patch
+from app.services import events
+from app.services.events import LocalEventBus, publish_event
+
+
+def test_local_bus_delivers_to_matching_subscribers():
+    async def scenario():
+        bus = LocalEventBus()
+        first = await bus.subscribe(["a", "b"])
+        second = await bus.subscribe(["b"])
+
+        # Workers publish from other threads
+        thread = threading.Thread(target=bus.publish, args=("b", {"task_id": "b", "event": "stage"}))
+        thread.start()
+        thread.join()
+        bus.publish("c", {"task_id": "c", "event": "stage"})
+
+        got = [await first.get(timeout=1), await second.get(timeout=1)]
+        assert await first.get(timeout=0.01) is None
+
+        await first.close()
+        await second.close()
+        bus.publish("b", {"task_id": "b", "event": "completed"})
+        return got, bus._subscribers
+
+    got, subscribers = asyncio.run(scenario())
+    assert got == [{"task_id": "b", "event": "stage"}] * 2
+    assert subscribers == {}
+
+
+def test_publish_event_is_best_effort():
+    class BrokenBus:
+        def publish(self, task_id, event):
+            raise ConnectionError("redis down")
+
+    with patch.object(events, "get_event_bus", return_value=BrokenBus()):
+        publish_event("t1", "stage", stage="ocr")  # must not raise
+
+    published = []
+
+    class RecordingBus:
+        def publish(self, task_id, event):
+            published.append(event)
+
+    with patch.object(events, "get_event_bus", return_value=RecordingBus()):
+        publish_event(None, "stage")
+        publish_event("t1", "stage", stage="ocr")
+    assert published == [{"task_id": "t1", "event": "stage", "stage": "ocr"}]
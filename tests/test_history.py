@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.models.receipt_db import Receipt
+from app.repositories.receipt import ReceiptRepository, decode_cursor, encode_cursor
+
+
+class SyncSessionAdapter:
+    """Runs the repository's awaited session calls on a sync SQLite session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with Session(engine) as session:
+        for i in range(25):
+            session.add(Receipt(
+                task_id=f"t{i}", filename=f"{i}.jpg", s3_key="k",
+                status="error" if i % 5 == 0 else "completed",
+                merchant="Walmart" if i % 2 else "Target 100%",
+                date=f"2024-02-{i + 1:02d}", total=float(i * 10),
+                tags=["High Value"] if i >= 20 else ["Weekend", "Tip Included"] if i % 3 == 0 else [],
+                summary="long summary", raw_text="long text",
+                # Two receipts per timestamp: pages must break ties on id
+                created_at=start + timedelta(minutes=i // 2),
+            ))
+        session.commit()
+        yield ReceiptRepository(SyncSessionAdapter(session))
+
+
+def history(repo, **kwargs):
+    return asyncio.run(repo.get_history(**kwargs))
+
+
+def test_pages_walk_every_receipt_once_newest_first(repo):
+    seen, cursor = [], None
+    while True:
+        page = history(repo, limit=4, cursor=cursor)
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == list(range(25, 0, -1))
+
+
+def test_items_are_projected_unless_text_requested(repo):
+    item = history(repo, limit=1)["items"][0]
+    assert "raw_text" not in item and "summary" not in item
+    assert item["merchant"] and "created_at" in item
+
+    item = history(repo, limit=1, include=("summary",))["items"][0]
+    assert item["summary"] == "long summary" and "raw_text" not in item
+
+
+def test_filters(repo):
+    def ids(**filters):
+        return {item["id"] for item in history(repo, limit=100, **filters)["items"]}
+
+    assert ids(status="error") == {1, 6, 11, 16, 21}
+    assert ids(merchant="walm") == {i + 1 for i in range(25) if i % 2}
+    assert ids(merchant="100%") == {i + 1 for i in range(25) if not i % 2}
+    assert ids(merchant="%") == {i + 1 for i in range(25) if not i % 2}
+    assert ids(date_from="2024-02-03", date_to="2024-02-05") == {3, 4, 5}
+    assert ids(total_min=50, total_max=70) == {6, 7, 8}
+    assert ids(tags=["High Value"]) == {21, 22, 23, 24, 25}
+    assert ids(tags=["Weekend", "Tip Included"]) == {1, 4, 7, 10, 13, 16, 19}
+    assert ids(tags=["Weekend"], status="error", total_max=100) == {1}
+
+
+def test_filtered_pages_keep_the_filter(repo):
+    first = history(repo, limit=2, status="completed")
+    second = history(repo, limit=2, status="completed", cursor=first["next_cursor"])
+
+    assert [i["id"] for i in first["items"]] == [25, 24]
+    assert [i["id"] for i in second["items"]] == [23, 22]
+
+
+def test_cursor_round_trip_and_validation():
+    created_at = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_deferred_summaries_do_not_satisfy_summary_dedup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedup.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Receipt(task_id="t1", filename="a.jpg", s3_key="k", status="completed", content_hash="h",
+                            summary="Summary deferred (provider unavailable).", summary_deferred=True, tags=[]))
+        session.commit()
+        repo = ReceiptRepository(SyncSessionAdapter(session))
+
+        assert asyncio.run(repo.get_completed_by_hash("h", require_summary=True)) is None
+        assert asyncio.run(repo.get_completed_by_hashes(["h"], require_summary=True)) == {}
+        assert asyncio.run(repo.get_completed_by_hash("h")).task_id == "t1"
+
+
+def test_failed_summaries_do_not_satisfy_summary_dedup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedup.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Receipt(task_id="failed", filename="a.jpg", s3_key="k", status="completed", content_hash="f",
+                            summary="Summary unavailable (Timeout).", summary_failed=True, tags=[]))
+        # Stored before summary_failed existed: recognized by its fallback text
+        session.add(Receipt(task_id="legacy", filename="b.jpg", s3_key="k", status="completed", content_hash="l",
+                            summary="Summary generation failed.", tags=[]))
+        session.add(Receipt(task_id="real", filename="c.jpg", s3_key="k", status="completed", content_hash="r",
+                            summary="Groceries at Walmart.", tags=[]))
+        session.commit()
+        session.execute(text("UPDATE receipt SET summary_failed = NULL WHERE task_id IN ('legacy', 'real')"))
+        session.commit()
+        repo = ReceiptRepository(SyncSessionAdapter(session))
+
+        assert set(asyncio.run(repo.get_completed_by_hashes(["f", "l", "r"], require_summary=True))) == {"r"}
+        assert asyncio.run(repo.get_completed_by_hash("f", require_summary=True)) is None
+        assert set(asyncio.run(repo.get_completed_by_hashes(["f", "l", "r"]))) == {"f", "l", "r"}
+
+
+def test_progressive_results_do_not_serve_full_requests(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'modes.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Receipt(task_id="partial", filename="a.pdf", s3_key="k", status="completed",
+                            content_hash="p", ocr_mode="progressive", tags=[]))
+        session.add(Receipt(task_id="complete", filename="b.pdf", s3_key="k", status="completed",
+                            content_hash="f", ocr_mode="full", tags=[]))
+        session.add(Receipt(task_id="legacy", filename="c.pdf", s3_key="k", status="completed",
+                            content_hash="l", ocr_mode=None, tags=[]))
+        session.commit()
+        repo = ReceiptRepository(SyncSessionAdapter(session))
+
+        def found(ocr_mode):
+            return set(asyncio.run(repo.get_completed_by_hashes(["p", "f", "l"], ocr_mode=ocr_mode)))
+
+        assert found("full") == {"f", "l"}
+        assert found("progressive") == {"p", "f", "l"}
+        assert asyncio.run(repo.get_completed_by_hash("p")) is None
+        assert asyncio.run(repo.get_completed_by_hash("p", ocr_mode="progressive")).task_id == "partial"
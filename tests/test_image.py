@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+from app.services.image import ImageService
+
+
+def render_text_image(width: int, height: int, font_scale: float) -> np.ndarray:
+    image = np.full((height, width), 235, np.uint8)
+    y = int(60 * font_scale)
+    while y < height:
+        cv2.putText(image, "TOTAL 12.34 TAX 1.00", (int(20 * font_scale), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 20, max(1, int(2 * font_scale)))
+        y += int(45 * font_scale)
+    return image
+
+
+def test_normalize_resolution_downscales_oversized_text():
+    service = ImageService(adaptive_resolution=True, target_glyph_height=32)
+    image = render_text_image(3000, 4000, 4.0)
+    normalized = service.normalize_resolution(image)
+    assert normalized.shape[0] < image.shape[0]
+    glyph = service.estimate_glyph_height(normalized)
+    assert 24 <= glyph <= 40
+
+
+def test_normalize_resolution_respects_pixel_cap():
+    service = ImageService(adaptive_resolution=True, max_pixels=1_000_000)
+    image = render_text_image(1000, 1500, 0.5)
+    normalized = service.normalize_resolution(image)
+    assert normalized.shape[0] * normalized.shape[1] <= 1_000_000
+
+
+def test_decode_image_for_ocr_uses_reduced_grayscale():
+    service = ImageService(adaptive_resolution=True, max_pixels=1_000_000)
+    _, encoded = cv2.imencode(".jpg", render_text_image(2400, 3200, 2.0))
+    decoded = service.decode_image_for_ocr(encoded.tobytes())
+    assert decoded.ndim == 2
+    assert decoded.shape == (1600, 1200)
+
+
+def test_crop_to_receipt_removes_background():
+    frame = np.full((2000, 1500), 40, np.uint8)
+    frame[300:1700, 450:1050] = render_text_image(600, 1400, 1.0)
+    service = ImageService(crop_receipt=True)
+    cropped = service.crop_to_receipt(frame)
+    assert 1400 <= cropped.shape[0] <= 1500
+    assert 600 <= cropped.shape[1] <= 700
+
+
+def test_crop_to_receipt_falls_back_to_full_frame():
+    service = ImageService(crop_receipt=True)
+    page = render_text_image(800, 1000, 1.0)
+    assert service.crop_to_receipt(page).shape == page.shape
@@ -0,0 +1,47 @@
+from app.services import lanes
+from app.services.lanes import PDFPageCounter, choose_lane, lane_queue
+
+MB = 1024 * 1024
+
+
+def make_pdf(pages, with_count=True):
+    count = f" /Count {pages}" if with_count else ""
+    objects = b"".join(b"%d 0 obj << /Type /Page /Parent 1 0 R >> endobj\n" % i for i in range(2, pages + 2))
+    return b"%PDF-1.4\n1 0 obj << /Type /Pages" + count.encode() + b" >> endobj\n" + objects + b"%%EOF"
+
+
+def test_page_counter_across_chunk_boundaries():
+    for with_count in (True, False):
+        data = make_pdf(12, with_count)
+        for size in (1, 7, 64, len(data)):
+            counter = PDFPageCounter()
+            for i in range(0, len(data), size):
+                counter.feed(data[i:i + size])
+            assert counter.page_count == 12
+
+
+def test_page_counter_unknown_for_compressed_objects():
+    counter = PDFPageCounter()
+    counter.feed(b"%PDF-1.5\n1 0 obj << /Type /ObjStm /N 40 /Filter /FlateDecode >> stream x\x9c...")
+    assert counter.page_count is None
+
+
+def test_choose_lane_default_rules():
+    assert choose_lane("image/jpeg", 200 * 1024) == "small"
+    assert choose_lane("image/png", 10 * MB) == "standard"
+    assert choose_lane("application/pdf", 100 * 1024, page_count=1) == "small"
+    assert choose_lane("application/pdf", 100 * 1024, page_count=5) == "standard"
+    assert choose_lane("application/pdf", 4 * MB, page_count=50) == "large"
+    # Unknown page count: page conditions don't match, size rules still do
+    assert choose_lane("application/pdf", 100 * 1024) == "standard"
+    assert choose_lane("application/pdf", 30 * MB) == "large"
+
+
+def test_choose_lane_custom_rules_and_queues():
+    rules = [{"lane": "express", "max_bytes": 10}]
+    assert choose_lane("image/png", 5, rules=rules) == "express"
+    assert choose_lane("image/png", 50, rules=rules) == lanes.settings.DEFAULT_LANE
+
+    assert lane_queue("small") == "ocr.small"
+    assert lane_queue(None) == "ocr"
+    assert lane_queue("unknown") == "ocr"
@@ -0,0 +1,207 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.core.metrics import metrics
+from app.services import llm
+from app.services.llm import LLMService
+from app.services.circuit_breaker import CircuitBreaker, LocalBreakerStore
+from app.services.summary_cache import MemoryTier, SummaryCache
+from benchmarks.llm_standin import StandinServer
+
+
+@pytest.fixture
+def standin():
+    server = StandinServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff():
+    with patch.object(llm.settings, "LLM_BACKOFF_BASE", 0.0), \
+         patch.object(llm.settings, "LLM_BACKOFF_MAX", 0.0), \
+         patch.object(llm.settings, "SUMMARY_CACHE_ENABLED", False), \
+         patch.object(llm.settings, "LLM_BREAKER_ENABLED", False):
+        yield
+
+
+def service_for(server):
+    return LLMService(api_key="test", model="test-model", url=server.url)
+
+
+def test_generate_summary_reuses_pooled_connection(standin):
+    service = service_for(standin)
+    summaries = [service.generate_summary("TOTAL 5.00", 5.0, "2024-01-01") for _ in range(5)]
+
+    assert summaries == [standin.content] * 5
+    assert standin.requests == 5
+    assert len(standin.connections) == 1
+
+
+def test_generate_summary_retries_then_falls_back(standin):
+    standin.fail_rate = 1.0
+    summary = service_for(standin).generate_summary("TOTAL 5.00", 5.0, None)
+
+    assert summary == "Summary unavailable (Provider Error: 503)"
+    assert standin.requests == llm.settings.LLM_MAX_RETRIES + 1
+
+
+def test_generate_summary_recovers_after_rate_limit(standin):
+    calls = []
+    original = standin.RequestHandlerClass._reply
+
+    def flaky(handler, status, payload):
+        calls.append(status)
+        if len(calls) == 1:
+            return original(handler, 429, {"error": "slow down"})
+        return original(handler, status, payload)
+
+    with patch.object(standin.RequestHandlerClass, "_reply", flaky):
+        summary = service_for(standin).generate_summary("TOTAL 5.00", 5.0, None)
+
+    assert summary == standin.content
+    assert standin.requests == 2
+
+
+def test_generate_summary_without_api_key_skips_call(standin):
+    service = LLMService(api_key=None, url=standin.url)
+    service.api_key = None
+    assert service.generate_summary("x", None, None) == "LLM Summary unavailable (API Key not configured)."
+    assert standin.requests == 0
+
+
+def test_process_concurrency_limit(standin):
+    standin.latency = 0.05
+    service = service_for(standin)
+    with patch.object(llm, "_call_slots", threading.BoundedSemaphore(2)):
+        threads = [threading.Thread(target=service.generate_summary, args=("x", None, None)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert standin.requests == 6
+    assert standin.peak_in_flight <= 2
+
+
+def test_generate_summaries_runs_concurrently_and_keeps_order(standin):
+    standin.latency = 0.05
+    items = [(f"receipt {i}", float(i), None) for i in range(12)]
+    with patch.object(llm.settings, "LLM_MAX_CONCURRENCY", 4):
+        summaries = service_for(standin).generate_summaries(items)
+
+    assert summaries == [standin.content] * 12
+    assert 1 < standin.peak_in_flight <= 4
+    assert len(standin.connections) <= 4
+
+
+def test_generate_summaries_retries_transient_failures(standin):
+    standin.fail_rate = 1.0
+    summaries = service_for(standin).generate_summaries([("x", None, None)] * 2)
+
+    assert summaries == ["Summary unavailable (Provider Error: 503)"] * 2
+    assert standin.requests == 2 * (llm.settings.LLM_MAX_RETRIES + 1)
+
+
+def test_backoff_honours_retry_after():
+    with patch.object(llm.settings, "LLM_BACKOFF_MAX", 4.0):
+        assert llm.backoff_delay(0, "3") == 3.0
+        assert llm.backoff_delay(0, "60") == 4.0
+        assert 0 <= llm.backoff_delay(5) <= 4.0
+
+
+def test_repeated_summary_served_from_cache(standin):
+    cache = SummaryCache(MemoryTier(16, 60), MemoryTier(16, 60))
+    service = LLMService(api_key="test", model="test-model", url=standin.url, cache=cache)
+
+    first = service.generate_summary("WALMART\nTOTAL 5.00", 5.0, "2024-01-01")
+    again = service.generate_summary("walmart  \n\n TOTAL 5.00 ", 5, "2024-01-01")
+    other = service.generate_summary("WALMART\nTOTAL 5.00", 6.0, "2024-01-01")
+
+    assert first == again == other == standin.content
+    assert standin.requests == 2
+
+
+def test_fallback_summaries_are_not_cached(standin):
+    standin.fail_rate = 1.0
+    cache = SummaryCache(MemoryTier(16, 60))
+    service = LLMService(api_key="test", url=standin.url, cache=cache)
+    service.generate_summary("x", None, None)
+
+    assert len(cache.memory) == 0
+
+
+def test_generate_summaries_uses_cache(standin):
+    cache = SummaryCache(MemoryTier(16, 60))
+    service = LLMService(api_key="test", url=standin.url, cache=cache)
+    service.generate_summaries([("same", 1.0, None)])
+    summaries = service.generate_summaries([("same", 1.0, None)] * 3)
+
+    assert summaries == [standin.content] * 3
+    assert standin.requests == 1
+
+
+def test_prompt_compaction_ratio_recorded_per_call(standin):
+    metrics.reset()
+    service = service_for(standin)
+    service.generate_summary("\n--- Page 1 ---\nSHOP\n=====\nTOTAL 5.00\n--- Page 2 ---\nSHOP", 5.0, None)
+    service.generate_summary("SHOP\nTOTAL 6.00", 6.0, None)
+
+    ratio = metrics.snapshot()["summaries"]["llm.prompt.compression_ratio"]
+    assert ratio["count"] == 2
+    assert ratio["min"] < 1.0
+
+
+def test_breaker_trips_and_defers_without_calling_provider(standin):
+    standin.fail_rate = 1.0
+    breaker = CircuitBreaker(LocalBreakerStore(), "llm", failure_threshold=2,
+                             latency_slo=5.0, open_seconds=30, failure_window=60)
+    service = LLMService(api_key="test", url=standin.url, breaker=breaker)
+    calls_per_summary = llm.settings.LLM_MAX_RETRIES + 1
+
+    service.generate_summary("a", None, None)
+    service.generate_summary("b", None, None)
+    assert standin.requests == 2 * calls_per_summary
+    assert breaker.state() == "open"
+
+    assert service.generate_summary("c", None, None) == llm.SUMMARY_DEFERRED
+    assert service.generate_summaries([("d", None, None)] * 3) == [llm.SUMMARY_DEFERRED] * 3
+    assert standin.requests == 2 * calls_per_summary
+
+
+def test_rejected_requests_do_not_trip_breaker(standin):
+    standin.fail_rate = 1.0
+    standin.fail_status = 400
+    breaker = CircuitBreaker(LocalBreakerStore(), "llm", failure_threshold=2,
+                             latency_slo=5.0, open_seconds=30, failure_window=60)
+    service = LLMService(api_key="test", url=standin.url, breaker=breaker)
+
+    outcomes = [service.summarize(text, None, None) for text in ("a", "b", "c")]
+    assert [o["summary"] for o in outcomes] == ["Summary unavailable (Provider Error: 400)"] * 3
+    assert [o["ok"] for o in service.summarize_many([("d", None, None), ("e", None, None)])] == [False, False]
+    assert breaker.state() == "closed"
+    # Not retried either: one request per summary
+    assert standin.requests == 5
+
+
+def test_breaker_closes_after_successful_probe(standin):
+    breaker = CircuitBreaker(LocalBreakerStore(), "llm", failure_threshold=1,
+                             latency_slo=5.0, open_seconds=30, failure_window=60)
+    breaker.record_failure()
+    breaker.store.delete("open")  # cool-down over: half-open
+    service = LLMService(api_key="test", url=standin.url, breaker=breaker)
+
+    assert service.generate_summary("probe", None, None) == standin.content
+    assert breaker.state() == "closed"
+
+
+def test_summarize_reports_outcome(standin):
+    service = service_for(standin)
+    assert service.summarize("x", None, None) == {"summary": standin.content, "ok": True, "deferred": False}
+
+    standin.fail_rate = 1.0
+    outcome = service.summarize("y", None, None)
+    assert outcome == {"summary": "Summary unavailable (Provider Error: 503)", "ok": False, "deferred": False}
+    assert [o["ok"] for o in service.summarize_many([("z", None, None)])] == [False]
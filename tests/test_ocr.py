@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.services import ocr
+from app.services.ocr import OCRService, TesseractEnginePool
+
+
+class FakeEngine:
+    def __init__(self):
+        self.images = []
+
+    def SetImageBytes(self, data, width, height, bpp, bpl):
+        self.images.append((width, height, bpp, bpl))
+
+    def GetUTF8Text(self):
+        return "TOTAL 10.00"
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        pass
+
+
+def test_engine_pool_reuses_engines():
+    pool = TesseractEnginePool(size=2)
+    created = []
+    pool._create_engine = lambda: created.append(FakeEngine()) or created[-1]
+
+    image = np.zeros((20, 30), dtype=np.uint8)
+    for _ in range(5):
+        assert pool.recognize(image) == "TOTAL 10.00"
+
+    assert len(created) == 1
+    assert created[0].images[0] == (30, 20, 1, 30)
+
+
+def test_pytesseract_backend_is_used_when_selected():
+    service = OCRService(backend="pytesseract")
+    with patch("app.services.ocr.pytesseract.image_to_string", return_value="hello") as mock_ocr:
+        assert service.extract_text(np.zeros((5, 5), dtype=np.uint8)) == "hello"
+    mock_ocr.assert_called_once()
+
+
+def test_auto_backend_without_tesserocr_falls_back(monkeypatch):
+    monkeypatch.setattr(ocr, "tesserocr", None)
+    assert OCRService(backend="auto").backend == "pytesseract"
+    assert OCRService(backend="tesserocr").backend == "pytesseract"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        OCRService(backend="easyocr")
+
+
+def test_extract_texts_preserves_order():
+    service = OCRService(backend="pytesseract")
+    images = [np.full((4, 4), i, dtype=np.uint8) for i in range(6)]
+    with patch.object(service, "extract_text", side_effect=lambda img: f"page-{img[0, 0]}"):
+        texts = service.extract_texts(images, preprocess=lambda img: img, max_workers=3)
+    assert texts == [f"page-{i}" for i in range(6)]
@@ -1,5 +1,5 @@
 import pytest
-from app.services.parser import FinancialParser, parse_receipt
+from app.services.parser import FinancialParser, parse_receipt, parse_receipts, get_date_strategy_stats
 
 def test_financial_parser_extract_total_simple():
     text = "Item 1... 10.00\nTotal: 25.50"
@@ -64,4 +64,33 @@ def test_parse_receipt_wrapper():
     result = parse_receipt(text)
     assert result["merchant"] == "Walmart"
     assert result["total"] == 50.00
-    assert result["date"] == "2023-01-01"
\ No newline at end of file
+    assert result["date"] == "2023-01-01"
+
+def test_financial_parser_subtotal_does_not_trigger_total():
+    text = "Sub Total 40.00\nSales Tax 4.00\nService Charge 3.00"
+    financials = FinancialParser(text).extract_financials()
+    assert financials["subtotal"] == 40.00
+    assert financials["tax"] == 4.00
+    assert financials["tip"] == 3.00
+    assert financials["other_fees"] is None
+    assert financials["total"] == 40.00
+
+def test_parse_receipts_batch():
+    texts = ["Walmart\nTotal: 50.00", "Target\nTotal: 12.00", "Walmart\nTotal: 50.00"]
+    results = parse_receipts(texts)
+    assert [r["total"] for r in results] == [50.00, 12.00, 50.00]
+    assert results[0] == results[2] and results[0] is not results[2]
+
+def test_extract_date_day_first_when_month_out_of_range():
+    parser = FinancialParser("Receipt 25/12/2023")
+    assert parser.extract_date() == "2023-12-25"
+
+def test_extract_date_dotted_numeric():
+    parser = FinancialParser("Date: 12.10.2017")
+    assert parser.extract_date() == "2017-12-10"
+
+def test_extract_date_records_strategy_stats():
+    FinancialParser("12 Oct 2023").extract_date()
+    stats = get_date_strategy_stats()
+    assert stats["strategies"]["month_name"]["hits"] >= 1
+    assert 0 < stats["strategies"]["month_name"]["rate"] <= 1
@@ -0,0 +1,72 @@
+import numpy as np
+from unittest.mock import MagicMock
+from app.services.extraction import ExtractionService
+from app.services.image import ImageService
+from app.services.pdf import PDFService
+
+
+def test_has_usable_text():
+    service = PDFService()
+    assert service.has_usable_text("INVOICE 1042\nTotal due: 120.00 USD")
+    assert not service.has_usable_text("   \n  ")
+    assert not service.has_usable_text("\x01\x02 ... -- ** ## !! ?? .. ,, ;; :: ")
+
+
+def test_consecutive_runs_respect_window():
+    runs = list(PDFService._consecutive_runs([1, 2, 3, 5, 6, 9], max_length=2))
+    assert runs == [[1, 2], [3], [5, 6], [9]]
+
+
+def make_extraction_service(page_count, text_layer, ocr_texts):
+    pdf_service = MagicMock(spec=PDFService)
+    pdf_service.page_count.return_value = page_count
+    pdf_service.extract_text_layer.return_value = text_layer
+    pdf_service.has_usable_text.side_effect = lambda text, min_chars: bool(text)
+    pdf_service.render_page.return_value = np.full((100, 60), 255, np.uint8)
+
+    ocr_service = MagicMock()
+    ocr_service.extract_texts.side_effect = ocr_texts
+    image_service = ImageService(adaptive_resolution=False)
+    return ExtractionService(image_service, ocr_service, pdf_service), pdf_service, ocr_service
+
+
+def test_extract_pdf_only_ocrs_pages_without_text_layer():
+    service, pdf_service, _ = make_extraction_service(
+        3, ["Digital page one total 10.00", "", "Digital page three 30.00"], [["Scanned page two"]]
+    )
+    pdf_service.iter_page_windows.return_value = iter([([2], [np.zeros((4, 4), np.uint8)])])
+
+    result = service.extract_pdf("/tmp/doc.pdf")
+
+    raw_text = result["raw_text"]
+    assert result["page_sources"] == ["text", "ocr", "text"]
+    assert result["ocr_mode"] == "full"
+    assert raw_text.index("Digital page one") < raw_text.index("Scanned page two") < raw_text.index("Digital page three")
+    assert pdf_service.iter_page_windows.call_args.args[1] == [2]
+
+
+def test_extract_pdf_progressive_stops_after_last_page():
+    service, pdf_service, ocr_service = make_extraction_service(
+        5, [], [["Corner Cafe\nDate: 2023-10-15", "Total 12.50"]]
+    )
+
+    result = service.extract_pdf("/tmp/doc.pdf", mode="progressive")
+
+    assert result["ocr_mode"] == "progressive"
+    assert result["page_sources"] == ["skipped", "skipped", "skipped", "skipped", "ocr_roi"]
+    # The fields found by the early-exit check travel with the text
+    assert (result["parsed"]["merchant"], result["parsed"]["total"]) == ("Corner Cafe", 12.5)
+    assert pdf_service.render_page.call_args.args[1] == 5
+    pdf_service.iter_page_windows.assert_not_called()
+
+
+def test_extract_image_progressive_falls_back_to_full():
+    service, _, ocr_service = make_extraction_service(1, [], [["", "Total 12.50"]])
+    service.image_service.prepare_image_from_bytes = lambda data: np.full((100, 60), 255, np.uint8)
+    ocr_service.extract_text.return_value = "Corner Cafe\nDate: 2023-10-15\nTotal 12.50"
+
+    result = service.extract_image(b"image", mode="progressive")
+
+    assert result["ocr_mode"] == "full"
+    assert result["page_sources"] == ["ocr"]
+    ocr_service.extract_text.assert_called_once()
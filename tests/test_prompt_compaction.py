@@ -0,0 +1,78 @@
+from app.services.parser import parse_receipt
+from app.services.prompt_compaction import clean_lines, compact_receipt_text, estimate_tokens
+
+HEADER = ["WALMART SUPERCENTER", "123 MAIN ST SPRINGFIELD", "Date: 10/12/2023"]
+
+
+def multi_page_receipt(items: int) -> str:
+    pages = []
+    per_page = 20
+    for page in range(0, items, per_page):
+        body = [f"ITEM NUMBER {i:03d} DESCRIPTION      {i % 50 + 1}.99" for i in range(page, min(page + per_page, items))]
+        pages.append("\n".join([*HEADER, "=" * 30, *body, "", "~~ .. ~~"]))
+    footer = ["SUBTOTAL 1234.56", "TAX 98.76", "TOTAL 1333.32", "VISA **** 1234", "THANK YOU FOR SHOPPING"]
+    return "".join(f"\n--- Page {n} ---\n{text}" for n, text in enumerate(pages, start=1)) + "\n" + "\n".join(footer)
+
+
+def test_clean_lines_strips_separators_noise_and_repeats():
+    raw = "\n--- Page 1 ---\nSHOP  NAME\n-----\n\n|\nMILK 3.49\n--- Page 2 ---\nshop name\nTOTAL 3.49"
+
+    assert clean_lines(raw) == ["SHOP NAME", "MILK 3.49", "TOTAL 3.49"]
+
+
+def test_clean_lines_keeps_dotted_leader_totals_and_repeated_items():
+    raw = "\n".join([
+        "WALMART", "MILK 3.49", "MILK 3.49",
+        "Subtotal ............... 6.98", "TAX ............. 0.50", "TOTAL ................... 7.48",
+        "CARD **** **** **** 1234", "..............",
+    ])
+
+    assert clean_lines(raw) == raw.splitlines()[:-1]
+
+
+def test_clean_lines_drops_header_and_footer_repeated_per_page():
+    page = ["SHOP NAME", "123 MAIN ST", "{item}", "{item}", "Page total .......... 9.99", "THANK YOU"]
+    raw = "".join(
+        f"\n--- Page {n} ---\n" + "\n".join(page).format(item=item)
+        for n, item in enumerate(["MILK 3.49", "EGGS 2.99"], start=1)
+    )
+
+    assert clean_lines(raw) == [
+        "SHOP NAME", "123 MAIN ST", "MILK 3.49", "MILK 3.49", "Page total .......... 9.99", "THANK YOU",
+        "EGGS 2.99", "EGGS 2.99",
+    ]
+
+
+def test_small_receipt_is_only_cleaned():
+    raw = "\n".join([*HEADER, "MILK 3.49", "TOTAL 3.49"])
+    result = compact_receipt_text(raw, token_budget=1500)
+
+    assert result["text"] == raw
+    assert result["ratio"] == 1.0
+
+
+def test_budget_keeps_header_footer_and_financial_lines():
+    raw = multi_page_receipt(items=200)
+    result = compact_receipt_text(raw, token_budget=300)
+    lines = result["text"].splitlines()
+
+    assert result["tokens"] <= 300
+    assert result["tokens"] == estimate_tokens(result["text"])
+    assert result["ratio"] < 0.15
+    assert lines[:3] == HEADER
+    for line in ("SUBTOTAL 1234.56", "TAX 98.76", "TOTAL 1333.32", "VISA **** 1234", "THANK YOU FOR SHOPPING"):
+        assert line in lines
+    assert any(line.endswith("lines omitted]") for line in lines)
+    # What the parser extracts from the compacted text is unchanged
+    original, compacted = parse_receipt(raw), parse_receipt(result["text"])
+    assert (compacted["merchant"], compacted["date"], compacted["total"]) == \
+        (original["merchant"], original["date"], original["total"])
+
+
+def test_item_lines_kept_in_order_while_budget_allows():
+    raw = multi_page_receipt(items=60)
+    lines = compact_receipt_text(raw, token_budget=500)["text"].splitlines()
+    items = [line for line in lines if line.startswith("ITEM")]
+
+    assert items == sorted(items)
+    assert items[0].startswith("ITEM NUMBER 000")
@@ -0,0 +1,43 @@
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.models.receipt_db import Receipt, ReprocessCheckpoint
+from app.services.reprocess import ReprocessService
+
+
+def make_engine(tmp_path, rows):
+    engine = create_engine(f"sqlite:///{tmp_path / 'receipts.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i, (raw_text, total) in enumerate(rows, start=1):
+            session.add(Receipt(task_id=f"t{i}", filename="r.jpg", s3_key="k", status="completed",
+                                raw_text=raw_text, total=total, tags=[]))
+        session.commit()
+    return engine
+
+
+def test_reprocess_dry_run_reports_without_writing(tmp_path):
+    engine = make_engine(tmp_path, [("Shop\nTotal: 50.00", None), ("Shop\nTotal: 12.00", None)])
+    stats = ReprocessService(engine, chunk_size=1).run("job", dry_run=True)
+
+    assert stats["scanned"] == 2
+    assert stats["changed"] == 2
+    assert stats["diffs"][0]["changes"]["total"] == {"old": None, "new": 50.00}
+    with Session(engine) as session:
+        assert session.exec(select(Receipt.total)).all() == [None, None]
+        assert session.get(ReprocessCheckpoint, "job") is None
+
+
+def test_reprocess_updates_and_resumes_from_checkpoint(tmp_path):
+    engine = make_engine(tmp_path, [("Shop\nTotal: 50.00", None), ("Shop\nTotal: 12.00", None)])
+    service = ReprocessService(engine, chunk_size=1)
+
+    first = service.run("job", limit=1)
+    assert first["last_id"] == 1
+    second = service.run("job")
+    assert second["start_id"] == 1 and second["scanned"] == 1
+
+    with Session(engine) as session:
+        assert session.exec(select(Receipt.total).order_by(Receipt.id)).all() == [50.00, 12.00]
+        checkpoint = session.get(ReprocessCheckpoint, "job")
+        assert checkpoint.last_id == 2 and checkpoint.updated == 2
+
+    assert service.run("job")["scanned"] == 0
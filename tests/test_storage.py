@@ -0,0 +1,167 @@
+import io
+import os
+import hashlib
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import storage
+from app.services.storage import StorageService
+
+
+@pytest.fixture(autouse=True)
+def fresh_storage():
+    storage.close_storage()
+    yield
+    storage.close_storage()
+
+
+def test_bucket_checked_once_per_process():
+    client = MagicMock()
+    StorageService(client, "receipts")
+    StorageService(client, "receipts")
+    StorageService(client, "other")
+
+    assert client.head_bucket.call_count == 2
+
+
+def test_missing_bucket_is_created_once():
+    client = MagicMock()
+    client.head_bucket.side_effect = Exception("404")
+    StorageService(client, "receipts")
+    StorageService(client, "receipts")
+
+    client.create_bucket.assert_called_once_with(Bucket="receipts")
+
+
+def test_client_and_service_are_shared():
+    with patch("app.services.storage.create_s3_client", side_effect=lambda: MagicMock()) as create:
+        first = storage.get_storage_service()
+        second = storage.get_storage_service()
+
+    assert first is second
+    assert storage.get_s3_client() is first.s3
+    create.assert_called_once()
+
+
+def test_client_rebuilt_after_fork():
+    with patch("app.services.storage.create_s3_client", side_effect=lambda: MagicMock()):
+        parent = storage.get_s3_client()
+        with patch("app.services.storage.os.getpid", return_value=-1):
+            child = storage.get_s3_client()
+
+    assert child is not parent
+
+
+def test_close_storage_releases_client():
+    client = MagicMock()
+    with patch("app.services.storage.create_s3_client", return_value=client):
+        storage.init_storage()
+        storage.close_storage()
+        storage.get_storage_service()
+
+    client.close.assert_called_once()
+    assert client.head_bucket.call_count == 2
+
+
+def test_client_uses_configured_pool_size():
+    with patch.object(storage.settings, "S3_MAX_POOL_CONNECTIONS", 7):
+        client = storage.create_s3_client()
+
+    assert client.meta.config.max_pool_connections == 7
+
+
+def test_upload_stream_small_body_uses_single_put():
+    client = MagicMock()
+    service = StorageService(client, "receipts")
+    data = b"%PDF-" + b"x" * 100
+
+    result = service.upload_stream(io.BytesIO(data[5:]), "k", "application/pdf", head=data[:5])
+
+    assert result == {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    assert client.put_object.call_args.kwargs["Body"] == data
+    client.create_multipart_upload.assert_not_called()
+
+
+def test_upload_stream_large_body_uses_multipart():
+    client = MagicMock()
+    client.create_multipart_upload.return_value = {"UploadId": "u1"}
+    client.upload_part.side_effect = lambda **kw: {"ETag": f"e{kw['PartNumber']}"}
+    service = StorageService(client, "receipts")
+    part = storage.MIN_PART_SIZE
+    data = b"a" * part + b"b" * part + b"c" * 10
+
+    result = service.upload_stream(io.BytesIO(data), "k", "application/pdf", part_size=part)
+
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    sizes = [len(c.kwargs["Body"]) for c in client.upload_part.call_args_list]
+    assert sizes == [part, part, 10]
+    parts = client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+    assert [p["ETag"] for p in parts] == ["e1", "e2", "e3"]
+    client.put_object.assert_not_called()
+
+
+def test_upload_stream_enforces_size_limit():
+    client = MagicMock()
+    client.create_multipart_upload.return_value = {"UploadId": "u1"}
+    client.upload_part.return_value = {"ETag": "e"}
+    service = StorageService(client, "receipts")
+    part = storage.MIN_PART_SIZE
+
+    with pytest.raises(storage.UploadTooLarge):
+        service.upload_stream(io.BytesIO(b"a" * 100), "k", "image/png", max_bytes=50)
+    client.put_object.assert_not_called()
+
+    with pytest.raises(storage.UploadTooLarge):
+        service.upload_stream(io.BytesIO(b"a" * (part * 3)), "k", "image/png", max_bytes=part * 2, part_size=part)
+    client.abort_multipart_upload.assert_called_once_with(Bucket="receipts", Key="k", UploadId="u1")
+    client.complete_multipart_upload.assert_not_called()
+
+
+def _get_object(data):
+    return lambda **kwargs: {"ContentLength": len(data), "Body": io.BytesIO(data)}
+
+
+def test_read_object_reuses_thread_buffer():
+    client = MagicMock()
+    service = StorageService(client, "receipts")
+
+    client.get_object.side_effect = _get_object(b"x" * 100)
+    first = service.read_object("a.jpg")
+    assert bytes(first) == b"x" * 100
+
+    client.get_object.side_effect = _get_object(b"y" * 40)
+    second = service.read_object("b.jpg")
+    assert bytes(second) == b"y" * 40
+    assert second.obj is first.obj
+
+
+def test_object_file_in_memory_and_spilled():
+    client = MagicMock()
+    service = StorageService(client, "receipts")
+
+    client.get_object.side_effect = _get_object(b"%PDF-small")
+    with service.object_file("uploads/a.pdf", max_memory_bytes=1024) as path:
+        assert path.startswith("/proc/")
+        with open(path, "rb") as f:
+            assert f.read() == b"%PDF-small"
+
+    client.get_object.side_effect = _get_object(b"%PDF-large")
+    with service.object_file("uploads/a.pdf", max_memory_bytes=4) as path:
+        assert path.endswith(".pdf")
+        with open(path, "rb") as f:
+            assert f.read() == b"%PDF-large"
+    assert not os.path.exists(path)
+
+
+def test_async_interface_runs_off_the_event_loop():
+    import asyncio
+    import threading
+
+    client = MagicMock()
+    threads = []
+    client.get_object.side_effect = lambda **kw: threads.append(threading.get_ident()) or {"Key": kw["Key"]}
+    service = StorageService(client, "receipts")
+
+    result = asyncio.run(service.get_object_async("a.jpg"))
+
+    assert result == {"Key": "a.jpg"}
+    assert threads and threads[0] != threading.get_ident()
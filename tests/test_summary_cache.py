@@ -0,0 +1,148 @@
+from unittest.mock import patch
+
+from app.core.metrics import metrics
+from app.services.summary_cache import MemoryTier, RedisTier, SummaryCache, shared_tier_url, summary_key
+
+
+def test_summary_key_normalizes_ocr_noise():
+    key = summary_key("m", "WALMART\nMILK  3.49\nTOTAL 3.49", 3.49, "2024-01-01")
+
+    assert key == summary_key("m", "  walmart \n\nmilk 3.49\r\nTOTAL\t3.49\n", 3.490001, "2024-01-01 ")
+    assert key != summary_key("m", "WALMART\nMILK 3.49\nTOTAL 3.49", 3.50, "2024-01-01")
+    assert key != summary_key("m", "WALMART\nMILK 3.49\nTOTAL 3.49", 3.49, None)
+    assert key != summary_key("other-model", "WALMART\nMILK 3.49\nTOTAL 3.49", 3.49, "2024-01-01")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    metrics.reset()
+    tier = MemoryTier(max_entries=2, ttl=60)
+    tier.set("a", "1")
+    tier.set("b", "2")
+    tier.get("a")
+    tier.set("c", "3")
+
+    assert tier.get("a") == "1"
+    assert tier.get("b") is None
+    assert tier.get("c") == "3"
+    assert metrics.counters("llm.cache.evictions") == {"llm.cache.evictions": 1}
+
+
+def test_memory_tier_expires_entries():
+    tier = MemoryTier(max_entries=2, ttl=10)
+    with patch("app.services.summary_cache.time.monotonic", return_value=100.0):
+        tier.set("a", "1")
+    with patch("app.services.summary_cache.time.monotonic", return_value=109.0):
+        assert tier.get("a") == "1"
+    with patch("app.services.summary_cache.time.monotonic", return_value=111.0):
+        assert tier.get("a") is None
+    assert len(tier) == 0
+
+
+def test_shared_hit_is_promoted_and_counted():
+    metrics.reset()
+    shared = MemoryTier(16, 60)
+    shared.set("k", "summary")
+    cache = SummaryCache(MemoryTier(16, 60), shared)
+
+    assert cache.get("k") == "summary"
+    assert cache.get("k") == "summary"
+    assert cache.get("missing") is None
+    assert metrics.counters("llm.cache.") == {
+        "llm.cache.hits.shared": 1,
+        "llm.cache.hits.memory": 1,
+        "llm.cache.misses": 1,
+    }
+
+
+class BrokenTier:
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    def set(self, key, value):
+        raise ConnectionError("redis down")
+
+
+def test_shared_tier_errors_are_misses():
+    metrics.reset()
+    cache = SummaryCache(MemoryTier(16, 60), BrokenTier())
+    cache.set("k", "summary")
+
+    assert cache.get("k") == "summary"
+    assert cache.get("other") is None
+    assert metrics.counters("llm.cache.errors") == {"llm.cache.errors": 2}
+
+
+class FakeRedis:
+    """The handful of commands RedisTier uses, TTLs ignored."""
+
+    def __init__(self):
+        self.values = {}
+        self.scores = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        value = self.values.get(key)
+        return value.encode() if value is not None else None
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key.decode(), None)
+
+    def zadd(self, name, mapping):
+        self.scores.update(mapping)
+
+    def zremrangebyscore(self, name, low, high):
+        for key in [k for k, score in self.scores.items() if score <= high]:
+            del self.scores[key]
+
+    def zcard(self, name):
+        return len(self.scores)
+
+    def zrange(self, name, start, end):
+        return [k.encode() for k in sorted(self.scores, key=self.scores.get)[start:end + 1]]
+
+    def zrem(self, name, *keys):
+        for key in keys:
+            self.scores.pop(key.decode(), None)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_redis_tier_evicts_least_recently_used():
+    metrics.reset()
+    tier = RedisTier("redis://unused/1", ttl=60, max_entries=2)
+    tier._client = FakeRedis()
+    with patch("app.services.summary_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+        tier.set("a", "1")
+        tier.set("b", "2")
+        assert tier.get("a") == "1"
+        tier.set("c", "3")
+
+    assert tier.get("a") == "1"
+    assert tier.get("b") is None
+    assert tier.get("c") == "3"
+    assert set(tier._client.scores) == {"a", "c"}
+    assert metrics.counters("llm.cache.evictions") == {"llm.cache.evictions": 1}
+
+
+def test_shared_tier_uses_its_own_database():
+    with patch("app.services.summary_cache.settings.SUMMARY_CACHE_REDIS_URL", None), \
+            patch("app.core.celery_app.BACKEND_URL", "redis://redis:6379/0"):
+        assert shared_tier_url() == "redis://redis:6379/1"
+    with patch("app.services.summary_cache.settings.SUMMARY_CACHE_REDIS_URL", "redis://cache:6379/0"):
+        assert shared_tier_url() == "redis://cache:6379/0"
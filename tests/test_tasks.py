@@ -0,0 +1,278 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.core.celery_app import celery_app
+from app.services import tasks
+from app.services.llm import SUMMARY_DEFERRED, failed_summary
+
+
+def test_parse_and_summarize_stages_extend_payload():
+    payload = {"s3_key": "uploads/a.jpg", "generate_summary": False,
+               "raw_text": "Walmart\nTotal: 50.00\nDate: 2023-01-01",
+               "page_sources": ["ocr"], "ocr_mode": "full"}
+
+    parsed = tasks.run_parse_stage(payload)
+    assert parsed["merchant"] == "Walmart"
+    assert parsed["total"] == 50.00
+    assert "tags" in parsed
+
+    summarized = tasks.run_summarize_stage(parsed)
+    assert summarized["summary"] is None
+    assert summarized["raw_text"] == payload["raw_text"]
+
+
+def test_parse_stage_reuses_progressive_check():
+    from app.core.metrics import metrics
+    from app.services.parser import parse_receipt
+
+    raw_text = "Corner Cafe\nDate: 15 Oct 2023\nTotal 12.50"
+    metrics.reset()
+    payload = {"generate_summary": False, "raw_text": raw_text, "ocr_mode": "progressive",
+               "parsed": parse_receipt(raw_text)}
+    strategies = metrics.counters("parser.date_strategy.")
+
+    parsed = tasks.run_parse_stage(payload)
+
+    assert (parsed["merchant"], parsed["total"]) == ("Corner Cafe", 12.5)
+    assert "parsed" not in parsed
+    # Parsed once for the whole receipt: strategy counters are not bumped again
+    assert metrics.counters("parser.date_strategy.") == strategies
+
+
+def test_dispatch_receipt_builds_routed_chain():
+    captured = {}
+
+    def fake_chain(*stages):
+        captured["stages"] = list(stages)
+        pipeline = MagicMock()
+        return pipeline
+
+    with patch.object(tasks, "chain", side_effect=fake_chain), \
+         patch.object(tasks.settings, "PIPELINE_MODE", "staged"):
+        task_id = tasks.dispatch_receipt("uploads/a.jpg", generate_summary=True)
+
+    names = [stage.task for stage in captured["stages"]]
+    assert names == [
+        "app.services.tasks.ocr_stage_task",
+        "app.services.tasks.parse_stage_task",
+        "app.services.tasks.summarize_stage_task",
+        "app.services.tasks.persist_stage_task",
+    ]
+    assert captured["stages"][-1].options["task_id"] == task_id
+    assert all(stage.options["compression"] == "zlib" for stage in captured["stages"])
+
+    routes = celery_app.conf.task_routes
+    assert [routes[name]["queue"] for name in names] == ["ocr", "parse", "llm", "persist"]
+
+
+def test_dispatch_receipt_skips_summary_stage():
+    captured = {}
+    with patch.object(tasks, "chain", side_effect=lambda *s: captured.setdefault("stages", s) and MagicMock()), \
+         patch.object(tasks.settings, "PIPELINE_MODE", "staged"):
+        tasks.dispatch_receipt("uploads/a.jpg", generate_summary=False)
+    assert "app.services.tasks.summarize_stage_task" not in [s.task for s in captured["stages"]]
+
+
+def test_ocr_stage_reads_objects_from_memory():
+    storage = MagicMock()
+    storage.read_object.return_value = memoryview(b"image-bytes")
+    storage.object_file.return_value.__enter__.return_value = "/proc/1/fd/5"
+    extraction = {"raw_text": "x", "page_sources": ["ocr"], "ocr_mode": "full"}
+
+    with patch.object(tasks, "get_storage_service", return_value=storage), \
+         patch.object(tasks, "extraction_service") as service:
+        service.extract_image.return_value = extraction
+        service.extract_pdf.return_value = extraction
+        tasks.run_ocr_stage("uploads/a.jpg", False, "full")
+        tasks.run_ocr_stage("uploads/b.PDF", False, "progressive")
+
+    service.extract_image.assert_called_once_with(storage.read_object.return_value, "full")
+    service.extract_pdf.assert_called_once_with("/proc/1/fd/5", "progressive")
+    storage.download_file.assert_not_called()
+
+
+def test_dispatch_receipts_publishes_one_group():
+    items = [{"s3_key": f"uploads/{i}.jpg", "generate_summary": False, "task_id": f"t{i}"} for i in range(3)]
+    with patch.object(tasks, "group") as mock_group, \
+         patch.object(tasks.settings, "PIPELINE_MODE", "staged"):
+        tasks.dispatch_receipts(items)
+
+    pipelines = list(mock_group.call_args[0][0])
+    assert [p.tasks[-1].options["task_id"] for p in pipelines] == ["t0", "t1", "t2"]
+    mock_group.return_value.apply_async.assert_called_once()
+
+
+def test_notify_finished_publishes_and_queues_webhook():
+    result = {"status": "success", "data": {}}
+    with patch.object(tasks, "publish_event") as publish, \
+         patch.object(tasks.deliver_webhook_task, "delay") as delay:
+        tasks.notify_finished("t1", "completed", result, None)
+        delay.assert_not_called()
+        tasks.notify_finished("t1", "completed", result, "https://client.example/hook")
+
+    publish.assert_called_with("t1", "completed", result=result)
+    delay.assert_called_once_with(
+        "https://client.example/hook", {"task_id": "t1", "event": "completed", "result": result}
+    )
+
+
+def test_deliver_webhook_signs_body():
+    import hmac, hashlib
+
+    with patch.object(tasks.settings, "WEBHOOK_SECRET", "s3cret"), \
+         patch.object(tasks, "check_webhook_url"), \
+         patch.object(tasks.requests, "post") as post:
+        post.return_value.status_code = 200
+        tasks.deliver_webhook_task.run("https://client.example/hook", {"task_id": "t1"})
+
+    kwargs = post.call_args.kwargs
+    expected = hmac.new(b"s3cret", kwargs["data"], hashlib.sha256).hexdigest()
+    assert kwargs["headers"]["X-Receipt-Signature"] == f"sha256={expected}"
+    assert kwargs["allow_redirects"] is False
+
+
+def test_deliver_webhook_only_retries_server_errors():
+    import pytest
+
+    with patch.object(tasks, "check_webhook_url"), patch.object(tasks.requests, "post") as post:
+        post.return_value.status_code = 404
+        assert tasks.deliver_webhook_task.run("https://client.example/hook", {}) == 404
+        post.return_value.status_code = 302
+        assert tasks.deliver_webhook_task.run("https://client.example/hook", {}) == 302
+        post.return_value.status_code = 503
+        with pytest.raises(tasks.WebhookServerError):
+            tasks.deliver_webhook_task.run("https://client.example/hook", {})
+
+
+def test_deliver_webhook_refuses_internal_targets():
+    with patch.object(tasks.requests, "post") as post:
+        assert tasks.deliver_webhook_task.run("http://169.254.169.254/latest/meta-data", {}) is None
+    post.assert_not_called()
+
+
+def test_build_pipeline_routes_ocr_to_lane_queue():
+    with patch.object(tasks.settings, "PIPELINE_MODE", "staged"):
+        small = tasks.build_pipeline("uploads/a.jpg", False, task_id="t1", lane="small")
+        default = tasks.build_pipeline("uploads/b.pdf", False, task_id="t2")
+    with patch.object(tasks.settings, "PIPELINE_MODE", "single"):
+        single = tasks.build_pipeline("uploads/c.pdf", False, task_id="t3", lane="large")
+
+    assert small.tasks[0].options["queue"] == "ocr.small"
+    assert "queue" not in small.tasks[1].options
+    assert default.tasks[0].options["queue"] == "ocr"
+    assert single.options["queue"] == "ocr.large"
+
+
+def test_celery_result_is_slim_by_default():
+    full = {"status": "success", "data": {"raw_text": "x" * 10000}}
+    assert tasks.celery_result(full, 7) == {"status": "success", "receipt_id": 7}
+    assert tasks.celery_result({"status": "error", "error": "boom"}, None) == {
+        "status": "error", "receipt_id": None, "error": "boom"}
+    with patch.object(tasks.settings, "TASK_RESULT_MODE", "full"):
+        assert tasks.celery_result(full, 7) is full
+
+    # Intermediate stages hand payloads on through the chain, not the backend
+    assert tasks.ocr_stage_task.ignore_result and tasks.parse_stage_task.ignore_result
+    assert not tasks.persist_stage_task.ignore_result
+
+
+def test_summarize_stage_flags_deferred_summary():
+    payload = {"generate_summary": True, "raw_text": "x", "total": 1.0, "date": None}
+    with patch.object(tasks.llm_service, "summarize", return_value=failed_summary(SUMMARY_DEFERRED, deferred=True)):
+        deferred = tasks.run_summarize_stage(payload)
+    with patch.object(tasks.llm_service, "summarize", return_value=failed_summary("Summary unavailable (Timeout).")):
+        failed = tasks.run_summarize_stage(payload)
+
+    assert (deferred["summary"], deferred["summary_deferred"]) == (SUMMARY_DEFERRED, True)
+    assert failed["summary_deferred"] is False
+    assert (deferred["summary_failed"], failed["summary_failed"]) == (False, True)
+
+
+def test_backfill_summarizes_deferred_receipts(tmp_path):
+    from contextlib import contextmanager
+    from sqlmodel import SQLModel, Session, create_engine
+    from app.models.receipt_db import Receipt
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        for i, deferred in enumerate([True, True, True, False]):
+            db.add(Receipt(task_id=f"t{i}", filename="a.jpg", s3_key="k", status="completed",
+                           raw_text=f"receipt {i}", summary=SUMMARY_DEFERRED if deferred else "done",
+                           summary_deferred=deferred, tags=[]))
+        db.commit()
+
+    @contextmanager
+    def session_context():
+        with Session(engine) as db:
+            yield db
+
+    outcomes = [
+        {"summary": "Fresh summary", "ok": True, "deferred": False},
+        failed_summary(SUMMARY_DEFERRED, deferred=True),
+        # e.g. the half-open probe failing: the receipt must stay queued
+        failed_summary("Summary unavailable (Provider Error: 503)"),
+    ]
+    with patch.object(tasks, "get_sync_session_context", session_context), \
+         patch.object(tasks.llm_service, "summarize_many", return_value=outcomes) as summarize, \
+         patch.object(tasks, "schedule_summary_backfill") as schedule:
+        result = tasks.backfill_summaries_task.run(batch_size=10)
+
+    assert result == {"backfilled": 1, "given_up": 0, "deferred": 2}
+    assert [item[0] for item in summarize.call_args[0][0]] == ["receipt 0", "receipt 1", "receipt 2"]
+    schedule.assert_called_once()
+    with Session(engine) as db:
+        rows = {r.task_id: (r.summary, r.summary_deferred, r.summary_backfill_attempts)
+                for r in db.query(Receipt).all()}
+    assert rows == {
+        "t0": ("Fresh summary", False, 0),
+        "t1": (SUMMARY_DEFERRED, True, 0),
+        "t2": (SUMMARY_DEFERRED, True, 1),
+        "t3": ("done", False, 0),
+    }
+
+def test_backfill_pages_past_failures_and_gives_up(tmp_path):
+    from contextlib import contextmanager
+    from sqlmodel import SQLModel, Session, create_engine
+    from app.models.receipt_db import Receipt
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        for i in range(3):
+            db.add(Receipt(task_id=f"t{i}", filename="a.jpg", s3_key="k", status="completed",
+                           raw_text=f"receipt {i}", summary=SUMMARY_DEFERRED, summary_deferred=True,
+                           summary_backfill_attempts=2 if i == 0 else 0, tags=[]))
+        db.commit()
+
+    @contextmanager
+    def session_context():
+        with Session(engine) as db:
+            yield db
+
+    rejected = failed_summary("Summary unavailable (Provider Error: 400)")
+    with patch.object(tasks, "get_sync_session_context", session_context), \
+         patch.object(tasks.settings, "SUMMARY_BACKFILL_MAX_ATTEMPTS", 3), \
+         patch.object(tasks.llm_service, "summarize_many", return_value=[rejected, rejected]) as summarize, \
+         patch.object(tasks.backfill_summaries_task, "delay") as next_batch, \
+         patch.object(tasks, "schedule_summary_backfill") as schedule:
+        result = tasks.backfill_summaries_task.run(batch_size=2)
+        # The next batch starts after the last id seen, not at the failing head
+        next_batch.assert_called_once_with(2, 2, True)
+        summarize.return_value = [{"summary": "Fresh summary", "ok": True, "deferred": False}]
+        last = tasks.backfill_summaries_task.run(2, 2, True)
+
+    assert result == {"backfilled": 0, "given_up": 1, "deferred": 1}
+    assert last == {"backfilled": 1, "given_up": 0, "deferred": 0}
+    assert [item[0] for item in summarize.call_args[0][0]] == ["receipt 2"]
+    schedule.assert_called_once()
+    with Session(engine) as db:
+        rows = {r.task_id: (r.summary, r.summary_deferred) for r in db.query(Receipt).all()}
+    assert rows == {
+        "t0": ("Summary unavailable (Provider Error: 400)", False),
+        "t1": (SUMMARY_DEFERRED, True),
+        "t2": ("Fresh summary", False),
+    }
+
+def test_reprocess_task_rejects_process_pool():
+    with pytest.raises(ValueError, match="--workers"):
+        tasks.reprocess_receipts_task.run(workers=4)
@@ -0,0 +1,44 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.services import webhooks
+from app.services.webhooks import UnsafeWebhookURL, check_webhook_url
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http:///hook",
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.10/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_rejects_non_public_targets(url):
+    with pytest.raises(UnsafeWebhookURL):
+        check_webhook_url(url)
+
+
+def test_rejects_hosts_resolving_to_private_addresses():
+    # e.g. compose service names like "storage" or "db"
+    private = [(2, 1, 6, "", ("172.18.0.4", 9000))]
+    with patch.object(webhooks.socket, "getaddrinfo", return_value=private):
+        with pytest.raises(UnsafeWebhookURL):
+            check_webhook_url("http://storage:9000/receipts")
+
+
+def test_accepts_public_addresses():
+    check_webhook_url("https://93.184.216.34/hook")
+
+
+def test_allowlist_restricts_hosts():
+    with patch.object(webhooks.settings, "WEBHOOK_ALLOWED_HOSTS", ["hooks.example.com", ".partner.io"]):
+        check_webhook_url("https://hooks.example.com/receipts")
+        check_webhook_url("https://eu.partner.io/receipts")
+        with pytest.raises(UnsafeWebhookURL):
+            check_webhook_url("https://93.184.216.34/hook")
+        with pytest.raises(UnsafeWebhookURL):
+            check_webhook_url("https://evilpartner.io/hook")